@@ -1,11 +1,80 @@
 from options.docs import tags_metadata
 from options.option import TITLE, DESCRIPTION, VERSION
 from routers.weather import weather_data
-from routers.stats import temperature_stats, rain_stats, general_stats
+from routers.stats import temperature_stats, rain_stats, general_stats, compare_stats
+from routers.admin import admin
+from routers.jobs import jobs
+from routers.series import series
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, Query, HTTPException
-from db.database import engine, get_session
+from db.database import engine, dispose_engines, prime_pools
+from db.writelock import write_lock
+from services.upstream import start_upstream_client, close_upstream_client
+from services.jobs import start_job_queue, stop_job_queue
+from services.executor import start_executor, shutdown_executor
+from services.metrics import MetricsMiddleware
+
+
+async def prepare_database():
+    """
+    Crear las tablas de la base de datos y aplicar las migraciones pendientes.
+
+    Se utiliza para crear las tablas de la base de datos en la base de datos configurada en la variable de entorno OPENMETEO_DATABASE_URL.
+    Con varios workers cada uno lo hace al arrancar con el cerrojo de
+    escritura, uno detrás de otro; el primero crea o migra y el resto no
+    encuentra nada pendiente.
+
+    No devuelve nada, solo se encarga de crear las tablas de la base de datos.
+    """
+
+    # Conectar a la base de datos, un proceso cada vez
+    async with write_lock.hold(), engine.begin() as conn:
+        # importar el modelo solo si se necesita
+        from db.database import Base
+
+        # Crear las tablas segun el modelo
+        await conn.run_sync(Base.metadata.create_all)
+
+        # Aplicar migraciones pendientes sobre tablas ya existentes
+        from db.migrations import run_migrations
+        await conn.run_sync(run_migrations)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque y parada de la aplicación, en cada proceso worker.
+
+    Al arrancar crea las tablas, abre de antemano las conexiones de la base
+    de datos, el cliente HTTP compartido hacia Open-Meteo, el pool de
+    cálculos y los workers de las cargas en segundo plano. Al detenerse los
+    cierra en orden inverso.
+    """
+    await prepare_database()
+
+    # Conexiones listas antes de la primera petición
+    await prime_pools()
+
+    # Abrir el cliente HTTP compartido hacia Open-Meteo
+    await start_upstream_client()
+
+    # Pool para los cálculos de estadísticas fuera del bucle de eventos
+    start_executor()
+
+    # Arrancar los workers de las cargas en segundo plano
+    await start_job_queue()
+
+    yield
+
+    # Detener las cargas en segundo plano y cerrar el cliente HTTP compartido y el pool de cálculos
+    await stop_job_queue()
+    await close_upstream_client()
+    shutdown_executor()
+    await dispose_engines()
+
 
 app = FastAPI(
+    lifespan=lifespan,
     title=TITLE,
     description=DESCRIPTION, 
     version=VERSION,
@@ -24,26 +93,15 @@ app = FastAPI(
     }
 )
 
-@app.on_event("startup")
-async def on_startup():
-    """
-    Crear las tablas de la base de datos cuando se inicia la aplicación.
-
-    Se utiliza para crear las tablas de la base de datos en la base de datos configurada en la variable de entorno DATABASE_URL.
-
-    No devuelve nada, solo se encarga de crear las tablas de la base de datos.
-    """
-
-    # Conectar a la base de datos
-    async with engine.begin() as conn:
-        # importar el modelo solo si se necesita
-        from db.database import Base
-        
-        # Crear las tablas segun el modelo
-        await conn.run_sync(Base.metadata.create_all)
+# Duración y código de cada petición para /metrics, y Server-Timing con el perfilado activado
+app.add_middleware(MetricsMiddleware)
 
 # Resto de tus rutas
 app.include_router(weather_data)
 app.include_router(temperature_stats)
 app.include_router(rain_stats)
-app.include_router(general_stats)
\ No newline at end of file
+app.include_router(general_stats)
+app.include_router(compare_stats)
+app.include_router(series)
+app.include_router(jobs)
+app.include_router(admin)
\ No newline at end of file
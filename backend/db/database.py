@@ -1,18 +1,109 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from contextlib import AsyncExitStack
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from options.settings import (
+    DATABASE_URL, DATABASE_READ_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_ECHO,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE,
+)
 
-# URL de la base de datos
-DATABASE_URL = "sqlite+aiosqlite:///./openmeteo.db"
 
-# Configuración de la base de datos
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+def _sqlite_pragmas(read_only: bool) -> list:
+    """
+    PRAGMAs que se aplican a cada conexión SQLite.
+
+    WAL permite que los lectores sigan consultando mientras una carga
+    escribe; con WAL, synchronous=NORMAL es seguro ante caídas de la
+    aplicación. busy_timeout hace esperar a los escritores concurrentes en
+    lugar de fallar con "database is locked". Las conexiones de lectura
+    se abren con query_only para que nunca tomen el cerrojo de escritura.
+    """
+    pragmas = [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def create_engine_for(url: str, read_only: bool = False) -> AsyncEngine:
+    """
+    Crea un motor asíncrono para una URL de base de datos.
+
+    Con SQLite se aplican los PRAGMAs de _sqlite_pragmas al abrir cada
+    conexión. Con PostgreSQL (postgresql+asyncpg, requiere instalar asyncpg)
+    se usa el pool configurado en options.settings. Las consultas y los
+    INSERT ... ON CONFLICT son los mismos en los dos; solo son de SQLite las
+    migraciones desde los esquemas anteriores (una BD de PostgreSQL se crea
+    directamente con el actual) y POST /admin/vacuum.
+
+    Parámetros:
+        - url (str): URL asíncrona de SQLAlchemy
+        - read_only (bool): motor solo de lectura
+
+    Devuelve un objeto AsyncEngine.
+    """
+    is_sqlite = make_url(url).get_backend_name() == "sqlite"
+    options = {"echo": DB_ECHO, "pool_pre_ping": not is_sqlite}
+    if ":memory:" not in url:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    new_engine = create_async_engine(url, **options)
+
+    if is_sqlite:
+        pragmas = _sqlite_pragmas(read_only)
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return new_engine
+
+
+# Motor de escritura (cargas, migraciones) y motor de lectura (consultas y estadísticas)
+engine = create_engine_for(DATABASE_URL)
+# Una base de datos en memoria no se puede compartir entre motores
+read_engine = engine if ":memory:" in DATABASE_READ_URL else create_engine_for(DATABASE_READ_URL, read_only=True)
 
 # Configuración de la sesión
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+AsyncReadSessionLocal = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
 
 # base de datos
 Base = declarative_base()
 
+
+def upsert(table):
+    """
+    Devuelve un INSERT con soporte de ON CONFLICT para el dialecto del motor de escritura.
+
+    SQLite y PostgreSQL comparten la misma API (on_conflict_do_nothing,
+    on_conflict_do_update y excluded).
+
+    Parámetros:
+        - table (Table): tabla de destino
+
+    Devuelve un objeto Insert.
+    """
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
 # Obtención de sesión queda abierta hasta salir de la función gracias a yield
 async def get_session():
     """
@@ -25,4 +116,57 @@ async def get_session():
     :rtype: AsyncSession 
     """
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def get_read_session():
+    """
+    Obtiene una sesión del motor de lectura, para los endpoints que solo consultan.
+
+    :yield:
+
+    :rtype: AsyncSession
+    """
+    async with AsyncReadSessionLocal() as session:
+        yield session
+
+
+async def prime_pool(target: AsyncEngine, connections: int):
+    """
+    Abre de antemano conexiones del pool de un motor.
+
+    Cada conexión nueva paga la apertura del fichero y los PRAGMAs (o la
+    conexión al servidor); abriéndolas al arrancar, las primeras peticiones
+    de cada worker no lo notan. Las conexiones se mantienen abiertas a la
+    vez, para que sean distintas, y vuelven al pool al terminar.
+
+    Parámetros:
+        - target (AsyncEngine): motor
+        - connections (int): número de conexiones, como mucho el tamaño del pool
+    """
+    if ":memory:" in str(target.url):
+        connections = 1
+    async with AsyncExitStack() as stack:
+        for _ in range(min(connections, DB_POOL_SIZE)):
+            conn = await stack.enter_async_context(target.connect())
+            await conn.exec_driver_sql("SELECT 1")
+
+
+async def prime_pools():
+    """
+    Abre todo el pool del motor de lectura, que atiende las consultas, y una conexión del de escritura.
+    """
+    if read_engine is not engine:
+        await prime_pool(read_engine, DB_POOL_SIZE)
+        await prime_pool(engine, 1)
+    else:
+        await prime_pool(engine, DB_POOL_SIZE)
+
+
+async def dispose_engines():
+    """
+    Cierra las conexiones de los pools de lectura y escritura.
+    """
+    if read_engine is not engine:
+        await read_engine.dispose()
+    await engine.dispose()
@@ -0,0 +1,219 @@
+from sqlalchemy import inspect, text
+from models.job import IngestJobDB
+from models.location import LocationDB
+from db.types import HOUR_OFFSET
+from models.weatherData import WeatherDataDB
+from models.weatherDaily import WeatherDailyDB
+from models.citySummary import CitySummaryDB
+from services.buckets import daily_select, location_buckets, buckets_upsert
+from services.locations import normalize_city
+from services.rollups import daily_rollup_upsert, city_summary_upsert
+
+
+def _index_names(conn, table: str) -> set:
+    """
+    Devuelve los nombres de los índices existentes de una tabla.
+    """
+    return {ix["name"] for ix in inspect(conn).get_indexes(table)}
+
+
+def _column_names(conn, table: str) -> set:
+    """
+    Devuelve los nombres de las columnas existentes de una tabla.
+    """
+    return {col["name"] for col in inspect(conn).get_columns(table)}
+
+
+def _location_data_version(conn):
+    """
+    Añade la versión de datos a una tabla locations ya existente.
+    """
+    if "data_version" not in _column_names(conn, "locations"):
+        conn.execute(text("ALTER TABLE locations ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _weather_location_key(conn):
+    """
+    Normaliza la ciudad de weather_data en la tabla de localizaciones.
+
+    Añade la columna location_id a una tabla weather_data ya existente, crea
+    una localización por cada ciudad distinta (sin distinguir mayúsculas) y
+    rellena la clave en todas las filas. Después elimina las horas duplicadas,
+    conservando la primera fila insertada, y sustituye el índice único
+    (city, datetime) por el índice compuesto (location_id, datetime).
+    """
+    if "ts" in _column_names(conn, "weather_data"):
+        return
+    if "ux_weather_data_location_datetime" in _index_names(conn, "weather_data"):
+        return
+
+    # Añadir la columna si la tabla viene de una versión anterior
+    if "location_id" not in _column_names(conn, "weather_data"):
+        conn.execute(text("ALTER TABLE weather_data ADD COLUMN location_id INTEGER REFERENCES locations(id)"))
+
+    # Crear las localizaciones con la normalización de Python (lower de SQLite solo cubre ASCII)
+    cities = conn.execute(text(
+        "SELECT city, MIN(latitude), MIN(longitude) FROM weather_data "
+        "WHERE location_id IS NULL GROUP BY city ORDER BY MIN(id)"
+    )).all()
+    for city, lat, lon in cities:
+        key = normalize_city(city)
+        location_id = conn.execute(
+            text("SELECT id FROM locations WHERE city_key = :key"), {"key": key}
+        ).scalar()
+        if location_id is None:
+            location_id = conn.execute(
+                LocationDB.__table__.insert().values(city_key=key, name=city.strip(), latitude=lat, longitude=lon)
+            ).inserted_primary_key[0]
+        conn.execute(
+            text("UPDATE weather_data SET location_id = :location_id WHERE city = :city"),
+            {"location_id": location_id, "city": city},
+        )
+
+    # Eliminar duplicados conservando el id más bajo
+    conn.execute(text(
+        "DELETE FROM weather_data WHERE id NOT IN "
+        "(SELECT MIN(id) FROM weather_data GROUP BY location_id, datetime)"
+    ))
+
+    # Sustituir el índice antiguo por el compuesto
+    conn.execute(text("DROP INDEX IF EXISTS ux_weather_data_city_datetime"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX ux_weather_data_location_datetime ON weather_data (location_id, datetime)"
+    ))
+
+
+def _weather_compact_layout(conn):
+    """
+    Convierte weather_data al formato compacto (location_id, ts, temperature_2m, precipitation).
+
+    Copia las horas de la tabla anterior, que repetía ciudad y coordenadas
+    en cada fila y guardaba la fecha como texto, a la tabla nueva sin rowid
+    con clave primaria (location_id, ts) y borra la anterior. Los resúmenes
+    guardaban días y horas como fechas, así que se vacían y se recrean con
+    enteros; las migraciones siguientes los vuelven a calcular. El espacio
+    liberado se recupera con POST /admin/vacuum.
+    """
+    if "ts" in _column_names(conn, "weather_data"):
+        return
+
+    conn.execute(text("ALTER TABLE weather_data RENAME TO weather_data_rowid"))
+    conn.execute(text("DROP INDEX IF EXISTS ux_weather_data_location_datetime"))
+    WeatherDataDB.__table__.create(conn)
+
+    # Horas desde 1970 con división entera redondeando hacia abajo (también antes de 1970)
+    conn.execute(text(
+        "INSERT OR IGNORE INTO weather_data (location_id, ts, temperature_2m, precipitation) "
+        "SELECT location_id, "
+        "(CAST(strftime('%s', datetime) AS INTEGER) + :offset * 3600) / 3600 - :offset, "
+        "temperature_2m, precipitation FROM weather_data_rowid "
+        "WHERE location_id IS NOT NULL ORDER BY location_id, datetime, id"
+    ), {"offset": HOUR_OFFSET})
+    conn.execute(text("DROP TABLE weather_data_rowid"))
+
+    # Resúmenes con el nuevo formato de días y horas
+    for table in (CitySummaryDB.__table__, WeatherDailyDB.__table__):
+        table.drop(conn, checkfirst=True)
+    for table in (WeatherDailyDB.__table__, CitySummaryDB.__table__):
+        table.create(conn)
+
+
+def _weather_daily_precip_max(conn):
+    """
+    Añade la precipitación máxima por hora a un resumen diario ya existente y la recalcula.
+    """
+    if "precip_max" in _column_names(conn, "weather_daily"):
+        return
+    conn.execute(text("ALTER TABLE weather_daily ADD COLUMN precip_max FLOAT"))
+    conn.execute(daily_rollup_upsert())
+
+
+def _weather_daily_backfill(conn):
+    """
+    Rellena el resumen diario weather_daily a partir de los datos horarios ya guardados.
+
+    Solo actúa si el resumen está vacío y hay datos horarios, es decir, la
+    primera vez que arranca una base de datos anterior al resumen.
+    """
+    if conn.execute(text("SELECT 1 FROM weather_daily LIMIT 1")).first():
+        return
+    if not conn.execute(text("SELECT 1 FROM weather_data LIMIT 1")).first():
+        return
+    conn.execute(daily_rollup_upsert())
+
+
+def _city_summary_backfill(conn):
+    """
+    Rellena el resumen por ciudad city_summary a partir del resumen diario.
+
+    Solo actúa si el resumen por ciudad está vacío y hay resumen diario.
+    """
+    if conn.execute(text("SELECT 1 FROM city_summary LIMIT 1")).first():
+        return
+    if not conn.execute(text("SELECT 1 FROM weather_daily LIMIT 1")).first():
+        return
+    conn.execute(city_summary_upsert())
+
+
+def _weather_buckets_backfill(conn):
+    """
+    Rellena las semanas, meses y años de weather_buckets a partir del resumen diario.
+
+    Solo actúa si la tabla de periodos está vacía y hay resumen diario.
+    """
+    if conn.execute(text("SELECT 1 FROM weather_buckets LIMIT 1")).first():
+        return
+    location_ids = conn.execute(text("SELECT DISTINCT location_id FROM weather_daily")).scalars().all()
+    for location_id in location_ids:
+        rows = location_buckets(location_id, conn.execute(daily_select(location_id)).mappings().all())
+        if rows:
+            conn.execute(buckets_upsert(), rows)
+
+
+def _ingest_jobs_active_unique(conn):
+    """
+    Crea el índice único parcial de los trabajos activos en una tabla ingest_jobs ya existente.
+
+    Antes del índice dos procesos podían encolar el mismo trabajo: de los
+    activos repetidos se conserva el más antiguo y el resto se marca como
+    fallido.
+    """
+    if "ux_ingest_jobs_active" in _index_names(conn, "ingest_jobs"):
+        return
+    conn.execute(text(
+        "UPDATE ingest_jobs SET status = 'failed', error = 'Trabajo duplicado' "
+        "WHERE status IN ('queued', 'running') AND EXISTS ("
+        "SELECT 1 FROM ingest_jobs AS older WHERE older.city_key = ingest_jobs.city_key "
+        "AND older.start_date = ingest_jobs.start_date AND older.end_date = ingest_jobs.end_date "
+        "AND older.status IN ('queued', 'running') "
+        "AND (older.created_at < ingest_jobs.created_at "
+        "OR (older.created_at = ingest_jobs.created_at AND older.id < ingest_jobs.id)))"
+    ))
+    next(ix for ix in IngestJobDB.__table__.indexes if ix.name == "ux_ingest_jobs_active").create(conn)
+
+
+# Migraciones en orden de aplicación, todas idempotentes
+MIGRATIONS = [
+    _location_data_version,
+    _weather_location_key,
+    _weather_compact_layout,
+    _weather_daily_precip_max,
+    _weather_daily_backfill,
+    _city_summary_backfill,
+    _weather_buckets_backfill,
+    _ingest_jobs_active_unique,
+]
+
+
+def run_migrations(conn):
+    """
+    Aplica las migraciones pendientes sobre una base de datos existente.
+
+    Se ejecuta con conn.run_sync después de create_all. En una base de datos
+    nueva las tablas ya se crean con el esquema actual y cada migración
+    detecta que no tiene nada que hacer.
+
+    No devuelve nada.
+    """
+    for migration in MIGRATIONS:
+        migration(conn)
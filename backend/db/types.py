@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Integer, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_DAY = EPOCH.date()
+
+# Horas por día, para pasar de horas a días en SQL
+HOURS_PER_DAY = 24
+
+# Desplazamiento (múltiplo de 24) para que la división entera en SQL redondee hacia abajo también antes de 1970
+HOUR_OFFSET = HOURS_PER_DAY * 1_000_000
+
+
+def to_hours(dt: datetime) -> int:
+    """
+    Convierte una fecha sin zona horaria en horas desde 1970-01-01, redondeando hacia abajo.
+    """
+    return (dt - EPOCH) // timedelta(hours=1)
+
+
+def from_hours(hours: int) -> datetime:
+    """
+    Convierte horas desde 1970-01-01 en una fecha sin zona horaria.
+    """
+    return EPOCH + timedelta(hours=int(hours))
+
+
+def ceil_hour(dt: datetime) -> datetime:
+    """
+    Redondea una fecha hacia arriba a la hora en punto.
+
+    Se usa en los límites inferiores de los rangos: una hora guardada como
+    entero solo cumple "desde las 05:30" si es las 06:00 o posterior.
+    """
+    floor = from_hours(to_hours(dt))
+    return floor if floor == dt else floor + timedelta(hours=1)
+
+
+def utcnow() -> datetime:
+    """
+    Devuelve la hora actual en UTC sin zona horaria, como se guardan las fechas en la BD.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def day_of(hours_column):
+    """
+    Expresión SQL con el día de una columna EpochHour, con tipo EpochDay.
+
+    Solo usa aritmética entera, así que es igual en SQLite y en PostgreSQL.
+    """
+    hours = type_coerce(hours_column, Integer)
+    return type_coerce((hours + HOUR_OFFSET) // HOURS_PER_DAY - HOUR_OFFSET // HOURS_PER_DAY, EpochDay)
+
+
+class EpochHour(TypeDecorator):
+    """
+    Fecha y hora guardada como entero de horas desde 1970-01-01.
+
+    En Python se usa como datetime sin zona horaria; también acepta enteros
+    ya convertidos, que es lo que usa la carga masiva.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return to_hours(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_hours(value)
+
+
+class EpochDay(TypeDecorator):
+    """
+    Fecha guardada como entero de días desde 1970-01-01.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return (value - EPOCH_DAY).days
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else EPOCH_DAY + timedelta(days=int(value))
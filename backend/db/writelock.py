@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from sqlalchemy.engine import make_url
+from options.settings import DATABASE_URL, WRITE_LOCK_PATH
+
+# fcntl solo existe en Unix: sin él el cerrojo solo ordena las tareas del propio proceso
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Espera máxima en segundos entre dos intentos de tomar el cerrojo del fichero
+POLL_MAX = 0.1
+
+
+def default_lock_path(url: str = DATABASE_URL) -> Optional[str]:
+    """
+    Devuelve la ruta del fichero de cerrojo junto a la BD SQLite.
+
+    Parámetros:
+        - url (str): URL de la base de datos de escritura
+
+    Devuelve la ruta <fichero de la BD>.write.lock, o None si la BD no es
+    un fichero SQLite (en memoria o un servidor, que ya admite varios escritores).
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return None
+    return f"{parsed.database}.write.lock"
+
+
+class WriteLock:
+    """
+    Cerrojo de escritura compartido por todos los procesos que sirven la aplicación.
+
+    SQLite admite un único escritor: con varios workers, dos cargas a la
+    vez se estorban esperando el cerrojo de la BD (busy_timeout) y la que
+    llega tarde puede fallar. Las escrituras se ponen en cola con un flock
+    exclusivo sobre un fichero junto a la BD; las lecturas no lo usan, así
+    que todos los workers siguen atendiendo consultas mientras uno escribe.
+    Dentro de un proceso un asyncio.Lock ordena las tareas, porque flock no
+    distingue entre dos tomas del mismo proceso.
+
+    La espera por el fichero se hace reintentando sin bloquear, de modo que
+    una tarea cancelada mientras espera nunca deja el cerrojo tomado. Tras
+    un fork el fichero se vuelve a abrir: un descriptor heredado compartiría
+    el cerrojo con el proceso padre.
+
+    Parámetros:
+        - path (str): fichero de cerrojo, None si la BD admite varios escritores (el cerrojo no hace nada)
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+        self.acquisitions = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _local_lock(self) -> asyncio.Lock:
+        """
+        Devuelve el cerrojo del proceso, uno por bucle de eventos.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _file(self) -> int:
+        """
+        Devuelve el descriptor del fichero de cerrojo abierto por este proceso.
+        """
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _try_lock(self, fd: int) -> bool:
+        """
+        Intenta tomar el cerrojo del fichero sin bloquear.
+        """
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    @asynccontextmanager
+    async def hold(self):
+        """
+        Mantiene el cerrojo de escritura durante el bloque with. Sin fichero de cerrojo no espera.
+        """
+        if self.path is None:
+            yield
+            return
+
+        started = time.perf_counter()
+        local = self._local_lock()
+        waited = local.locked()
+        async with local:
+            fd = self._file() if fcntl is not None else None
+            if fd is not None and not self._try_lock(fd):
+                waited = True
+                delay = 0.005
+                while not self._try_lock(fd):
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, POLL_MAX)
+            self.acquisitions += 1
+            if waited:
+                self.waits += 1
+                self.wait_seconds += time.perf_counter() - started
+            try:
+                yield
+            finally:
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        """
+        Devuelve el fichero de cerrojo y las tomas, las esperas y los segundos esperados en este proceso.
+        """
+        return {
+            "path": self.path,
+            "inter_process": self.path is not None and fcntl is not None,
+            "acquisitions": self.acquisitions,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+# Cerrojo de las escrituras en la BD de OPENMETEO_DATABASE_URL
+write_lock = WriteLock(WRITE_LOCK_PATH or default_lock_path())
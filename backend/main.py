@@ -1,5 +1,110 @@
+import argparse
+import asyncio
+import os
 import uvicorn
 
+
+def parse_args() -> argparse.Namespace:
+    """
+    Lee las opciones de la línea de comandos. Los valores no indicados se toman de options.settings.
+    """
+    parser = argparse.ArgumentParser(description="Arranca la API de OpenMeteo")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--reload", action="store_true",
+                      help="modo desarrollo: un proceso que se reinicia al cambiar el código (por defecto)")
+    mode.add_argument("--prod", action="store_true",
+                      help="modo producción: varios procesos worker con la aplicación precargada")
+    parser.add_argument("--host", help="dirección de escucha (OPENMETEO_HOST)")
+    parser.add_argument("--port", type=int, help="puerto (OPENMETEO_PORT)")
+    parser.add_argument("--workers", type=int, help="procesos worker en modo producción (OPENMETEO_WORKERS)")
+    return parser.parse_args()
+
+
+def run_dev(host: str, port: int):
+    """
+    Modo desarrollo: uvicorn con recarga automática en un solo proceso.
+    """
+    uvicorn.run("api:app", host=host, port=port, reload=True)
+
+
+async def warm_up():
+    """
+    Preparación en el proceso principal antes de crear los workers.
+
+    Crea las tablas, aplica las migraciones y devuelve a la cola los
+    trabajos de carga que quedaron en curso, una sola vez para todo el
+    servidor. Después cierra las conexiones para que ningún worker herede
+    una conexión SQLite abierta.
+    """
+    from api import prepare_database
+    from db.database import dispose_engines
+    from services.jobs import recover_jobs
+
+    await prepare_database()
+    await recover_jobs()
+    await dispose_engines()
+
+
+def gunicorn_server(app, options: dict):
+    """
+    Crea un servidor gunicorn que sirve app con las opciones dadas.
+
+    Lanza ImportError si gunicorn o uvicorn-worker no están instalados (requirementsProd.txt).
+    """
+    from gunicorn.app.base import BaseApplication
+    import uvicorn_worker  # noqa: F401  clase de worker ASGI de gunicorn
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    return Server()
+
+
+def run_prod(host: str, port: int, workers: int):
+    """
+    Modo producción: varios procesos worker, cada uno con su bucle de eventos.
+
+    Con gunicorn y uvicorn-worker (solo Unix) la aplicación se importa una vez en el proceso
+    principal (numpy, pyarrow, modelos y rutas) y los workers se crean con
+    fork ya precargados, de modo que comparten esas páginas de memoria y
+    arrancan al momento. Sin gunicorn se usan los workers de uvicorn, que
+    importan la aplicación cada uno. En ambos casos cada worker ejecuta el
+    lifespan de api.py: abre sus conexiones, su cliente HTTP, su pool de
+    cálculos y su cola de cargas. Las escrituras en SQLite se coordinan
+    entre los workers con db.writelock.
+    """
+    from api import app
+
+    asyncio.run(warm_up())
+    try:
+        server = gunicorn_server(app, {
+            "bind": f"{host}:{port}",
+            "workers": workers,
+            "worker_class": "uvicorn_worker.UvicornWorker",
+            "preload_app": True,
+        })
+    except ImportError:
+        uvicorn.run("api:app", host=host, port=port, workers=workers)
+        return
+    server.run()
+
+
 # Función principal main para ejecutar la aplicación usando uvicorn
 if __name__ == "__main__":
-    uvicorn.run("api:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    args = parse_args()
+    if args.prod:
+        # Los trabajos en curso se retoman en warm_up, no en cada worker
+        os.environ["OPENMETEO_RECOVER_JOBS"] = "0"
+
+    from options.settings import SERVER_HOST, SERVER_PORT, SERVER_WORKERS
+    host = args.host or SERVER_HOST
+    port = args.port or SERVER_PORT
+    if args.prod:
+        run_prod(host, port, args.workers or SERVER_WORKERS)
+    else:
+        run_dev(host, port)
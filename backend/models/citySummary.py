@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey
+from db.database import Base
+from db.types import EpochDay, EpochHour
+from models.location import LocationDB
+
+class CitySummaryDB(Base):
+    __tablename__ = "city_summary"
+
+    location_id = Column(Integer, ForeignKey(LocationDB.id), primary_key=True)
+    start_date = Column(EpochDay, nullable=False)
+    end_date = Column(EpochDay, nullable=False)
+    hours = Column(Integer, nullable=False)
+    temp_count = Column(Integer, nullable=False)
+    temp_sum = Column(Float)
+    precip_total = Column(Float, nullable=False)
+    days_with_precip = Column(Integer, nullable=False)
+    precip_max_date = Column(EpochDay)
+    precip_max_value = Column(Float)
+    temp_max_at = Column(EpochHour)
+    temp_max_value = Column(Float)
+    temp_min_at = Column(EpochHour)
+    temp_min_value = Column(Float)
+
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Float, String, Boolean, DateTime
+from db.database import Base
+
+class GeocodeCacheDB(Base):
+    __tablename__ = "geocode_cache"
+
+    query_key = Column(String, primary_key=True)
+    found = Column(Boolean, nullable=False)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    fetched_at = Column(DateTime, nullable=False)
+
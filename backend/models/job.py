@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, Index
+from db.database import Base
+
+class IngestJobDB(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True)
+    city = Column(String, nullable=False)
+    city_key = Column(String, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    # queued, running, done o failed
+    status = Column(String, nullable=False)
+    rows_total = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    error = Column(String)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        # Búsqueda de trabajos activos para la misma ciudad y rango
+        Index("ix_ingest_jobs_key_status", "city_key", "start_date", "end_date", "status"),
+        # Un único trabajo en cola o en curso por ciudad y rango, también entre procesos
+        Index(
+            "ux_ingest_jobs_active", "city_key", "start_date", "end_date", unique=True,
+            sqlite_where=status.in_(("queued", "running")), postgresql_where=status.in_(("queued", "running")),
+        ),
+    )
+
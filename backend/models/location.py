@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, Float, String
+from db.database import Base
+
+class LocationDB(Base):
+    __tablename__ = "locations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    city_key = Column(String, nullable=False, unique=True)
+    name = Column(String, nullable=False)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    # Se incrementa cada vez que la carga escribe datos de la ciudad
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+
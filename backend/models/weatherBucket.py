@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Float, String, ForeignKey
+from db.database import Base
+from db.types import EpochDay
+from models.location import LocationDB
+
+class WeatherBucketDB(Base):
+    __tablename__ = "weather_buckets"
+
+    # Una fila por ciudad, resolución (week, month o year) y primer día del periodo
+    location_id = Column(Integer, ForeignKey(LocationDB.id), primary_key=True)
+    resolution = Column(String, primary_key=True)
+    start = Column(EpochDay, primary_key=True)
+    hours = Column(Integer, nullable=False)
+    temp_count = Column(Integer, nullable=False)
+    temp_sum = Column(Float)
+    temp_min = Column(Float)
+    temp_max = Column(Float)
+    precip_count = Column(Integer, nullable=False)
+    precip_sum = Column(Float, nullable=False)
+    precip_max = Column(Float)
+
+    __table_args__ = {"sqlite_with_rowid": False}
+
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey
+from db.database import Base
+from db.types import EpochDay, EpochHour
+from models.location import LocationDB
+
+class WeatherDailyDB(Base):
+    __tablename__ = "weather_daily"
+
+    location_id = Column(Integer, ForeignKey(LocationDB.id), primary_key=True)
+    day = Column(EpochDay, primary_key=True)
+    hours = Column(Integer, nullable=False)
+    temp_count = Column(Integer, nullable=False)
+    temp_sum = Column(Float)
+    temp_min = Column(Float)
+    temp_min_at = Column(EpochHour)
+    temp_max = Column(Float)
+    temp_max_at = Column(EpochHour)
+    hours_above = Column(Integer, nullable=False)
+    hours_below = Column(Integer, nullable=False)
+    precip_count = Column(Integer, nullable=False)
+    precip_sum = Column(Float, nullable=False)
+    precip_hours = Column(Integer, nullable=False)
+    precip_max = Column(Float)
+
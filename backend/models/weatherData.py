@@ -1,14 +1,18 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime
+from sqlalchemy import Column, Integer, Float, ForeignKey
 from db.database import Base
+from db.types import EpochHour
+from models.location import LocationDB
 
 class WeatherDataDB(Base):
     __tablename__ = "weather_data"
 
-    id = Column(Integer, primary_key=True, index=True)
-    city = Column(String, nullable=False)
-    datetime = Column(DateTime, nullable=False)
+    # Una sola fila por ciudad y hora; la clave primaria agrupa físicamente las horas de cada ciudad
+    location_id = Column(Integer, ForeignKey(LocationDB.id), primary_key=True)
+    # Hora local de la API en horas desde 1970-01-01
+    ts = Column(EpochHour, primary_key=True, autoincrement=False)
     temperature_2m = Column(Float)
     precipitation = Column(Float)
-    latitude = Column(Float)
-    longitude = Column(Float)
+
+    # En SQLite la tabla es la propia clave primaria, sin rowid ni índice aparte
+    __table_args__ = {"sqlite_with_rowid": False}
 
@@ -30,5 +30,37 @@ tags_metadata = [
             "description": "Estadísticas generales",
             "url": "https://fastapi.tiangolo.com/"
         }
+  },
+  {
+    "name": "compare_stats",
+    "description": "<b>Comparación de ciudades.</b> <br/>Estadísticas de temperatura y precipitación de varias ciudades para un mismo rango de fechas en una sola petición.",
+    "externalDocs": {
+            "description": "Comparación de ciudades",
+            "url": "https://fastapi.tiangolo.com/"
+        }
+  },
+  {
+    "name": "series",
+    "description": "<b>Series agregadas.</b> <br/>Temperatura y precipitación de una ciudad por hora, día, semana, mes o año, para gráficas de rangos largos.",
+    "externalDocs": {
+            "description": "Series agregadas",
+            "url": "https://fastapi.tiangolo.com/"
+        }
+  },
+  {
+    "name": "jobs",
+    "description": "<b>Trabajos de carga.</b> <br/>Consulta del estado de las cargas encoladas con POST /load_weather?background=true.",
+    "externalDocs": {
+            "description": "Trabajos de carga",
+            "url": "https://fastapi.tiangolo.com/"
+        }
+  },
+  {
+    "name": "admin",
+    "description": "<b>Administración.</b> <br/>Consulta del estado interno de la aplicación, como los contadores de las cachés y las métricas de /metrics.",
+    "externalDocs": {
+            "description": "Administración",
+            "url": "https://fastapi.tiangolo.com/"
+        }
   }
 ]
\ No newline at end of file
@@ -0,0 +1,101 @@
+import os
+
+# Parámetros de ejecución configurables mediante variables de entorno
+
+# Número de filas por lote en las inserciones masivas
+INGEST_BATCH_SIZE = int(os.getenv("OPENMETEO_INGEST_BATCH_SIZE", "5000"))
+
+# Caché de geocodificación: entradas en memoria y vigencia en segundos
+GEOCODE_CACHE_SIZE = int(os.getenv("OPENMETEO_GEOCODE_CACHE_SIZE", "1024"))
+GEOCODE_CACHE_TTL = float(os.getenv("OPENMETEO_GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = float(os.getenv("OPENMETEO_GEOCODE_NEGATIVE_TTL", str(24 * 3600)))
+
+# Cliente HTTP compartido hacia Open-Meteo
+HTTP_MAX_CONNECTIONS = int(os.getenv("OPENMETEO_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("OPENMETEO_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OPENMETEO_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("OPENMETEO_HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("OPENMETEO_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP2 = os.getenv("OPENMETEO_HTTP2", "1") == "1"
+HTTP_PER_HOST_CONCURRENCY = int(os.getenv("OPENMETEO_HTTP_PER_HOST_CONCURRENCY", "4"))
+HTTP_MAX_RETRIES = int(os.getenv("OPENMETEO_HTTP_MAX_RETRIES", "5"))
+HTTP_BACKOFF_BASE = float(os.getenv("OPENMETEO_HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("OPENMETEO_HTTP_BACKOFF_MAX", "30"))
+
+# Días máximos por consulta a la API de archivo, los huecos mayores se trocean
+ARCHIVE_CHUNK_DAYS = int(os.getenv("OPENMETEO_ARCHIVE_CHUNK_DAYS", "366"))
+
+# Ubicaciones máximas por consulta multi-ubicación a la API de archivo
+ARCHIVE_BATCH_LOCATIONS = int(os.getenv("OPENMETEO_ARCHIVE_BATCH_LOCATIONS", "50"))
+
+# Umbrales de temperatura por defecto de /stats/temperature, precalculados en el resumen diario
+STATS_THRESHOLD_HIGH = float(os.getenv("OPENMETEO_STATS_THRESHOLD_HIGH", "30.0"))
+STATS_THRESHOLD_LOW = float(os.getenv("OPENMETEO_STATS_THRESHOLD_LOW", "0.0"))
+
+# Ciudades máximas por petición de GET /stats/compare
+COMPARE_MAX_CITIES = int(os.getenv("OPENMETEO_COMPARE_MAX_CITIES", "500"))
+
+# Ciudades máximas por petición de POST /load_weather/batch
+BATCH_MAX_CITIES = int(os.getenv("OPENMETEO_BATCH_MAX_CITIES", "500"))
+
+# Días máximos del rango de GET /series/{city} con resolution=hour (las demás resoluciones no tienen límite)
+SERIES_HOUR_MAX_DAYS = int(os.getenv("OPENMETEO_SERIES_HOUR_MAX_DAYS", "366"))
+
+# Caché columnar en memoria de las series horarias de las ciudades más consultadas
+SERIES_CACHE_MAX_BYTES = int(os.getenv("OPENMETEO_SERIES_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SERIES_CACHE_ADMIT_AFTER = int(os.getenv("OPENMETEO_SERIES_CACHE_ADMIT_AFTER", "2"))
+
+# Filas por lote al transmitir los datos horarios de GET /weather/{city}
+STREAM_BATCH_SIZE = int(os.getenv("OPENMETEO_STREAM_BATCH_SIZE", "1000"))
+
+# Filas por bloque al construir las exportaciones columnares
+EXPORT_BATCH_SIZE = int(os.getenv("OPENMETEO_EXPORT_BATCH_SIZE", "50000"))
+# Filas máximas de una exportación npz, que se construye entera en memoria (parquet y arrow se transmiten por bloques)
+EXPORT_NPZ_MAX_ROWS = int(os.getenv("OPENMETEO_EXPORT_NPZ_MAX_ROWS", "5000000"))
+
+# Caché de respuestas de /stats: presupuesto de memoria en bytes y max-age de Cache-Control (0 = revalidar siempre)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("OPENMETEO_RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("OPENMETEO_RESPONSE_CACHE_MAX_AGE", "0"))
+
+# Trabajos de carga en segundo plano: número de cargas simultáneas
+JOB_WORKERS = int(os.getenv("OPENMETEO_JOB_WORKERS", "2"))
+
+# Ejecutor de los cálculos de estadísticas: thread, process o inline (en el bucle de eventos)
+STATS_EXECUTOR = os.getenv("OPENMETEO_STATS_EXECUTOR", "thread")
+STATS_EXECUTOR_WORKERS = int(os.getenv("OPENMETEO_STATS_EXECUTOR_WORKERS", "4"))
+STATS_EXECUTOR_TIMEOUT = float(os.getenv("OPENMETEO_STATS_EXECUTOR_TIMEOUT", "30"))
+
+# Base de datos: URL de escritura y, opcionalmente, de lectura (réplica); por defecto la misma.
+# SQLite (sqlite+aiosqlite) o PostgreSQL (postgresql+asyncpg, con asyncpg instalado)
+DATABASE_URL = os.getenv("OPENMETEO_DATABASE_URL", "sqlite+aiosqlite:///./openmeteo.db")
+DATABASE_READ_URL = os.getenv("OPENMETEO_DATABASE_READ_URL", DATABASE_URL)
+DB_POOL_SIZE = int(os.getenv("OPENMETEO_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("OPENMETEO_DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("OPENMETEO_DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("OPENMETEO_DB_POOL_RECYCLE", "3600"))
+DB_ECHO = os.getenv("OPENMETEO_DB_ECHO", "0") == "1"
+
+# SQLite: PRAGMAs aplicados a cada conexión
+SQLITE_JOURNAL_MODE = os.getenv("OPENMETEO_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("OPENMETEO_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("OPENMETEO_SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("OPENMETEO_SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_MMAP_SIZE = int(os.getenv("OPENMETEO_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Métricas de /metrics y fases instrumentadas; con OPENMETEO_PROFILING=1 las peticiones con X-Profile: 1 reciben Server-Timing
+METRICS_ENABLED = os.getenv("OPENMETEO_METRICS_ENABLED", "1") == "1"
+PROFILING = os.getenv("OPENMETEO_PROFILING", "0") == "1"
+
+# Token de POST /admin/rebuild_summaries y /admin/vacuum (cabecera X-Admin-Token); vacío = rutas desactivadas
+ADMIN_TOKEN = os.getenv("OPENMETEO_ADMIN_TOKEN", "")
+
+# Modo de producción (python main.py --prod): dirección, puerto y número de procesos worker (por defecto uno por núcleo)
+SERVER_HOST = os.getenv("OPENMETEO_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("OPENMETEO_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("OPENMETEO_WORKERS", str(os.cpu_count() or 1)))
+
+# Fichero del cerrojo entre procesos de las escrituras en SQLite; vacío = <fichero de la BD>.write.lock
+WRITE_LOCK_PATH = os.getenv("OPENMETEO_WRITE_LOCK_PATH", "")
+
+# Retomar al arrancar los trabajos de carga que quedaron en curso; el modo de producción lo hace una vez antes de crear los workers
+RECOVER_JOBS = os.getenv("OPENMETEO_RECOVER_JOBS", "1") == "1"
@@ -0,0 +1,128 @@
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Optional
+from db.database import AsyncSessionLocal, engine
+from db.writelock import write_lock
+from options.settings import ADMIN_TOKEN
+from services.openmeteo import get_geocode_cache, archive_flight
+from services.rollups import rebuild_aggregates
+from services.series_cache import get_series_cache
+from services.response_cache import get_response_cache
+from services.ingest import load_flight, city_locks
+from services.stats import stats_flight
+from services.executor import get_executor
+from services.metrics import render_metrics
+
+admin = APIRouter()
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Protege las operaciones de mantenimiento, que toman el cerrojo de escritura y recorren toda la BD.
+
+    Sin OPENMETEO_ADMIN_TOKEN las operaciones están desactivadas. Si no
+    se recibe el token en la cabecera X-Admin-Token, se lanzará un
+    HTTPException con código 403.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Operación desactivada, configure OPENMETEO_ADMIN_TOKEN")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+
+@admin.get("/admin/caches", tags=["admin"])
+async def get_cache_stats() -> Dict:
+    """
+    Estado de las cachés de la aplicación.
+
+    Devuelve un objeto dict con los contadores de cada caché:
+        - geocoding (dict): aciertos en memoria y en BD, fallos, respaldos caducados y tamaño
+        - series (dict): aciertos, fallos, expulsiones, ciudades en memoria y bytes ocupados
+        - responses (dict): aciertos, respuestas 304, fallos, expulsiones, entradas y bytes ocupados
+        - coalescing (dict): por tipo de trabajo, ejecuciones y llamadas agrupadas en una ejecución en curso
+        - executor (dict): modo y cálculos de estadísticas en curso, en espera, terminados y caducados
+        - write_lock (dict): fichero del cerrojo de escritura entre procesos, tomas y esperas
+
+    Los contadores son del proceso que atiende la petición.
+    """
+    return {
+        "geocoding": get_geocode_cache().stats(),
+        "series": get_series_cache().stats(),
+        "responses": get_response_cache().stats(),
+        "coalescing": {
+            "stats": stats_flight.stats(),
+            "archive": archive_flight.stats(),
+            "loads": load_flight.stats(),
+            "city_locks": city_locks.stats(),
+        },
+        "executor": get_executor().stats(),
+        "write_lock": write_lock.stats(),
+    }
+
+
+@admin.get("/metrics", tags=["admin"], response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Métricas de la aplicación en el formato de texto de Prometheus.
+
+    Incluye por método y ruta el número de peticiones por código y el
+    histograma de su duración; el histograma de duración y de filas de cada
+    fase instrumentada (consultas de estadísticas, cálculos del ejecutor,
+    serialización, carga, APIs de Open-Meteo...); y las respuestas de
+    Open-Meteo por host y código. Los valores son del proceso que atiende
+    la petición.
+
+    Devuelve el texto de las métricas.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@admin.post("/admin/rebuild_summaries", tags=["admin"], dependencies=[Depends(require_admin_token)])
+async def rebuild_summaries() -> Dict:
+    """
+    Reconstruye el resumen diario y el resumen por ciudad desde los datos horarios.
+
+    Sirve para comprobar la consistencia de los agregados que mantiene la
+    carga. Recorre toda la tabla weather_data, por lo que es una operación
+    costosa pensada para lanzarse a mano: requiere el token de
+    OPENMETEO_ADMIN_TOKEN en la cabecera X-Admin-Token.
+
+    Devuelve un objeto dict con el número de días y ciudades resumidos.
+    """
+    async with write_lock.hold(), AsyncSessionLocal() as session:
+        result = await rebuild_aggregates(session)
+        await session.commit()
+    return result
+
+
+async def _database_bytes(conn) -> Optional[int]:
+    """
+    Tamaño en bytes del fichero de la base de datos SQLite, None con otros motores.
+    """
+    if conn.dialect.name != "sqlite":
+        return None
+    page_count = (await conn.exec_driver_sql("PRAGMA page_count")).scalar()
+    page_size = (await conn.exec_driver_sql("PRAGMA page_size")).scalar()
+    return page_count * page_size
+
+
+@admin.post("/admin/vacuum", tags=["admin"], dependencies=[Depends(require_admin_token)])
+async def vacuum_database() -> Dict:
+    """
+    Compacta la base de datos con VACUUM.
+
+    Devuelve al sistema el espacio que dejan libre las migraciones (por
+    ejemplo, la conversión de weather_data al formato compacto). Reescribe
+    todo el fichero y bloquea las escrituras mientras dura, por lo que es
+    una operación pensada para lanzarse a mano: requiere el token de
+    OPENMETEO_ADMIN_TOKEN en la cabecera X-Admin-Token.
+
+    Devuelve un objeto dict con el tamaño en bytes antes y después (solo SQLite).
+    """
+    async with write_lock.hold(), engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        before = await _database_bytes(conn)
+        await conn.exec_driver_sql("VACUUM")
+        after = await _database_bytes(conn)
+    return {"bytes_antes": before, "bytes_despues": after}
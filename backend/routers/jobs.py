@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException
+from typing import Dict
+from services.jobs import get_job
+
+jobs = APIRouter()
+
+@jobs.get("/jobs/{job_id}", tags=["jobs"])
+async def get_job_status(job_id: str) -> Dict:
+    """
+    Estado de un trabajo de carga en segundo plano.
+
+    Parámetros:
+        - job_id (str): id devuelto por POST /load_weather?background=true
+
+    Devuelve un objeto dict con la ciudad, el rango, el estado (queued,
+    running, done o failed), los registros recibidos, insertados y omitidos,
+    el error si lo hubo y el tiempo transcurrido. Si el trabajo no existe,
+    se lanzará un HTTPException con código 404.
+    """
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No existe ese trabajo")
+    return job
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import Optional
+from db.database import get_read_session
+from options.settings import SERIES_HOUR_MAX_DAYS
+from services.locations import get_location
+from services.buckets import query_series
+from services.response_cache import get_response_cache
+
+series = APIRouter()
+
+@series.get("/series/{city}", tags=["series"])
+async def get_series(
+    request: Request,
+    city: str,
+    resolution: str = Query("day", pattern="^(hour|day|week|month|year)$", description="hour, day, week, month o year"),
+    start: Optional[str] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Fecha de fin incluida (YYYY-MM-DD)"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Serie de temperatura y precipitación de una ciudad agregada a una resolución.
+
+    Pensada para gráficas de varios años: cada punto es una hora, un día,
+    una semana (de lunes a domingo), un mes o un año. Las horas se leen de
+    los datos horarios, los días del resumen diario y las semanas, meses y
+    años de los periodos precalculados en cada carga, de modo que una
+    gráfica mensual de 20 años lee unas 240 filas. Se incluyen completos
+    los periodos que se solapan con el rango.
+
+    La respuesta se guarda en la caché de respuestas con la versión de los
+    datos de la ciudad y lleva las cabeceras ETag y Cache-Control.
+
+    La resolución horaria exige start y end y un rango de como mucho
+    OPENMETEO_SERIES_HOUR_MAX_DAYS días (366 por defecto); si no, se
+    responde 400. Para rangos mayores se usa la resolución diaria o superior.
+
+    Parámetros:
+        - city (str): nombre de la ciudad
+        - resolution (str): resolución de la serie, por defecto day
+        - start (str): fecha de inicio opcional (obligatoria con resolution=hour)
+        - end (str): fecha de fin opcional (obligatoria con resolution=hour)
+
+    Devuelve un objeto dict con la ciudad, la resolución y la lista de
+    periodos (inicio, horas, temperatura media, mínima y máxima y
+    precipitación total, media y máxima por hora). Si no hay datos para esa
+    ciudad y rango, se lanzará un HTTPException con código 404.
+    """
+    # Convertir fechas o error de formato
+    try:
+        start_day = date.fromisoformat(start) if start else None
+        end_day = date.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+
+    # La serie horaria se limita a un rango acotado
+    if resolution == "hour":
+        if start_day is None or end_day is None:
+            raise HTTPException(status_code=400, detail="La resolución hour requiere start y end")
+        if (end_day - start_day).days + 1 > SERIES_HOUR_MAX_DAYS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"La resolución hour admite como mucho {SERIES_HOUR_MAX_DAYS} días; use day o superior",
+            )
+
+    # Buscar la localización por su clave normalizada
+    location = await get_location(session, city)
+    if location is None:
+        raise HTTPException(status_code=404, detail="No hay datos almacenados para esa ciudad")
+
+    # Respuesta guardada para los mismos parámetros y versión de datos
+    cache = get_response_cache()
+    key = ("series", location.id, resolution, start_day, end_day, location.data_version)
+    cached = cache.lookup(request, key)
+    if cached is not None:
+        return cached
+
+    buckets = await query_series(session, location.id, resolution, start_day, end_day)
+    if not buckets:
+        raise HTTPException(status_code=404, detail="No hay datos almacenados para esa ciudad y rango de fechas")
+
+    return cache.store(key, {"city": location.name, "resolution": resolution, "buckets": buckets})
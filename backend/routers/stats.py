@@ -1,30 +1,68 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-import pandas as pd
 from datetime import datetime
-from typing import Optional, Dict
-from db.database import get_session
-from models.weatherData import WeatherDataDB
+from typing import Optional, Dict, List
+from db.database import AsyncReadSessionLocal, get_read_session
+from models.location import LocationDB
+from models.citySummary import CitySummaryDB
+from options.settings import STATS_THRESHOLD_HIGH, STATS_THRESHOLD_LOW, COMPARE_MAX_CITIES
+from services.locations import get_location, get_locations, normalize_city
+from services.stats import query_temperature_stats, query_precipitation_stats, stats_flight
+from services.compare import query_compare_stats
+from services.response_cache import get_response_cache
 
 temperature_stats = APIRouter()
 rain_stats = APIRouter()
 general_stats = APIRouter()
+compare_stats = APIRouter()
+
+
+async def _with_session(query, *args):
+    """
+    Ejecuta una consulta de estadísticas con su propia sesión.
+
+    El cálculo compartido no usa la sesión de la petición que lo lanza, que
+    podría cerrarse antes si ese cliente se desconecta. Las peticiones
+    liberan su conexión antes de esperarlo para no agotar el pool.
+    """
+    async with AsyncReadSessionLocal() as session:
+        return await query(session, *args)
+
+
+async def _compute(key: tuple, query, *args):
+    """
+    Calcula unas estadísticas una vez para todas las peticiones idénticas en curso.
+
+    Si el cálculo supera el tiempo máximo del ejecutor se lanzará un
+    HTTPException con código 503.
+    """
+    try:
+        return await stats_flight.do(key, lambda: _with_session(query, *args))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="El cálculo de estadísticas ha superado el tiempo máximo")
+
 
 @temperature_stats.get("/stats/temperature", tags=["temperature_stats"])
 async def get_temperature_stats(
+    request: Request,
     city: str,
     start_date: str,
     end_date: str,
-    threshold_high: Optional[float] = Query(30.0, description="Umbral superior de temperatura"),
-    threshold_low: Optional[float] = Query(0.0, description="Umbral inferior de temperatura"),
-    session: AsyncSession = Depends(get_session)
+    threshold_high: Optional[float] = Query(STATS_THRESHOLD_HIGH, description="Umbral superior de temperatura"),
+    threshold_low: Optional[float] = Query(STATS_THRESHOLD_LOW, description="Umbral inferior de temperatura"),
+    session: AsyncSession = Depends(get_read_session)
 ) -> Dict:
     """
     Estadísticas de temperatura para una ciudad y rango de fechas dados.
 
     Estas estadísticas incluyen la temperatura promedio, la temperatura promedio por día, la temperatura máxima y mínima, y el número de horas por encima/por debajo del umbral.
 
+    La respuesta se guarda en la caché de respuestas con la versión de los
+    datos de la ciudad y lleva las cabeceras ETag y Cache-Control. Con
+    If-None-Match y el ETag vigente se responde 304.
+
     Parámetros:
         - city (str): Ciudad para la que se desean obtener las estadísticas.
         - start_date (str): Fecha de inicio del rango de fechas.
@@ -49,69 +87,48 @@ async def get_temperature_stats(
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
     
-    # Obtener datos de la DB
-    result = await session.execute(
-        select(WeatherDataDB)
-        .where(func.lower(WeatherDataDB.city) == city.lower())
-        .where(WeatherDataDB.datetime >= start_dt)
-        .where(WeatherDataDB.datetime <= end_dt)
-    )
-    data = result.scalars().all()
+    # Buscar la localización por su clave normalizada
+    location = await get_location(session, city)
+    if location is None:
+        raise HTTPException(status_code=404, detail="En la Base de datos LOCAL, no hay datos para esa ciudad y rango de fechas")
+
+    # Respuesta guardada para los mismos parámetros y versión de datos
+    cache = get_response_cache()
+    key = ("temperature", location.id, start_dt, end_dt, threshold_high, threshold_low, location.data_version)
+    cached = cache.lookup(request, key)
+    if cached is not None:
+        return cached
+
+    # Liberar la conexión de la petición mientras se espera el cálculo
+    await session.commit()
+
+    # Calcular las estadísticas en SQL, una vez para todas las peticiones idénticas en curso
+    stats = await _compute(key, query_temperature_stats, location.id, start_dt, end_dt, threshold_high, threshold_low,
+                           location.data_version)
 
     # Comprobar que haya datos sino 404
-    if not data:
+    if stats is None:
         raise HTTPException(status_code=404, detail="En la Base de datos LOCAL, no hay datos para esa ciudad y rango de fechas")
 
-    # Convertir a DataFrame
-    df = pd.DataFrame([{
-        "datetime": d.datetime,
-        "temperature": d.temperature_2m
-    } for d in data])
-
-    # Estadísticas generales
-    average_temp = df["temperature"].mean()
-    max_row = df.loc[df["temperature"].idxmax()]
-    min_row = df.loc[df["temperature"].idxmin()]
-
-    # Promedio por día
-    df["date"] = df["datetime"].dt.date
-    average_by_day = df.groupby("date")["temperature"].mean().round(2).to_dict()
-
-    # Horas por encima / debajo del umbral
-    hours_above = (df["temperature"] > threshold_high).sum()
-    hours_below = (df["temperature"] < threshold_low).sum()
-
-    # Devolver estadísticas con el formato requerido
-    return {
-        "temperature": {
-            "average": round(average_temp, 2),
-            "average_by_day": {str(k): v for k, v in average_by_day.items()},
-            "max": {
-                "value": max_row["temperature"],
-                "date_time": max_row["datetime"].isoformat()
-            },
-            "min": {
-                "value": min_row["temperature"],
-                "date_time": min_row["datetime"].isoformat()
-            },
-            "hours_above_threshold": int(hours_above),
-            "hours_below_threshold": int(hours_below)
-        }
-    }
+    return cache.store(key, stats)
 
 
 @rain_stats.get("/stats/precipitation", tags=["rain_stats"])
 async def get_precipitation_stats(
+    request: Request,
     city: str,
     start_date: str,
     end_date: str,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ) -> Dict:
        
     # Convertir fechas a datetime
     """
     Estadísticas de precipitación para una ciudad y rango de fechas.
 
+    La respuesta se guarda en la caché de respuestas igual que en
+    /stats/temperature, con ETag y Cache-Control.
+
     Parámetros:
         - city (str): nombre de la ciudad
         - start_date (str): fecha de inicio en formato YYYY-MM-DD
@@ -134,59 +151,41 @@ async def get_precipitation_stats(
     start_dt = datetime.combine(start_dt.date(), datetime.min.time())
     end_dt = datetime.combine(end_dt.date(), datetime.max.time())
 
-    # Consulta a la DB
-    result = await session.execute(
-        select(WeatherDataDB)
-        .where(func.lower(WeatherDataDB.city) == city.lower())
-        .where(WeatherDataDB.datetime >= start_dt)
-        .where(WeatherDataDB.datetime <= end_dt)
-    )
-    data = result.scalars().all()
-    
+    # Buscar la localización por su clave normalizada
+    location = await get_location(session, city)
+    if location is None:
+        raise HTTPException(status_code=404, detail="En la Base de datos LOCAL, no hay datos para esa ciudad y rango de fechas")
+
+    # Respuesta guardada para los mismos días y versión de datos
+    cache = get_response_cache()
+    key = ("precipitation", location.id, start_dt, end_dt, location.data_version)
+    cached = cache.lookup(request, key)
+    if cached is not None:
+        return cached
+
+    # Liberar la conexión de la petición mientras se espera el cálculo
+    await session.commit()
+
+    # Calcular las estadísticas en SQL, una vez para todas las peticiones idénticas en curso
+    stats = await _compute(key, query_precipitation_stats, location.id, start_dt, end_dt, location.data_version)
+
     # Verificar que haya datos
-    if not data:
+    if stats is None:
         raise HTTPException(status_code=404, detail="En la Base de datos LOCAL, no hay datos para esa ciudad y rango de fechas")
 
-    # Convertir a DataFrame
-    df = pd.DataFrame([{
-        "datetime": d.datetime,
-        "precipitation": d.precipitation
-    } for d in data])
-    
-    # Total y promedio
-    total_precip = df["precipitation"].sum()
-    average_precip = df["precipitation"].mean()
-    
-    # Total por día
-    df["date"] = df["datetime"].dt.date
-    total_by_day = df.groupby("date")["precipitation"].sum().round(2).to_dict()
-    
-    # Días con precipitación > 0
-    days_with_precip = (df.groupby("date")["precipitation"].sum() > 0).sum()
-    
-    # Día de máxima precipitación
-    max_day_row = df.groupby("date")["precipitation"].sum().idxmax()
-    max_value = df.groupby("date")["precipitation"].sum().max()
-
-    return {
-        "precipitation": {
-            "total": round(total_precip, 2),
-            "total_by_day": {str(k): v for k, v in total_by_day.items()},
-            "days_with_precipitation": int(days_with_precip),
-            "max": {
-                "value": round(max_value, 2),
-                "date": str(max_day_row)
-            },
-            "average": round(average_precip, 2)
-        }
-    }
+    return cache.store(key, stats)
 
 @general_stats.get("/stats/general", tags=["general_stats"])
-async def get_general_stats(session: AsyncSession = Depends(get_session)) -> Dict:
-    # Obtener todos los registros de la base de datos
+async def get_general_stats(request: Request, session: AsyncSession = Depends(get_read_session)) -> Dict:
     """
     Estadísticas generales de temperatura y precipitación para todas las ciudades y fechas disponibles.
 
+    Se leen del resumen por ciudad que mantiene la carga, de forma que el
+    coste depende del número de ciudades y no del número de horas guardadas.
+    La respuesta se guarda en la caché de respuestas con una versión global
+    (número de ciudades y suma de sus versiones de datos), con ETag y
+    Cache-Control.
+
     Devuelve un objeto dict con las siguientes estadísticas para cada ciudad:
         - start_date (str): fecha de inicio en formato YYYY-MM-DD
         - end_date (str): fecha de fin en formato YYYY-MM-DD
@@ -197,80 +196,121 @@ async def get_general_stats(session: AsyncSession = Depends(get_session)) -> Dic
         - temperature_max (dict): objeto con la fecha y el valor de la máxima temperatura
         - temperature_min (dict): objeto con la fecha y el valor de la mínima temperatura
     """
-    # Consulta a la DB
-    result = await session.execute(select(WeatherDataDB))
-    data = result.scalars().all()
+    # Versión global: cambia en cuanto cualquier carga escribe datos
+    version = (await session.execute(select(func.count(), func.coalesce(func.sum(LocationDB.data_version), 0)))).one()
+    cache = get_response_cache()
+    key = ("general", tuple(version))
+    cached = cache.lookup(request, key)
+    if cached is not None:
+        return cached
+
+    # Consulta al resumen por ciudad, una fila por ciudad
+    result = await session.execute(
+        select(LocationDB.name, CitySummaryDB)
+        .join(CitySummaryDB, CitySummaryDB.location_id == LocationDB.id)
+        .order_by(LocationDB.id)
+    )
+    data = result.all()
 
     # Verificar que haya datos
     if not data:
         raise HTTPException(status_code=404, detail="No hay datos meteorológicos almacenados")
 
-    # Convertir a DataFrame
-    df = pd.DataFrame([{
-        "city": d.city,
-        "datetime": d.datetime,
-        "temperature_2m": d.temperature_2m,
-        "precipitation": d.precipitation,
-    } for d in data])
-
-    # Verificar que haya datos o lanzar error
-    if df.empty:
-        raise HTTPException(status_code=404, detail="No hay datos disponibles")
-
-    # parsear datetime a date
-    df["date"] = df["datetime"].dt.date
-
-    
     output = {}
-    # Agrupar por ciudad (case-insensitive)
-    for city, group in df.groupby(df["city"].str.lower()):  
-        group_sorted = group.sort_values("datetime")
-        start_date = str(group_sorted["date"].min())
-        end_date = str(group_sorted["date"].max())
-
-        # Promedio de temperatura
-        temp_avg = round(group_sorted["temperature_2m"].mean(), 2)
-
-        # Total de precipitación
-        precip_total = round(group_sorted["precipitation"].sum(), 2)
-
-        # Días con precipitación
-        days_with_precip = (group_sorted.groupby("date")["precipitation"].sum() > 0).sum()
-
-        # Día de máxima precipitación
-        precip_by_day = group_sorted.groupby("date")["precipitation"].sum()
-        precip_max_day = precip_by_day.idxmax()
-        precip_max_val = round(precip_by_day.max(), 2)
-
-        # Día y valor de máxima temperatura
-        temp_max_row = group_sorted.loc[group_sorted["temperature_2m"].idxmax()]
-        temp_max_date = str(temp_max_row["datetime"].date())
-        temp_max_val = round(temp_max_row["temperature_2m"], 2)
-
-        # Día y valor de mínima temperatura
-        temp_min_row = group_sorted.loc[group_sorted["temperature_2m"].idxmin()]
-        temp_min_date = str(temp_min_row["datetime"].date())
-        temp_min_val = round(temp_min_row["temperature_2m"], 2)
-
+    for name, summary in data:
         # Guardar datos para el return
-        output[group_sorted["city"].iloc[0]] = {
-            "start_date": start_date,
-            "end_date": end_date,
-            "temperature_average": temp_avg,
-            "precipitation_total": precip_total,
-            "days_with_precipitation": int(days_with_precip),
+        output[name] = {
+            "start_date": str(summary.start_date),
+            "end_date": str(summary.end_date),
+            "temperature_average": round(summary.temp_sum / summary.temp_count, 2) if summary.temp_count else None,
+            "precipitation_total": round(summary.precip_total, 2),
+            "days_with_precipitation": summary.days_with_precip,
             "precipitation_max": {
-                "date": str(precip_max_day),
-                "value": precip_max_val
+                "date": str(summary.precip_max_date),
+                "value": round(summary.precip_max_value, 2)
             },
             "temperature_max": {
-                "date": temp_max_date,
-                "value": temp_max_val
+                "date": str(summary.temp_max_at.date()) if summary.temp_max_at else None,
+                "value": round(summary.temp_max_value, 2) if summary.temp_max_value is not None else None
             },
             "temperature_min": {
-                "date": temp_min_date,
-                "value": temp_min_val
+                "date": str(summary.temp_min_at.date()) if summary.temp_min_at else None,
+                "value": round(summary.temp_min_value, 2) if summary.temp_min_value is not None else None
             }
         }
 
-    return output
+    return cache.store(key, output)
+
+
+@compare_stats.get("/stats/compare", tags=["compare_stats"])
+async def get_compare_stats(
+    request: Request,
+    cities: List[str] = Query(..., description="Ciudades a comparar, se puede repetir el parámetro"),
+    start_date: str = Query(..., description="Fecha de inicio común"),
+    end_date: str = Query(..., description="Fecha de fin común"),
+    threshold_high: Optional[float] = Query(STATS_THRESHOLD_HIGH, description="Umbral superior de temperatura"),
+    threshold_low: Optional[float] = Query(STATS_THRESHOLD_LOW, description="Umbral inferior de temperatura"),
+    session: AsyncSession = Depends(get_read_session)
+) -> Dict:
+    """
+    Estadísticas de temperatura y precipitación de varias ciudades para un mismo rango de fechas.
+
+    Sustituye a una llamada a /stats/temperature y otra a /stats/precipitation
+    por ciudad: todas las horas se leen con una única consulta y las
+    estadísticas de todas las ciudades se calculan en una pasada agrupada.
+    La temperatura usa el rango tal cual y la precipitación los días
+    completos, igual que los endpoints individuales.
+
+    La respuesta se guarda en la caché de respuestas con las versiones de
+    datos de las ciudades, con ETag y Cache-Control.
+
+    Parámetros:
+        - cities (list[str]): nombres de las ciudades, como máximo OPENMETEO_COMPARE_MAX_CITIES
+        - start_date (str): fecha de inicio del rango
+        - end_date (str): fecha de fin del rango
+        - threshold_high (Optional[float]): umbral superior de temperatura
+        - threshold_low (Optional[float]): umbral inferior de temperatura
+
+    Devuelve un objeto dict con una entrada por ciudad pedida (con el nombre
+    recibido) con las claves temperature y precipitation en el formato de
+    los endpoints individuales, o None si la ciudad no tiene datos en el rango.
+    Si ninguna ciudad tiene datos, se lanzará un HTTPException con código 404.
+    """
+    try:
+        start_dt = datetime.fromisoformat(start_date)
+        end_dt = datetime.fromisoformat(end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+
+    # Ciudades sin repetir (sin distinguir mayúsculas), conservando el primer nombre recibido
+    names = {}
+    for city in cities:
+        names.setdefault(normalize_city(city), city)
+    if len(names) > COMPARE_MAX_CITIES:
+        raise HTTPException(status_code=400, detail=f"Como máximo {COMPARE_MAX_CITIES} ciudades por comparación")
+
+    # Localizaciones con una sola consulta
+    locations = await get_locations(session, list(names))
+
+    # Respuesta guardada para las mismas ciudades, parámetros y versiones de datos
+    cache = get_response_cache()
+    versions = tuple(sorted((loc.id, loc.data_version) for loc in locations.values()))
+    key = ("compare", tuple(names), versions, start_dt, end_dt, threshold_high, threshold_low)
+    cached = cache.lookup(request, key)
+    if cached is not None:
+        return cached
+
+    # Liberar la conexión de la petición mientras se espera el cálculo
+    await session.commit()
+
+    # Una consulta y una pasada agrupada para todas las ciudades
+    ids = sorted(loc.id for loc in locations.values())
+    stats = await _compute(key, query_compare_stats, ids, start_dt, end_dt, threshold_high, threshold_low) if ids else {}
+    if not stats:
+        raise HTTPException(status_code=404, detail="En la Base de datos LOCAL, no hay datos para esas ciudades y rango de fechas")
+
+    output = {}
+    for city_key, name in names.items():
+        location = locations.get(city_key)
+        output[name] = stats.get(location.id) if location is not None else None
+    return cache.store(key, output)
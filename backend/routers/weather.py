@@ -1,72 +1,85 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from models.location import LocationDB
 from models.weatherData import WeatherDataDB
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from datetime import datetime
-from db.database import get_session, AsyncSessionLocal
-from schemas.weather import MeteoDataOut
-from services.openmeteo import fetch_weather_data
+from sqlalchemy import select
+from datetime import date, datetime
+from typing import List, Optional
+from db.database import get_read_session
+from db.types import ceil_hour
+from options.settings import BATCH_MAX_CITIES, EXPORT_NPZ_MAX_ROWS
+from schemas.weather import MeteoDataOut, BatchLoadIn
+from services.ingest import load_city_weather, load_cities_weather
+from services.jobs import get_job_queue
+from services.locations import get_location, normalize_city
+from services.streaming import MEDIA_TYPES, encode_cursor, decode_cursor, stream_rows, page_rows
+from services import export
 
 weather_data = APIRouter()
 
 @weather_data.post("/load_weather", tags=["weather_data"])
-async def load_weather(city: str, start_date: str, end_date: str):
+async def load_weather(
+    city: str,
+    start_date: str,
+    end_date: str,
+    background: bool = Query(False, description="Encolar la carga y responder 202 con el id del trabajo"),
+):
     """
     Carga de datos meteorológicos.
 
+    Solo se descargan de Open-Meteo los días del rango que todavía no están
+    guardados para la ciudad. Si el rango ya está completo no se realiza
+    ninguna petición externa.
+
+    Con background=true la carga se encola y se responde al momento con
+    código 202 y el id del trabajo, cuyo estado se consulta en /jobs/{id}.
+    Si ya hay un trabajo en cola o en curso para la misma ciudad y rango se
+    devuelve ese trabajo.
+
     Parámetros:
         - city (str): nombre de la ciudad
         - start_date (str): fecha de inicio en formato YYYY-MM-DD
         - end_date (str): fecha de fin en formato YYYY-MM-DD
+        - background (bool): cargar en segundo plano
 
-    Devuelve un objeto dict con el mensaje de éxito y el número de registros
-    guardados. Si se produce un error al cargar los datos, se lanzará un
-    HTTPException con código 500.
+    Devuelve un objeto dict con el mensaje de éxito, el número de registros
+    recibidos, los insertados, los omitidos por existir ya en la BD y los
+    rangos de fechas descargados. Si se produce un error al cargar los datos,
+    se lanzará un HTTPException con código 500.
     """
+    # convertir fechas a date o error de formato
+    try:
+        start = date.fromisoformat(start_date)
+        end = date.fromisoformat(end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha de inicio es posterior a la fecha de fin")
+
+    # Encolar la carga y devolver el trabajo
+    if background:
+        job, created = await get_job_queue().submit(city, start, end)
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job["id"], "estado": job["status"], "duplicado": not created},
+            headers={"Location": f"/jobs/{job['id']}"},
+        )
+
     try:
-        # Obtener datos desde Open-Meteo
-        data = await fetch_weather_data(city, start_date, end_date)
+        # Descargar y guardar solo los huecos
+        result = await load_city_weather(city, start, end)
 
         # Verificar que haya datos sino error
-        if not data or "hourly" not in data:
+        if result is None:
             raise HTTPException(status_code=404, detail="No se encontraron datos meteorológicos")
 
-        # Obtener latitud y longitud
-        lat = data.get("latitude")
-        lon = data.get("longitude")
-
-        # Obtener datos horarios
-        hourly = data["hourly"]
-        times = hourly["time"]
-
-        # Obtener temperaturas y precipitaciones
-        temps = hourly["temperature_2m"]
-        precs = hourly["precipitation"]
-
-        # Guardar en base de datos
-        async with AsyncSessionLocal() as session:
-            for time_str, temp, prec in zip(times, temps, precs):
-                # Convertir a datetime
-                dt = datetime.fromisoformat(time_str)
-
-                # Preparar entry para guardar
-                entry = WeatherDataDB(
-                    city=city,
-                    datetime=dt,
-                    temperature_2m=temp,
-                    precipitation=prec,
-                    latitude=lat,
-                    longitude=lon,
-                )
-                # Guardar
-                session.add(entry)
-
-            # Commit para conformar la transacción y cerrar sesión
-            await session.commit()
-
         # Devolver respuesta con la información de los registros
         return {"message": f"Datos meteorológicos de {city} guardados correctamente.",
-                "registros": len(times)}
+                "registros": result["total"],
+                "insertados": result["inserted"],
+                "omitidos": result["skipped"],
+                "rangos_descargados": result["ranges"]}
 
     # Manejar excepciones   
     except HTTPException:
@@ -76,25 +89,203 @@ async def load_weather(city: str, start_date: str, end_date: str):
 
 
 
+@weather_data.post("/load_weather/batch", tags=["weather_data"])
+async def load_weather_batch(payload: BatchLoadIn):
+    """
+    Carga de datos meteorológicos de varias ciudades en una sola petición.
+
+    Las ciudades se geocodifican a la vez y se descargan con consultas
+    multi-ubicación de la API de archivo. Solo se descargan las ciudades
+    con días pendientes en el rango y todo se guarda en una transacción.
+
+    Parámetros (cuerpo JSON):
+        - cities (list[str]): nombres de las ciudades, como máximo OPENMETEO_BATCH_MAX_CITIES
+        - start_date (str): fecha de inicio en formato YYYY-MM-DD
+        - end_date (str): fecha de fin en formato YYYY-MM-DD
+
+    Devuelve un objeto dict con el total de registros recibidos, insertados
+    y omitidos y el resumen de cada ciudad en "ciudades". Si se produce un
+    error al cargar los datos, se lanzará un HTTPException con código 500.
+    """
+    # convertir fechas a date o error de formato
+    try:
+        start = date.fromisoformat(payload.start_date)
+        end = date.fromisoformat(payload.end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(status_code=400, detail="La fecha de inicio es posterior a la fecha de fin")
+    if len({normalize_city(city) for city in payload.cities}) > BATCH_MAX_CITIES:
+        raise HTTPException(status_code=400, detail=f"Como máximo {BATCH_MAX_CITIES} ciudades por carga")
+
+    try:
+        summary = await load_cities_weather(payload.cities, start, end)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al cargar datos: {str(e)}")
+
+    return {"message": f"Datos meteorológicos de {len(summary)} ciudades procesados.",
+            "registros": sum(s["registros"] for s in summary.values()),
+            "insertados": sum(s["insertados"] for s in summary.values()),
+            "omitidos": sum(s["omitidos"] for s in summary.values()),
+            "ciudades": summary}
+
+
+
 @weather_data.get("/weather/{city}", response_model=list[MeteoDataOut], tags=["weather_data"])
-async def get_weather(city: str, session: AsyncSession = Depends(get_session)):
+async def get_weather(
+    city: str,
+    start: Optional[str] = Query(None, description="Fecha u hora de inicio (YYYY-MM-DD o YYYY-MM-DDTHH:MM)"),
+    end: Optional[str] = Query(None, description="Fecha u hora de fin, una fecha sin hora incluye el día completo"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor de la página anterior"),
+    limit: Optional[int] = Query(None, ge=1, le=100000, description="Número máximo de registros de la página"),
+    format: str = Query("json", pattern="^(json|ndjson|csv)$", description="Formato de salida: json, ndjson o csv"),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
     Obtiene los datos meteorológicos almacenados para una ciudad.
 
+    Los registros se devuelven ordenados por hora y se transmiten
+    por lotes desde un cursor del servidor, de modo que la memoria usada no
+    depende del histórico pedido. Con limit se pagina por clave: si quedan
+    más registros, la cabecera X-Next-Cursor trae el cursor de la página
+    siguiente.
+
     Parámetros:
         - city (str): nombre de la ciudad
+        - start (str): fecha de inicio opcional
+        - end (str): fecha de fin opcional
+        - cursor (str): cursor de la página anterior
+        - limit (int): tamaño de página
+        - format (str): json (lista de MeteoDataOut), ndjson o csv
 
-    Devuelve una lista de objetos MeteoDataOut con los datos meteorológicos
-    almacenados. Si no hay datos almacenados para esa ciudad, se lanzará
-    un HTTPException con código 404.
+    Devuelve los registros en el formato pedido. Si no hay datos almacenados
+    para esa ciudad, se lanzará un HTTPException con código 404.
     """
-    # Consulta a la DB
-    result = await session.execute(select(WeatherDataDB).where(func.lower(WeatherDataDB.city) == city.lower()))
-    
-    # Obtener los datos
-    data = result.scalars().all()
-    
+    # Convertir filtros o error de formato
+    try:
+        start_dt = datetime.fromisoformat(start) if start else None
+        end_dt = datetime.fromisoformat(end) if end else None
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha o cursor inválido")
+
+    # Una fecha de fin sin hora incluye el día completo
+    if end_dt is not None and len(end) == 10:
+        end_dt = datetime.combine(end_dt.date(), datetime.max.time())
+
+    # Buscar la localización por su clave normalizada
+    location = await get_location(session, city)
+    if location is None:
+        raise HTTPException(status_code=404, detail="No hay datos almacenados para esa ciudad")
+
+    # Consulta por la clave primaria (location_id, ts) sin objetos ORM; ciudad y coordenadas de la localización
+    stmt = (
+        select(
+            LocationDB.name.label("city"),
+            WeatherDataDB.ts.label("datetime"),
+            WeatherDataDB.temperature_2m,
+            WeatherDataDB.precipitation,
+            LocationDB.latitude,
+            LocationDB.longitude,
+        )
+        .join(LocationDB, LocationDB.id == WeatherDataDB.location_id)
+        .where(WeatherDataDB.location_id == location.id)
+        .order_by(WeatherDataDB.ts)
+    )
+    if start_dt is not None:
+        stmt = stmt.where(WeatherDataDB.ts >= ceil_hour(start_dt))
+    if end_dt is not None:
+        stmt = stmt.where(WeatherDataDB.ts <= end_dt)
+    if after is not None:
+        stmt = stmt.where(WeatherDataDB.ts > after)
+
+    # Con limit se lee la página (y una fila más para saber si hay siguiente)
+    if limit is not None:
+        rows = (await session.execute(stmt.limit(limit + 1))).all()
+        if not rows and after is None:
+            raise HTTPException(status_code=404, detail="No hay datos almacenados para esa ciudad")
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].datetime)
+        return StreamingResponse(page_rows(rows, format), media_type=MEDIA_TYPES[format], headers=headers)
+
     # Si no hay datos error
-    if not data:
+    if (await session.execute(stmt.limit(1))).first() is None:
         raise HTTPException(status_code=404, detail="No hay datos almacenados para esa ciudad")
-    return data
+
+    # Sin limit se transmite todo el rango por lotes
+    return StreamingResponse(stream_rows(stmt, format), media_type=MEDIA_TYPES[format])
+
+
+
+@weather_data.get("/export/weather", tags=["weather_data"])
+async def export_weather(
+    cities: List[str] = Query(..., description="Ciudades a exportar, se puede repetir el parámetro"),
+    start: Optional[str] = Query(None, description="Fecha u hora de inicio (YYYY-MM-DD o YYYY-MM-DDTHH:MM)"),
+    end: Optional[str] = Query(None, description="Fecha u hora de fin, una fecha sin hora incluye el día completo"),
+    format: Optional[str] = Query(None, pattern="^(parquet|arrow|npz)$",
+                                  description="parquet o arrow (requieren pyarrow) o npz; por defecto parquet si pyarrow está instalado"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Exporta los datos horarios de una o varias ciudades en formato columnar binario.
+
+    Pensado para consumidores masivos: en lugar de una lista JSON se
+    devuelve un único fichero con las columnas city, ts (segundos desde
+    1970-01-01, int64), temperature_2m y precipitation (float32). En
+    parquet y arrow el fichero se transmite por bloques según se leen de la
+    BD; npz se construye entero en memoria y admite como máximo
+    OPENMETEO_EXPORT_NPZ_MAX_ROWS filas.
+
+    Parámetros:
+        - cities (list[str]): nombres de las ciudades
+        - start (str): fecha de inicio opcional
+        - end (str): fecha de fin opcional
+        - format (str): parquet, arrow (IPC stream) o npz
+
+    Devuelve el fichero como adjunto, con el número de filas en la cabecera
+    X-Row-Count. Si alguna ciudad no tiene datos almacenados, se lanzará un
+    HTTPException con código 404; si una exportación npz supera el máximo
+    de filas, con código 400.
+    """
+    fmt = format or export.default_format()
+    if fmt != "npz" and export.pa is None:
+        raise HTTPException(status_code=400, detail="El formato requiere pyarrow, use format=npz")
+
+    # Convertir filtros o error de formato
+    try:
+        start_dt = datetime.fromisoformat(start) if start else None
+        end_dt = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido")
+
+    # Una fecha de fin sin hora incluye el día completo
+    if end_dt is not None and len(end) == 10:
+        end_dt = datetime.combine(end_dt.date(), datetime.max.time())
+
+    # Localizaciones en el orden pedido, sin repetir
+    locations = {}
+    for city in cities:
+        location = await get_location(session, city)
+        if location is None:
+            raise HTTPException(status_code=404, detail=f"No hay datos almacenados para {city}")
+        locations.setdefault(location.id, location)
+
+    locations = list(locations.values())
+    rows = await export.count_rows(locations, start_dt, end_dt)
+    if fmt == "npz" and rows > EXPORT_NPZ_MAX_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"npz admite como máximo {EXPORT_NPZ_MAX_ROWS} filas, use parquet o arrow o un rango menor",
+        )
+
+    media_type, extension = export.FORMATS[fmt]
+    return StreamingResponse(
+        export.stream_export(locations, start_dt, end_dt, fmt),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="weather.{extension}"',
+            "X-Row-Count": str(rows),
+        },
+    )
\ No newline at end of file
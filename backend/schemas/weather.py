@@ -1,13 +1,20 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List, Optional
 
 class MeteoDataOut(BaseModel):
     city: str
     datetime: datetime
-    temperature_2m: float
-    precipitation: float
+    temperature_2m: Optional[float]
+    precipitation: Optional[float]
     latitude: float
     longitude: float
 
     class Config:
         orm_mode = True
+
+
+class BatchLoadIn(BaseModel):
+    cities: List[str] = Field(..., min_length=1)
+    start_date: str
+    end_date: str
@@ -0,0 +1,252 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import upsert
+from db.types import ceil_hour
+from models.weatherData import WeatherDataDB
+from models.weatherDaily import WeatherDailyDB
+from models.weatherBucket import WeatherBucketDB
+from services.metrics import span
+
+# Resoluciones de la serie, de la más fina a la más gruesa
+RESOLUTIONS = ["hour", "day", "week", "month", "year"]
+
+# Resoluciones precalculadas en weather_buckets a partir del resumen diario
+PYRAMID = ["week", "month", "year"]
+
+# Columnas de weather_buckets que se calculan
+BUCKET_COLUMNS = [
+    "hours", "temp_count", "temp_sum", "temp_min", "temp_max", "precip_count", "precip_sum", "precip_max",
+]
+
+
+def bucket_start(resolution: str, day: date) -> date:
+    """
+    Devuelve el primer día del periodo que contiene un día: lunes, día 1 o 1 de enero.
+    """
+    if resolution == "week":
+        return day - timedelta(days=day.weekday())
+    if resolution == "month":
+        return day.replace(day=1)
+    if resolution == "year":
+        return day.replace(month=1, day=1)
+    return day
+
+
+def _combine(a: Optional[float], b: Optional[float], pick) -> Optional[float]:
+    """
+    Combina dos extremos ignorando los None.
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return pick(a, b)
+
+
+def compute_buckets(location_id: int, daily: Iterable, first: date, last: date) -> List[dict]:
+    """
+    Agrega los días de una localización en semanas, meses y años.
+
+    Solo se devuelven los periodos que empiezan entre el periodo de first y
+    el de last; los días leídos deben cubrir esos periodos completos.
+
+    Parámetros:
+        - location_id (int): id de la localización
+        - daily (Iterable): filas de weather_daily como mappings, ordenadas por día
+        - first (date): primer día actualizado
+        - last (date): último día actualizado (incluido)
+
+    Devuelve una lista de dicts con las columnas de WeatherBucketDB.
+    """
+    buckets = {}
+    for row in daily:
+        for resolution in PYRAMID:
+            start = bucket_start(resolution, row["day"])
+            if not bucket_start(resolution, first) <= start <= bucket_start(resolution, last):
+                continue
+            bucket = buckets.get((resolution, start))
+            if bucket is None:
+                buckets[(resolution, start)] = {
+                    "location_id": location_id, "resolution": resolution, "start": start,
+                    **{col: row[col] for col in BUCKET_COLUMNS},
+                }
+                continue
+            for col in ("hours", "temp_count", "precip_count"):
+                bucket[col] += row[col]
+            for col in ("temp_sum", "precip_sum"):
+                bucket[col] = _combine(bucket[col], row[col], lambda x, y: x + y)
+            bucket["temp_min"] = _combine(bucket["temp_min"], row["temp_min"], min)
+            bucket["temp_max"] = _combine(bucket["temp_max"], row["temp_max"], max)
+            bucket["precip_max"] = _combine(bucket["precip_max"], row["precip_max"], max)
+    return list(buckets.values())
+
+
+def bucket_span(first: date, last: date):
+    """
+    Calcula los días que hay que leer para recalcular todos los periodos que tocan first y last.
+
+    Devuelve una tupla (primer día, último día).
+    """
+    start = min(bucket_start("week", first), bucket_start("year", first))
+    end = max(bucket_start("week", last) + timedelta(days=6), date(last.year, 12, 31))
+    return start, end
+
+
+def daily_select(location_id: int, start: Optional[date] = None, end: Optional[date] = None):
+    """
+    Construye la consulta de los días de una localización con las columnas que agregan los periodos.
+    """
+    stmt = (
+        select(WeatherDailyDB.day, *[getattr(WeatherDailyDB, col) for col in BUCKET_COLUMNS])
+        .where(WeatherDailyDB.location_id == location_id)
+        .order_by(WeatherDailyDB.day)
+    )
+    if start is not None:
+        stmt = stmt.where(WeatherDailyDB.day >= start)
+    if end is not None:
+        stmt = stmt.where(WeatherDailyDB.day <= end)
+    return stmt
+
+
+def buckets_upsert():
+    """
+    Construye el INSERT ... ON CONFLICT de weather_buckets, para ejecutarlo con una lista de filas.
+    """
+    stmt = upsert(WeatherBucketDB.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=["location_id", "resolution", "start"],
+        set_={col: stmt.excluded[col] for col in BUCKET_COLUMNS},
+    )
+
+
+async def refresh_buckets(session: AsyncSession, location_id: int, start: date, end: date):
+    """
+    Recalcula las semanas, meses y años de una localización que contienen los días cargados.
+
+    Lee del resumen diario, ya actualizado, los días de los periodos
+    afectados: como mucho unos cientos de filas por año cargado.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos, el commit queda a cargo del llamador
+        - location_id (int): id de la localización
+        - start (date): primer día cargado
+        - end (date): último día cargado (incluido)
+
+    No devuelve nada.
+    """
+    span_start, span_end = bucket_span(start, end)
+    result = await session.execute(daily_select(location_id, span_start, span_end))
+    rows = compute_buckets(location_id, result.mappings(), start, end)
+    if rows:
+        await session.execute(buckets_upsert(), rows)
+
+
+def location_buckets(location_id: int, daily: List) -> List[dict]:
+    """
+    Calcula todos los periodos de una localización a partir de su resumen diario completo.
+
+    Parámetros:
+        - location_id (int): id de la localización
+        - daily (list): filas de daily_select(location_id) como mappings
+
+    Devuelve una lista de dicts con las columnas de WeatherBucketDB.
+    """
+    if not daily:
+        return []
+    return compute_buckets(location_id, daily, daily[0]["day"], daily[-1]["day"])
+
+
+async def rebuild_buckets(session: AsyncSession):
+    """
+    Borra y vuelve a calcular los periodos de todas las localizaciones desde el resumen diario.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos, el commit queda a cargo del llamador
+
+    No devuelve nada.
+    """
+    await session.execute(delete(WeatherBucketDB))
+    location_ids = (await session.execute(select(WeatherDailyDB.location_id).distinct())).scalars().all()
+    for location_id in location_ids:
+        daily = (await session.execute(daily_select(location_id))).mappings().all()
+        rows = location_buckets(location_id, daily)
+        if rows:
+            await session.execute(buckets_upsert(), rows)
+
+
+def _point(start, hours, temp_count, temp_sum, temp_min, temp_max, precip_count, precip_sum, precip_max) -> dict:
+    """
+    Da formato de salida a un periodo agregado.
+    """
+    return {
+        "start": start.isoformat(),
+        "hours": hours,
+        "temperature": {
+            "mean": round(temp_sum / temp_count, 2) if temp_count else None,
+            "min": temp_min,
+            "max": temp_max,
+        },
+        "precipitation": {
+            "sum": round(precip_sum, 2) if precip_count else None,
+            "mean": round(precip_sum / precip_count, 2) if precip_count else None,
+            "max": precip_max,
+        },
+    }
+
+
+async def query_series(session: AsyncSession, location_id: int, resolution: str,
+                       start: Optional[date], end: Optional[date]) -> List[dict]:
+    """
+    Lee la serie agregada de una localización a una resolución.
+
+    La resolución horaria se lee de weather_data, la diaria del resumen
+    diario y las semanas, meses y años de la pirámide weather_buckets, de
+    forma que el número de filas leídas es el número de periodos devueltos.
+    Se devuelven los periodos completos que se solapan con el rango.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - location_id (int): id de la localización
+        - resolution (str): hour, day, week, month o year
+        - start (date): primer día, None sin límite
+        - end (date): último día (incluido), None sin límite
+
+    Devuelve una lista de dicts ordenada por el inicio del periodo.
+    """
+    if resolution == "hour":
+        stmt = (
+            select(WeatherDataDB.ts, WeatherDataDB.temperature_2m, WeatherDataDB.precipitation)
+            .where(WeatherDataDB.location_id == location_id)
+            .order_by(WeatherDataDB.ts)
+        )
+        if start is not None:
+            stmt = stmt.where(WeatherDataDB.ts >= ceil_hour(datetime.combine(start, datetime.min.time())))
+        if end is not None:
+            stmt = stmt.where(WeatherDataDB.ts <= datetime.combine(end, datetime.max.time()))
+        with span("series.query") as s:
+            rows = (await session.execute(stmt)).all()
+            s.rows = len(rows)
+        return [
+            _point(ts, 1, int(temp is not None), temp or 0.0, temp, temp, int(prec is not None), prec or 0.0, prec)
+            for ts, temp, prec in rows
+        ]
+
+    if resolution == "day":
+        stmt = daily_select(location_id, start, end)
+    else:
+        stmt = (
+            select(WeatherBucketDB.start, *[getattr(WeatherBucketDB, col) for col in BUCKET_COLUMNS])
+            .where(WeatherBucketDB.location_id == location_id)
+            .where(WeatherBucketDB.resolution == resolution)
+            .order_by(WeatherBucketDB.start)
+        )
+        if start is not None:
+            stmt = stmt.where(WeatherBucketDB.start >= bucket_start(resolution, start))
+        if end is not None:
+            stmt = stmt.where(WeatherBucketDB.start <= end)
+    with span("series.query") as s:
+        rows = (await session.execute(stmt)).all()
+        s.rows = len(rows)
+    return [_point(*row) for row in rows]
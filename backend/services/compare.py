@@ -0,0 +1,307 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import Integer, select, func, case, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.types import EPOCH_DAY, ceil_hour, from_hours
+from models.weatherData import WeatherDataDB
+from models.weatherDaily import WeatherDailyDB
+from options.settings import STATS_THRESHOLD_HIGH, STATS_THRESHOLD_LOW
+from services.rollups import daily_aggregate_select, full_days
+from services.executor import run_kernel
+from services.metrics import span
+
+# Columnas diarias que usan las comparaciones, en el orden de las consultas
+COMPARE_COLUMNS = [
+    "location_id", "day", "hours", "temp_count", "temp_sum", "temp_min", "temp_min_at", "temp_max",
+    "temp_max_at", "hours_above", "hours_below", "precip_count", "precip_sum",
+]
+
+# Columnas que se leen como enteros de días u horas desde 1970-01-01 en lugar de fechas
+_EPOCH_COLUMNS = {"day", "temp_min_at", "temp_max_at"}
+
+
+def _columns(table) -> list:
+    """
+    Devuelve las columnas de COMPARE_COLUMNS de una tabla o subconsulta, con las fechas como enteros.
+    """
+    return [
+        type_coerce(table.c[col], Integer) if col in _EPOCH_COLUMNS else table.c[col]
+        for col in COMPARE_COLUMNS
+    ]
+
+
+def _to_arrays(rows) -> Dict[str, np.ndarray]:
+    """
+    Convierte filas con las columnas de COMPARE_COLUMNS en un array por columna.
+
+    La localización y el día son enteros; el resto se guarda en float64 con
+    NaN donde hay None (extremos de temperatura de los días sin temperaturas).
+    """
+    columns = zip(*rows) if rows else [()] * len(COMPARE_COLUMNS)
+    return {
+        col: np.array(values, dtype=np.int64 if col in ("location_id", "day") else np.float64)
+        for col, values in zip(COMPARE_COLUMNS, columns)
+    }
+
+
+def _day_strs(days: np.ndarray) -> list:
+    """
+    Convierte de una vez números de día desde 1970-01-01 en fechas YYYY-MM-DD.
+    """
+    return np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+
+
+def _group_starts(keys: np.ndarray) -> np.ndarray:
+    """
+    Devuelve el índice de la primera fila de cada grupo en un array ordenado.
+    """
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def _first_by(loc: np.ndarray, *order: np.ndarray) -> np.ndarray:
+    """
+    Elige en cada localización la fila que queda primera al ordenar por las claves dadas.
+
+    Devuelve un array con el índice de la fila elegida por localización, en orden de localización.
+    """
+    idx = np.lexsort(tuple(reversed(order)) + (loc,))
+    return idx[_group_starts(loc[idx])]
+
+
+def compare_temperature(days: Dict[str, np.ndarray], above: Optional[dict], below: Optional[dict]) -> Dict[int, dict]:
+    """
+    Calcula las estadísticas de temperatura de todas las localizaciones sobre sus filas diarias.
+
+    Mismo resultado que services.stats.query_temperature_stats para cada
+    localización, con sumas y extremos agrupados por localización con
+    NumPy. Las filas deben venir ordenadas por localización y día.
+
+    Parámetros:
+        - days (dict): arrays de las columnas de COMPARE_COLUMNS
+        - above (dict): horas por encima del umbral por localización, None para usar las de las filas
+        - below (dict): horas por debajo del umbral por localización, None para usar las de las filas
+
+    Devuelve un dict location_id -> formato de /stats/temperature; las
+    localizaciones sin temperaturas en el rango no aparecen.
+    """
+    loc = days["location_id"]
+    starts = _group_starts(loc)
+    if not len(starts):
+        return {}
+    hours_above = dict(zip(loc[starts].tolist(), np.add.reduceat(days["hours_above"], starts)))
+    hours_below = dict(zip(loc[starts].tolist(), np.add.reduceat(days["hours_below"], starts)))
+
+    # Solo los días con alguna temperatura
+    has_temp = days["temp_count"] > 0
+    days = {col: values[has_temp] for col, values in days.items()}
+    loc = days["location_id"]
+    starts = _group_starts(loc)
+    if not len(starts):
+        return {}
+
+    # Promedio general y por día
+    sums = np.add.reduceat(days["temp_sum"], starts)
+    counts = np.add.reduceat(days["temp_count"], starts)
+    day_means = (days["temp_sum"] / days["temp_count"]).tolist()
+    day_keys = _day_strs(days["day"])
+
+    # Máximo y mínimo, la primera hora en caso de empate
+    i_max = _first_by(loc, -days["temp_max"], days["temp_max_at"])
+    i_min = _first_by(loc, days["temp_min"], days["temp_min_at"])
+
+    output = {}
+    bounds = np.append(starts, len(loc)).tolist()
+    for g, location_id in enumerate(loc[starts].tolist()):
+        group = range(bounds[g], bounds[g + 1])
+        output[location_id] = {
+            "temperature": {
+                "average": round(float(sums[g] / counts[g]), 2),
+                "average_by_day": {day_keys[i]: round(day_means[i], 2) for i in group},
+                "max": {
+                    "value": float(days["temp_max"][i_max[g]]),
+                    "date_time": from_hours(days["temp_max_at"][i_max[g]]).isoformat()
+                },
+                "min": {
+                    "value": float(days["temp_min"][i_min[g]]),
+                    "date_time": from_hours(days["temp_min_at"][i_min[g]]).isoformat()
+                },
+                "hours_above_threshold": int((above if above is not None else hours_above).get(location_id, 0)),
+                "hours_below_threshold": int((below if below is not None else hours_below).get(location_id, 0))
+            }
+        }
+    return output
+
+
+def compare_precipitation(days: Dict[str, np.ndarray]) -> Dict[int, dict]:
+    """
+    Calcula las estadísticas de precipitación de todas las localizaciones sobre sus filas diarias.
+
+    Mismo resultado que services.stats.query_precipitation_stats para cada
+    localización. Las filas deben venir ordenadas por localización y día.
+
+    Devuelve un dict location_id -> formato de /stats/precipitation; las
+    localizaciones sin precipitación en el rango no aparecen.
+    """
+    loc = days["location_id"]
+    starts = _group_starts(loc)
+    if not len(starts):
+        return {}
+
+    # Totales por localización y día de máxima precipitación (el primero en caso de empate)
+    precip = days["precip_sum"]
+    totals = np.add.reduceat(precip, starts)
+    counts = np.add.reduceat(days["precip_count"], starts)
+    wet_days = np.add.reduceat((precip > 0).astype(np.int64), starts)
+    i_max = _first_by(loc, -precip, days["day"])
+    day_totals = [round(total, 2) for total in precip.tolist()]
+    day_keys = _day_strs(days["day"])
+
+    output = {}
+    bounds = np.append(starts, len(loc)).tolist()
+    for g, location_id in enumerate(loc[starts].tolist()):
+        if not counts[g]:
+            continue
+        output[location_id] = {
+            "precipitation": {
+                "total": round(float(totals[g]), 2),
+                "total_by_day": {day_keys[i]: day_totals[i] for i in range(bounds[g], bounds[g + 1])},
+                "days_with_precipitation": int(wet_days[g]),
+                "max": {
+                    "value": round(float(precip[i_max[g]]), 2),
+                    "date": day_keys[i_max[g]]
+                },
+                "average": round(float(totals[g] / counts[g]), 2)
+            }
+        }
+    return output
+
+
+def compare_kernel(rows, edge_rows, first_day: Optional[int], last_day: Optional[int],
+                   above: Optional[dict], below: Optional[dict]) -> Dict[int, dict]:
+    """
+    Calcula las estadísticas de todas las localizaciones a partir de las filas diarias leídas.
+
+    Parámetros:
+        - rows (list): filas de weather_daily de todos los días tocados por el rango
+        - edge_rows (list): agregados de las horas de los días parciales de los extremos
+        - first_day (int): primer día completo del rango, None si no hay ninguno
+        - last_day (int): último día completo del rango
+        - above (dict): horas por encima del umbral por localización, None si son las precalculadas
+        - below (dict): horas por debajo del umbral por localización, None si son las precalculadas
+
+    La precipitación usa los días completos de rows y la temperatura los
+    días completos del rango más los días parciales, igual que
+    /stats/precipitation y /stats/temperature.
+
+    Devuelve un dict location_id -> {"temperature": ..., "precipitation": ...}.
+    """
+    daily = _to_arrays(rows)
+    edges = _to_arrays(edge_rows)
+
+    # Días de la temperatura: los completos del resumen y los parciales agregados al vuelo
+    inside = (
+        (daily["day"] >= first_day) & (daily["day"] <= last_day) if first_day is not None
+        else np.zeros(len(daily["day"]), dtype=bool)
+    )
+    temp_days = {col: np.concatenate([daily[col][inside], edges[col]]) for col in COMPARE_COLUMNS}
+    order = np.lexsort((temp_days["day"], temp_days["location_id"]))
+    temp_days = {col: values[order] for col, values in temp_days.items()}
+
+    temperature = compare_temperature(temp_days, above, below)
+    precipitation = compare_precipitation(daily)
+
+    return {
+        location_id: {
+            "temperature": temperature.get(location_id, {}).get("temperature"),
+            "precipitation": precipitation.get(location_id, {}).get("precipitation"),
+        }
+        for location_id in sorted(set(temperature) | set(precipitation))
+    }
+
+
+async def query_compare_stats(
+    session: AsyncSession,
+    location_ids: List[int],
+    start_dt: datetime,
+    end_dt: datetime,
+    threshold_high: float,
+    threshold_low: float,
+) -> Dict[int, dict]:
+    """
+    Calcula las estadísticas de temperatura y precipitación de varias localizaciones a la vez.
+
+    Los días de todas las localizaciones se leen del resumen diario con una
+    única consulta sobre su clave primaria (location_id, day), y los días
+    parciales de los extremos del rango se agregan al vuelo para todas a la
+    vez. Las estadísticas se calculan agrupando por localización con NumPy
+    en el ejecutor de cálculos, así que el coste por ciudad es el de sus
+    filas diarias, sin consultas propias.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - location_ids (list): ids de las localizaciones
+        - start_dt (datetime): inicio del rango
+        - end_dt (datetime): fin del rango (incluido)
+        - threshold_high (float): umbral superior de temperatura
+        - threshold_low (float): umbral inferior de temperatura
+
+    Devuelve un dict location_id -> {"temperature": ..., "precipitation": ...}
+    con el formato de /stats/temperature y /stats/precipitation (None si no
+    hay datos de esa variable); las localizaciones sin datos no aparecen.
+    """
+    # Días completos tocados por el rango, los de la precipitación
+    d = WeatherDailyDB.__table__
+    with span("compare.rows") as s:
+        rows = (await session.execute(
+            select(*_columns(d))
+            .where(d.c.location_id.in_(location_ids))
+            .where(d.c.day >= start_dt.date())
+            .where(d.c.day <= end_dt.date())
+            .order_by(d.c.location_id, d.c.day)
+        )).all()
+        s.rows = len(rows)
+
+    # Días parciales de la temperatura en los extremos del rango
+    async def aggregate(start, end):
+        sub = daily_aggregate_select(location_ids, start, end, threshold_high, threshold_low).subquery()
+        return (await session.execute(select(*_columns(sub)))).all()
+
+    days = full_days(start_dt, end_dt)
+    if days is None:
+        edge_rows = await aggregate(start_dt, end_dt)
+        first_day = last_day = None
+    else:
+        first_dt = datetime.combine(days[0], datetime.min.time())
+        after_last_dt = datetime.combine(days[1] + timedelta(days=1), datetime.min.time())
+        edge_rows = []
+        if start_dt < first_dt:
+            edge_rows += await aggregate(start_dt, first_dt - timedelta(microseconds=1))
+        if end_dt >= after_last_dt:
+            edge_rows += await aggregate(after_last_dt, end_dt)
+        first_day, last_day = ((day - EPOCH_DAY).days for day in days)
+
+    # Horas por encima / debajo del umbral: precalculadas con los umbrales por defecto, de los datos horarios si no
+    above = below = None
+    if (threshold_high, threshold_low) != (STATS_THRESHOLD_HIGH, STATS_THRESHOLD_LOW):
+        temp = WeatherDataDB.temperature_2m
+        result = await session.execute(
+            select(
+                WeatherDataDB.location_id,
+                func.sum(case((temp > threshold_high, 1), else_=0)),
+                func.sum(case((temp < threshold_low, 1), else_=0)),
+            )
+            .where(WeatherDataDB.location_id.in_(location_ids))
+            .where(WeatherDataDB.ts >= ceil_hour(start_dt))
+            .where(WeatherDataDB.ts <= end_dt)
+            .group_by(WeatherDataDB.location_id)
+        )
+        counts = result.all()
+        above = {location_id: n for location_id, n, _ in counts}
+        below = {location_id: n for location_id, _, n in counts}
+
+    if not rows and not edge_rows:
+        return {}
+    return await run_kernel(compare_kernel, rows, edge_rows, first_day, last_day, above, below)
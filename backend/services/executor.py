@@ -0,0 +1,176 @@
+import asyncio
+import functools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+from options.settings import STATS_EXECUTOR, STATS_EXECUTOR_WORKERS, STATS_EXECUTOR_TIMEOUT
+from services.metrics import span
+
+# Modos de ejecución admitidos
+MODES = ("thread", "process", "inline")
+
+
+class KernelExecutor:
+    """
+    Ejecuta los cálculos de estadísticas fuera del bucle de eventos.
+
+    Los cálculos (funciones síncronas sobre arrays de NumPy) se envían a un
+    pool de hilos o de procesos, de modo que una agregación pesada no
+    bloquea al resto de peticiones. Con procesos los argumentos viajan
+    serializados, por eso se pasan arrays compactos y no objetos ORM. Un
+    semáforo limita los cálculos simultáneos y cada cálculo tiene un tiempo
+    máximo, contando la espera por el semáforo. Un cálculo que supera el
+    tiempo máximo no se puede interrumpir: su hueco se libera cuando el pool
+    termina de ejecutarlo, no al responder, de modo que el límite y running
+    reflejan siempre el trabajo real del pool.
+
+    En modo inline el cálculo se ejecuta en el propio bucle de eventos y lo
+    bloquea hasta terminar, así que no hay tiempo máximo.
+
+    Parámetros:
+        - mode (str): thread, process o inline (en el propio bucle, sin pool)
+        - workers (int): tamaño del pool y número máximo de cálculos simultáneos
+        - timeout (float): segundos máximos por cálculo (no se aplica en modo inline)
+    """
+
+    def __init__(self, mode: str = STATS_EXECUTOR, workers: int = STATS_EXECUTOR_WORKERS,
+                 timeout: float = STATS_EXECUTOR_TIMEOUT):
+        if mode not in MODES:
+            raise ValueError(f"Modo de ejecución desconocido: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.timeout = timeout
+        self._pool: Optional[Executor] = None
+        if mode == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stats")
+        elif mode == "process":
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._slots = asyncio.Semaphore(workers)
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.timeouts = 0
+
+    def _release(self):
+        """
+        Libera el hueco de un cálculo que el pool ha terminado de ejecutar.
+        """
+        self.running -= 1
+        self._slots.release()
+
+    async def _submit(self, call: Callable):
+        """
+        Espera un hueco y ejecuta el cálculo en el pool.
+
+        El hueco se libera desde el callback del futuro del pool, que se
+        ejecuta cuando el cálculo termina o se cancela antes de empezar,
+        aunque quien lo esperaba ya se haya cancelado por el tiempo máximo.
+        """
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            self._release()
+            raise
+
+        loop = asyncio.get_running_loop()
+
+        def done(_):
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                # El bucle ya está cerrado: la aplicación se ha detenido
+                pass
+
+        future.add_done_callback(done)
+        return await asyncio.wrap_future(future)
+
+    async def run(self, fn: Callable, *args):
+        """
+        Ejecuta fn(*args) en el pool con el límite de concurrencia y el tiempo máximo.
+
+        Parámetros:
+            - fn (Callable): función síncrona de nivel de módulo (serializable con procesos)
+            - args: argumentos de la función
+
+        Devuelve el resultado de fn. Lanza asyncio.TimeoutError si se supera el
+        tiempo máximo (nunca en modo inline, donde el cálculo bloquea el bucle).
+        """
+        with span(f"kernel.{fn.__name__}"):
+            if self._pool is None:
+                result = fn(*args)
+            else:
+                try:
+                    result = await asyncio.wait_for(self._submit(functools.partial(fn, *args)), self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise
+        self.completed += 1
+        return result
+
+    def shutdown(self):
+        """
+        Cierra el pool sin esperar a los cálculos en curso.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        """
+        Devuelve el modo, el tamaño del pool y los cálculos en curso, en espera, terminados y caducados.
+        """
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+        }
+
+
+# Ejecutor compartido, se arranca y cierra con la aplicación
+_executor: Optional[KernelExecutor] = None
+
+
+def start_executor(**kwargs) -> KernelExecutor:
+    """
+    Crea el ejecutor compartido. Los parámetros sustituyen a los de options.settings.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+    _executor = KernelExecutor(**kwargs)
+    return _executor
+
+
+def shutdown_executor():
+    """
+    Cierra el ejecutor compartido si está abierto.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def get_executor() -> KernelExecutor:
+    """
+    Devuelve el ejecutor compartido, creándolo si se usa fuera de la aplicación (scripts, pruebas).
+    """
+    global _executor
+    if _executor is None:
+        _executor = KernelExecutor()
+    return _executor
+
+
+async def run_kernel(fn: Callable, *args):
+    """
+    Ejecuta un cálculo en el ejecutor compartido. Ver KernelExecutor.run.
+    """
+    return await get_executor().run(fn, *args)
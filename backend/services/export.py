@@ -0,0 +1,171 @@
+import io
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+import numpy as np
+from db.database import AsyncReadSessionLocal
+from db.types import ceil_hour
+from models.location import LocationDB
+from models.weatherData import WeatherDataDB
+from options.settings import EXPORT_BATCH_SIZE
+from sqlalchemy import Integer, func, select, type_coerce
+
+# pyarrow es opcional: sin él solo está disponible el formato npz
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Tipo de contenido y extensión de cada formato
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "npz": ("application/octet-stream", "npz"),
+}
+
+
+def default_format() -> str:
+    """
+    Devuelve el formato por defecto: parquet si pyarrow está instalado, npz si no.
+    """
+    return "parquet" if pa is not None else "npz"
+
+
+async def _chunks(locations: List[LocationDB], start_dt: Optional[datetime], end_dt: Optional[datetime],
+                  batch_size: int):
+    """
+    Recorre por bloques los datos horarios de varias localizaciones.
+
+    Cada bloque se lee de un cursor del servidor y se convierte directamente
+    en arrays, sin objetos ORM.
+
+    Devuelve un generador asíncrono de tuplas (índice de ciudad, ts int64, temperatura float32, precipitación float32).
+    """
+    async with AsyncReadSessionLocal() as session:
+        for index, location in enumerate(locations):
+            stmt = (
+                select(type_coerce(WeatherDataDB.ts, Integer), WeatherDataDB.temperature_2m, WeatherDataDB.precipitation)
+                .where(WeatherDataDB.location_id == location.id)
+                .order_by(WeatherDataDB.ts)
+            )
+            if start_dt is not None:
+                stmt = stmt.where(WeatherDataDB.ts >= ceil_hour(start_dt))
+            if end_dt is not None:
+                stmt = stmt.where(WeatherDataDB.ts <= end_dt)
+
+            result = await session.stream(stmt.execution_options(yield_per=batch_size))
+            async for partition in result.partitions(batch_size):
+                hours, temps, precs = zip(*partition)
+                yield (
+                    index,
+                    np.array(hours, dtype=np.int64) * 3600,
+                    np.array(temps, dtype=np.float64).astype(np.float32),
+                    np.array(precs, dtype=np.float64).astype(np.float32),
+                )
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Fichero de salida que entrega por partes lo escrito por pyarrow.
+
+    tell() cuenta todos los bytes escritos, porque el escritor de parquet
+    guarda en el pie las posiciones de los grupos de filas.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written
+
+    def drain(self) -> bytes:
+        """
+        Devuelve lo escrito desde la llamada anterior.
+        """
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+async def count_rows(locations: List[LocationDB], start_dt: Optional[datetime], end_dt: Optional[datetime]) -> int:
+    """
+    Cuenta las filas que exportaría stream_export, con una consulta sobre la clave primaria.
+    """
+    stmt = select(func.count()).select_from(WeatherDataDB).where(
+        WeatherDataDB.location_id.in_([location.id for location in locations])
+    )
+    if start_dt is not None:
+        stmt = stmt.where(WeatherDataDB.ts >= ceil_hour(start_dt))
+    if end_dt is not None:
+        stmt = stmt.where(WeatherDataDB.ts <= end_dt)
+    async with AsyncReadSessionLocal() as session:
+        return (await session.execute(stmt)).scalar()
+
+
+async def stream_export(locations: List[LocationDB], start_dt: Optional[datetime], end_dt: Optional[datetime],
+                        fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    Genera por partes una exportación columnar de los datos horarios de varias ciudades.
+
+    Columnas: city (nombre), ts (segundos desde 1970-01-01, int64),
+    temperature_2m y precipitation (float32). En parquet y arrow cada bloque
+    se escribe como un record batch según se lee y se entrega en cuanto está
+    escrito, así que en memoria solo hay un bloque cada vez. npz no se puede
+    escribir por partes: los arrays city_index, ts, temperature_2m y
+    precipitation (con el array cities con los nombres) se construyen enteros
+    en memoria, por eso la ruta limita sus filas con EXPORT_NPZ_MAX_ROWS.
+
+    Parámetros:
+        - locations (list): localizaciones a exportar, en el orden de salida
+        - start_dt (datetime): inicio del rango, None sin límite
+        - end_dt (datetime): fin del rango (incluido), None sin límite
+        - fmt (str): parquet, arrow o npz
+        - batch_size (int): filas por bloque
+
+    Devuelve un generador asíncrono con los bytes del fichero.
+    """
+    names = [location.name for location in locations]
+
+    # Formatos de pyarrow: escribir y entregar bloque a bloque
+    if fmt in ("parquet", "arrow"):
+        schema = pa.schema([
+            ("city", pa.dictionary(pa.int32(), pa.string())),
+            ("ts", pa.int64()),
+            ("temperature_2m", pa.float32()),
+            ("precipitation", pa.float32()),
+        ])
+        dictionary = pa.array(names, type=pa.string())
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+        async for index, ts, temp, precip in _chunks(locations, start_dt, end_dt, batch_size):
+            city = pa.DictionaryArray.from_arrays(pa.array(np.full(len(ts), index, dtype=np.int32)), dictionary)
+            writer.write_batch(pa.record_batch([city, ts, temp, precip], schema=schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+        return
+
+    # npz sin dependencias: unir los bloques al final
+    parts = {"city_index": [], "ts": [], "temperature_2m": [], "precipitation": []}
+    async for index, ts, temp, precip in _chunks(locations, start_dt, end_dt, batch_size):
+        parts["city_index"].append(np.full(len(ts), index, dtype=np.int32))
+        parts["ts"].append(ts)
+        parts["temperature_2m"].append(temp)
+        parts["precipitation"].append(precip)
+
+    empty = {"city_index": np.int32, "ts": np.int64, "temperature_2m": np.float32, "precipitation": np.float32}
+    arrays = {key: np.concatenate(chunks) if chunks else np.array([], dtype=empty[key]) for key, chunks in parts.items()}
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, cities=np.array(names), **arrays)
+    yield buffer.getvalue()
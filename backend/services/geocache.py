@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+from db.database import AsyncSessionLocal, upsert
+from db.types import utcnow
+from models.geocode import GeocodeCacheDB
+from options.settings import GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL, GEOCODE_NEGATIVE_TTL
+from services.locations import normalize_city
+from services.singleflight import SingleFlight
+
+# Función que geocodifica una ciudad: devuelve {"latitude", "longitude"} o None si no existe
+Resolver = Callable[[str], Awaitable[Optional[dict]]]
+
+
+class GeocodeCache:
+    """
+    Caché de geocodificación con LRU en memoria, caducidad y respaldo en BD.
+
+    Las entradas se guardan por nombre de ciudad normalizado. Las ciudades
+    que la Geocoding API no encuentra también se guardan (caché negativa)
+    con una vigencia menor. Si la API falla y existe una entrada caducada,
+    se devuelve esa entrada para no detener la carga. Las búsquedas
+    concurrentes de una ciudad que no está en memoria comparten una única
+    consulta a la BD y a la API.
+
+    Parámetros:
+        - resolver (Resolver): función asíncrona que consulta la Geocoding API
+        - maxsize (int): número máximo de entradas en memoria
+        - ttl (float): vigencia en segundos de las ciudades encontradas
+        - negative_ttl (float): vigencia en segundos de las ciudades no encontradas
+        - persistent (bool): si es False no se lee ni se escribe la tabla geocode_cache
+    """
+
+    def __init__(
+        self,
+        resolver: Resolver,
+        maxsize: int = GEOCODE_CACHE_SIZE,
+        ttl: float = GEOCODE_CACHE_TTL,
+        negative_ttl: float = GEOCODE_NEGATIVE_TTL,
+        persistent: bool = True,
+    ):
+        self.resolver = resolver
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._flight = SingleFlight()
+
+    def _is_fresh(self, entry: dict) -> bool:
+        """
+        Indica si una entrada sigue vigente según si es positiva o negativa.
+        """
+        ttl = self.ttl if entry["found"] else self.negative_ttl
+        return utcnow() - entry["fetched_at"] < timedelta(seconds=ttl)
+
+    def _remember(self, key: str, entry: dict):
+        """
+        Guarda una entrada en memoria expulsando la menos usada si se supera el tamaño.
+        """
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def _load(self, key: str) -> Optional[dict]:
+        """
+        Lee una entrada de la tabla geocode_cache.
+        """
+        async with AsyncSessionLocal() as session:
+            row = await session.get(GeocodeCacheDB, key)
+        if row is None:
+            return None
+        return {"found": row.found, "latitude": row.latitude, "longitude": row.longitude, "fetched_at": row.fetched_at}
+
+    async def _store(self, key: str, entry: dict):
+        """
+        Inserta o actualiza una entrada en la tabla geocode_cache.
+        """
+        stmt = upsert(GeocodeCacheDB.__table__).values(query_key=key, **entry)
+        stmt = stmt.on_conflict_do_update(index_elements=["query_key"], set_=entry)
+        async with AsyncSessionLocal() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    @staticmethod
+    def _result(entry: dict) -> Optional[dict]:
+        """
+        Convierte una entrada de la caché en el resultado de la búsqueda.
+        """
+        if not entry["found"]:
+            return None
+        return {"latitude": entry["latitude"], "longitude": entry["longitude"]}
+
+    async def lookup(self, city: str) -> Optional[dict]:
+        """
+        Geocodifica una ciudad consultando primero la memoria, luego la BD y por último la API.
+
+        Parámetros:
+            - city (str): nombre de la ciudad
+
+        Devuelve un dict con latitude y longitude, o None si la ciudad no existe.
+        """
+        key = normalize_city(city)
+
+        # Memoria
+        entry = self._entries.get(key)
+        if entry is not None and self._is_fresh(entry):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._result(entry)
+
+        # BD y API, una sola consulta para las búsquedas concurrentes de la ciudad
+        return await self._flight.do(key, lambda: self._resolve(key, city, entry))
+
+    async def _resolve(self, key: str, city: str, entry: Optional[dict]) -> Optional[dict]:
+        """
+        Resuelve una ciudad que no está vigente en memoria desde la BD o la Geocoding API.
+        """
+        # Base de datos local
+        if self.persistent:
+            stored = await self._load(key)
+            if stored is not None:
+                entry = stored
+                if self._is_fresh(stored):
+                    self._remember(key, stored)
+                    self.persistent_hits += 1
+                    return self._result(stored)
+
+        # Geocoding API, con la entrada caducada como respaldo si falla
+        self.misses += 1
+        try:
+            coords = await self.resolver(city)
+        except Exception:
+            if entry is None:
+                raise
+            self.stale_hits += 1
+            return self._result(entry)
+
+        entry = {
+            "found": coords is not None,
+            "latitude": coords["latitude"] if coords else None,
+            "longitude": coords["longitude"] if coords else None,
+            "fetched_at": utcnow(),
+        }
+        self._remember(key, entry)
+        if self.persistent:
+            await self._store(key, entry)
+        return self._result(entry)
+
+    def clear(self):
+        """
+        Vacía la memoria y reinicia los contadores. La tabla geocode_cache no se modifica.
+        """
+        self._entries.clear()
+        self.hits = self.persistent_hits = self.misses = self.stale_hits = 0
+        self._flight = SingleFlight()
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de aciertos y fallos y el tamaño de la caché.
+        """
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "coalesced": self._flight.coalesced,
+            "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,297 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import AsyncSessionLocal, upsert
+from db.writelock import write_lock
+from db.types import HOURS_PER_DAY, day_of, from_hours
+from models.location import LocationDB
+from models.weatherData import WeatherDataDB
+from options.settings import INGEST_BATCH_SIZE
+from services.locations import normalize_city, get_location, get_or_create_location
+from services.rollups import refresh_aggregates
+from services.series_cache import get_series_cache
+from services.metrics import span
+from services.singleflight import SingleFlight, KeyedLock
+from services.openmeteo import fetch_weather_ranges, fetch_weather_multi, get_geocode_cache
+
+# Cargas idénticas en curso y cerrojo por ciudad para las que se solapan
+load_flight = SingleFlight()
+city_locks = KeyedLock()
+
+
+def weather_upsert():
+    """
+    Construye el INSERT ... ON CONFLICT de weather_data, para ejecutarlo con una lista de filas.
+
+    Las horas ya guardadas solo se sobrescriben si no tienen temperatura y
+    devuelve (RETURNING) la hora de cada fila escrita.
+    """
+    table = WeatherDataDB.__table__
+    stmt = upsert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=["location_id", "ts"],
+        set_={"temperature_2m": stmt.excluded.temperature_2m, "precipitation": stmt.excluded.precipitation},
+        where=table.c.temperature_2m.is_(None),
+    ).returning(table.c.ts)
+
+
+async def bulk_insert_weather(session: AsyncSession, city: str, data: dict, batch_size: int = INGEST_BATCH_SIZE) -> dict:
+    """
+    Inserta de forma masiva los datos horarios devueltos por Open-Meteo.
+
+    Las filas se insertan por lotes con un único INSERT ejecutado como
+    executemany. Las horas se convierten de una vez a enteros (horas desde
+    1970-01-01) con NumPy. Las horas que ya existen para la ciudad se
+    ignoran gracias a la clave primaria (location_id, ts), por lo que repetir una carga no
+    duplica datos aunque el nombre llegue con otras mayúsculas. Solo se
+    sobrescriben las horas guardadas sin temperatura, que la API de archivo
+    devuelve vacías mientras los datos más recientes no están disponibles.
+    Si se escribe alguna fila se recalculan el resumen diario de esos días
+    y el resumen de la ciudad y se incrementa su versión de datos.
+
+    Las filas escritas se cuentan con RETURNING y no con el rowcount, que
+    con executemany algunos drivers (asyncpg) no informan y devuelven -1.
+    Con RETURNING el lote se envía como un único INSERT de varias filas, así
+    que las horas repetidas en la respuesta (el cambio de hora con
+    timezone=auto) se quitan antes, conservando la primera con temperatura.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos, el commit queda a cargo del llamador
+        - city (str): nombre de la ciudad
+        - data (dict): respuesta de la API de archivo con latitude, longitude y hourly
+        - batch_size (int): número de filas por lote
+
+    Devuelve un objeto dict con el id de la localización y el número de filas
+    recibidas, insertadas (o completadas) y omitidas.
+    """
+    # Obtener latitud, longitud y datos horarios
+    lat = data.get("latitude")
+    lon = data.get("longitude")
+    hourly = data["hourly"]
+
+    # Localización de la ciudad, creada en la primera carga
+    location = await get_or_create_location(session, city, lat, lon)
+
+    # Preparar las filas como diccionarios, sin objetos ORM
+    hours = np.array(hourly["time"], dtype="datetime64[m]").astype("datetime64[h]").astype(np.int64).tolist()
+    by_hour = {}
+    for ts, temp, prec in zip(hours, hourly["temperature_2m"], hourly["precipitation"]):
+        if ts not in by_hour or by_hour[ts]["temperature_2m"] is None:
+            by_hour[ts] = {"location_id": location.id, "ts": ts, "temperature_2m": temp, "precipitation": prec}
+    rows = list(by_hour.values())
+
+    # INSERT ... ON CONFLICT sobre la clave (location_id, ts), solo actualiza horas vacías
+    stmt = weather_upsert()
+
+    inserted = 0
+    with span("ingest.insert") as s:
+        for i in range(0, len(rows), batch_size):
+            result = await session.execute(stmt, rows[i:i + batch_size])
+            inserted += len(result.all())
+        s.rows = inserted
+
+    # Actualizar el resumen diario de los días cargados y el resumen de la ciudad
+    if inserted:
+        with span("ingest.rollups"):
+            await refresh_aggregates(session, location.id, from_hours(hours[0]).date(), from_hours(hours[-1]).date())
+        await session.execute(
+            update(LocationDB).where(LocationDB.id == location.id).values(data_version=LocationDB.data_version + 1)
+        )
+
+    return {"location_id": location.id, "total": len(hours), "inserted": inserted, "skipped": len(hours) - inserted}
+
+
+async def missing_date_ranges(session: AsyncSession, location_id: int, start: date, end: date) -> List[Tuple[date, date]]:
+    """
+    Calcula los rangos de días que faltan en la BD para una localización.
+
+    Cuenta las horas con temperatura guardadas por día dentro del rango con
+    una consulta sobre la clave primaria (location_id, ts). Los días con menos
+    de 24 horas se consideran pendientes y los días pendientes consecutivos se
+    agrupan en un único rango.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - location_id (int): id de la localización
+        - start (date): primer día del rango
+        - end (date): último día del rango (incluido)
+
+    Devuelve una lista ordenada de tuplas (inicio, fin) con los días incluidos.
+    """
+    day = day_of(WeatherDataDB.ts)
+    result = await session.execute(
+        select(day, func.count(WeatherDataDB.temperature_2m))
+        .where(WeatherDataDB.location_id == location_id)
+        .where(WeatherDataDB.ts >= datetime.combine(start, datetime.min.time()))
+        .where(WeatherDataDB.ts < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        .group_by(day)
+    )
+    complete = {d for d, hours in result.all() if hours >= HOURS_PER_DAY}
+
+    # Agrupar los días pendientes consecutivos
+    ranges = []
+    current = start
+    while current <= end:
+        if current in complete:
+            current += timedelta(days=1)
+            continue
+        gap_start = current
+        while current <= end and current not in complete:
+            current += timedelta(days=1)
+        ranges.append((gap_start, current - timedelta(days=1)))
+    return ranges
+
+
+async def load_city_weather(city: str, start: date, end: date) -> Optional[dict]:
+    """
+    Carga en la BD los datos de una ciudad descargando solo los días que faltan.
+
+    Si la ciudad ya está guardada se calculan los huecos del rango pedido y
+    solo esos huecos se piden a Open-Meteo. Si no falta nada no se realiza
+    ninguna petición externa.
+
+    Las cargas simultáneas de la misma ciudad y rango comparten una única
+    ejecución. Las de la misma ciudad con rangos distintos se ejecutan una
+    detrás de otra, de modo que la segunda calcula sus huecos con los datos
+    ya guardados por la primera.
+
+    Parámetros:
+        - city (str): nombre de la ciudad
+        - start (date): fecha de inicio
+        - end (date): fecha de fin (incluida)
+
+    Devuelve un objeto dict con los registros recibidos, insertados, omitidos
+    y los rangos descargados, o None si Open-Meteo no devuelve datos.
+    """
+    key = normalize_city(city)
+    result = await load_flight.do((key, start, end), lambda: _load_city_locked(city, key, start, end))
+    # Copia para que cada llamador pueda modificar su resultado
+    return dict(result) if result is not None else None
+
+
+async def _load_city_locked(city: str, key: str, start: date, end: date) -> Optional[dict]:
+    """
+    Ejecuta la carga de una ciudad con el cerrojo de la ciudad.
+    """
+    async with city_locks.hold(key):
+        return await _load_city(city, start, end)
+
+
+async def _load_city(city: str, start: date, end: date) -> Optional[dict]:
+    """
+    Descarga y guarda los huecos de una ciudad. Ver load_city_weather.
+    """
+    # Calcular los rangos pendientes
+    async with AsyncSessionLocal() as session:
+        location = await get_location(session, city)
+        if location is None:
+            ranges = [(start, end)]
+        else:
+            ranges = await missing_date_ranges(session, location.id, start, end)
+
+    # Nada que descargar
+    if not ranges:
+        return {"total": 0, "inserted": 0, "skipped": 0, "ranges": []}
+
+    # Obtener datos desde Open-Meteo
+    data = await fetch_weather_ranges(city, ranges)
+
+    # Verificar que haya datos
+    if not data or "hourly" not in data:
+        return None
+
+    # Guardar en base de datos con inserción masiva idempotente, un proceso escritor cada vez
+    async with write_lock.hold(), AsyncSessionLocal() as session:
+        result = await bulk_insert_weather(session, city, data)
+
+        # Commit para conformar la transacción y cerrar sesión
+        await session.commit()
+
+    # Descartar la serie en memoria de la ciudad
+    if result["inserted"]:
+        get_series_cache().invalidate(result["location_id"])
+
+    result["ranges"] = [(str(s), str(e)) for s, e in ranges]
+    return result
+
+
+async def load_cities_weather(cities: List[str], start: date, end: date) -> dict:
+    """
+    Carga en la BD los datos de varias ciudades con consultas agrupadas.
+
+    Las ciudades se geocodifican de forma concurrente. Para cada ciudad ya
+    guardada se calculan sus huecos y las que no tienen huecos no se
+    descargan. El resto se agrupan por los huecos que necesitan, de modo que
+    una ciudad con huecos separados no vuelve a descargar los días que ya
+    tiene entre ellos, y cada grupo se pide con consultas multi-ubicación.
+    Todas las filas se guardan en una única transacción.
+
+    Parámetros:
+        - cities (list): nombres de las ciudades, las repetidas (sin distinguir mayúsculas) se cargan una vez
+        - start (date): fecha de inicio
+        - end (date): fecha de fin (incluida)
+
+    Devuelve un objeto dict por ciudad con el estado (cargada, sin_cambios o
+    no_encontrada) y los registros recibidos, insertados y omitidos.
+    """
+    # Quitar ciudades repetidas conservando el primer nombre recibido
+    unique = {}
+    for city in cities:
+        unique.setdefault(normalize_city(city), city)
+    unique = list(unique.values())
+    summary = {city: {"estado": "sin_cambios", "registros": 0, "insertados": 0, "omitidos": 0} for city in unique}
+
+    # Calcular los huecos de cada ciudad
+    gaps = {}
+    async with AsyncSessionLocal() as session:
+        for city in unique:
+            location = await get_location(session, city)
+            ranges = [(start, end)] if location is None else await missing_date_ranges(session, location.id, start, end)
+            if ranges:
+                gaps[city] = tuple(ranges)
+
+    # Geocodificar a la vez las ciudades pendientes
+    cache = get_geocode_cache()
+    pending = list(gaps)
+    coords = dict(zip(pending, await asyncio.gather(*[cache.lookup(city) for city in pending])))
+
+    # Agrupar por huecos y descargar cada grupo con consultas multi-ubicación
+    groups = {}
+    for city in pending:
+        if coords[city] is None:
+            summary[city]["estado"] = "no_encontrada"
+            continue
+        groups.setdefault(gaps[city], []).append(city)
+
+    results = await asyncio.gather(*[
+        fetch_weather_multi([coords[city] for city in group], list(ranges))
+        for ranges, group in groups.items()
+    ])
+
+    # Guardar todas las ciudades en una única transacción, un proceso escritor cada vez
+    written = []
+    async with write_lock.hold(), AsyncSessionLocal() as session:
+        for group, datas in zip(groups.values(), results):
+            for city, data in zip(group, datas):
+                if data is None:
+                    summary[city]["estado"] = "no_encontrada"
+                    continue
+                result = await bulk_insert_weather(session, city, data)
+                if result["inserted"]:
+                    written.append(result["location_id"])
+                summary[city] = {
+                    "estado": "cargada",
+                    "registros": result["total"],
+                    "insertados": result["inserted"],
+                    "omitidos": result["skipped"],
+                }
+        await session.commit()
+
+    # Descartar las series en memoria de las ciudades escritas
+    for location_id in written:
+        get_series_cache().invalidate(location_id)
+
+    return summary
@@ -0,0 +1,270 @@
+import asyncio
+import uuid
+from datetime import date
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update
+from db.database import AsyncSessionLocal, upsert
+from db.types import utcnow
+from models.job import IngestJobDB
+from options.settings import JOB_WORKERS, RECOVER_JOBS
+from services.locations import normalize_city
+from services.ingest import load_city_weather
+
+# Estados de un trabajo de carga
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+
+def job_to_dict(job: IngestJobDB) -> dict:
+    """
+    Convierte un trabajo en el dict que devuelve /jobs/{id}.
+
+    El tiempo transcurrido se mide desde que empieza a ejecutarse hasta que
+    termina, o hasta ahora si sigue en curso.
+    """
+    elapsed = None
+    if job.started_at is not None:
+        elapsed = round(((job.finished_at or utcnow()) - job.started_at).total_seconds(), 3)
+    return {
+        "id": job.id,
+        "city": job.city,
+        "start_date": str(job.start_date),
+        "end_date": str(job.end_date),
+        "status": job.status,
+        "registros": job.rows_total,
+        "insertados": job.rows_inserted,
+        "omitidos": job.rows_skipped,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "elapsed_seconds": elapsed,
+    }
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    """
+    Lee el estado de un trabajo de la BD.
+
+    Devuelve un objeto dict con el estado del trabajo o None si no existe.
+    """
+    async with AsyncSessionLocal() as session:
+        job = await session.get(IngestJobDB, job_id)
+    return job_to_dict(job) if job is not None else None
+
+
+class JobQueue:
+    """
+    Cola de trabajos de carga atendida por un número fijo de workers asíncronos.
+
+    Los trabajos se guardan en la tabla ingest_jobs, de modo que su estado
+    se puede consultar desde cualquier proceso y los pendientes se retoman
+    al arrancar. Un trabajo para la misma ciudad (sin distinguir mayúsculas)
+    y rango que otro todavía en cola o en curso no se duplica: se devuelve
+    el existente. La BD lo garantiza con el índice único parcial
+    ux_ingest_jobs_active, así que tampoco se duplica entre procesos.
+
+    Parámetros:
+        - workers (int): número máximo de cargas simultáneas
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, recover: bool = RECOVER_JOBS):
+        """
+        Arranca los workers y vuelve a encolar los trabajos que quedaron pendientes.
+
+        Con varios procesos cada uno encola todos los pendientes y cada
+        trabajo lo ejecuta el primero que lo reclama.
+
+        Parámetros:
+            - recover (bool): devolver a la cola los trabajos en curso de un arranque anterior (ver recover_jobs)
+        """
+        if recover:
+            await recover_jobs()
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(IngestJobDB.id).where(IngestJobDB.status == QUEUED).order_by(IngestJobDB.created_at)
+            )
+            pending = result.scalars().all()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Detiene los workers. Los trabajos sin terminar quedan en la BD para el próximo arranque.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, city: str, start: date, end: date) -> Tuple[dict, bool]:
+        """
+        Encola la carga de una ciudad y rango de fechas.
+
+        Parámetros:
+            - city (str): nombre de la ciudad
+            - start (date): fecha de inicio
+            - end (date): fecha de fin (incluida)
+
+        Devuelve una tupla (estado del trabajo, creado): creado es False si ya
+        había un trabajo activo para la misma ciudad y rango.
+        """
+        key = normalize_city(city)
+        table = IngestJobDB.__table__
+        while True:
+            job = IngestJobDB(
+                id=uuid.uuid4().hex, city=city.strip(), city_key=key, start_date=start, end_date=end,
+                status=QUEUED, rows_total=0, rows_inserted=0, rows_skipped=0, created_at=utcnow(),
+            )
+            async with AsyncSessionLocal() as session:
+                # Si ya hay un trabajo activo igual, el índice único descarta el nuevo
+                created = (await session.execute(
+                    upsert(table)
+                    .values({column.name: getattr(job, column.name) for column in table.columns})
+                    .on_conflict_do_nothing()
+                    .returning(table.c.id)
+                )).scalar_one_or_none()
+                existing = None
+                if created is None:
+                    existing = (await session.execute(
+                        select(IngestJobDB)
+                        .where(IngestJobDB.city_key == key)
+                        .where(IngestJobDB.start_date == start)
+                        .where(IngestJobDB.end_date == end)
+                        .where(IngestJobDB.status.in_(ACTIVE))
+                    )).scalar_one_or_none()
+                await session.commit()
+            if created is not None:
+                break
+            if existing is not None:
+                return job_to_dict(existing), False
+            # El trabajo activo terminó entre el INSERT y la consulta: volver a intentarlo
+
+        self._queue.put_nowait(job.id)
+        return job_to_dict(job), True
+
+    async def _set(self, job_id: str, **values):
+        """
+        Actualiza las columnas de un trabajo.
+        """
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(IngestJobDB).where(IngestJobDB.id == job_id).values(**values))
+            await session.commit()
+
+    async def _claim(self, job_id: str) -> bool:
+        """
+        Pasa un trabajo de la cola a en curso si nadie lo ha hecho antes.
+
+        Devuelve True si este worker se queda con el trabajo.
+        """
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(IngestJobDB)
+                .where(IngestJobDB.id == job_id)
+                .where(IngestJobDB.status == QUEUED)
+                .values(status=RUNNING, started_at=utcnow())
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def _run(self, job_id: str):
+        """
+        Ejecuta un trabajo y guarda su resultado.
+        """
+        if not await self._claim(job_id):
+            return
+        async with AsyncSessionLocal() as session:
+            job = await session.get(IngestJobDB, job_id)
+
+        try:
+            result = await load_city_weather(job.city, job.start_date, job.end_date)
+        except Exception as e:
+            await self._set(job_id, status=FAILED, error=str(e), finished_at=utcnow())
+            return
+
+        if result is None:
+            await self._set(job_id, status=FAILED, error="No se encontraron datos meteorológicos",
+                            finished_at=utcnow())
+            return
+        await self._set(
+            job_id, status=DONE, rows_total=result["total"], rows_inserted=result["inserted"],
+            rows_skipped=result["skipped"], finished_at=utcnow(),
+        )
+
+    async def _worker(self):
+        """
+        Atiende la cola hasta que se cancela.
+        """
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """
+        Devuelve el número de workers y de trabajos esperando en la cola.
+        """
+        return {"workers": self.workers, "queued": self._queue.qsize()}
+
+
+async def recover_jobs() -> int:
+    """
+    Devuelve a la cola los trabajos que quedaron en curso al detenerse la aplicación.
+
+    Se repiten desde el principio; la carga es idempotente. Solo debe
+    hacerse una vez por arranque del servidor: con varios workers, un
+    worker que arranca más tarde devolvería a la cola trabajos que otro
+    está ejecutando.
+
+    Devuelve el número de trabajos devueltos a la cola.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(IngestJobDB).where(IngestJobDB.status == RUNNING).values(status=QUEUED, started_at=None)
+        )
+        await session.commit()
+    return result.rowcount
+
+
+# Cola compartida, se arranca y detiene con la aplicación
+_job_queue: Optional[JobQueue] = None
+
+
+async def start_job_queue(**kwargs) -> JobQueue:
+    """
+    Crea y arranca la cola compartida. Los parámetros sustituyen a los de options.settings.
+    """
+    global _job_queue
+    if _job_queue is not None:
+        await _job_queue.stop()
+    _job_queue = JobQueue(**kwargs)
+    await _job_queue.start()
+    return _job_queue
+
+
+async def stop_job_queue():
+    """
+    Detiene la cola compartida si está arrancada.
+    """
+    global _job_queue
+    if _job_queue is not None:
+        await _job_queue.stop()
+        _job_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Devuelve la cola compartida. Debe haberse arrancado con start_job_queue.
+    """
+    if _job_queue is None:
+        raise RuntimeError("La cola de trabajos no está arrancada")
+    return _job_queue
@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import upsert
+from models.location import LocationDB
+from services.metrics import span
+
+
+def normalize_city(city: str) -> str:
+    """
+    Normaliza el nombre de una ciudad para usarlo como clave de búsqueda.
+
+    Parámetros:
+        - city (str): nombre de la ciudad tal y como llega en la petición
+
+    Devuelve el nombre sin espacios laterales y en minúsculas.
+    """
+    return city.strip().lower()
+
+
+async def get_location(session: AsyncSession, city: str) -> Optional[LocationDB]:
+    """
+    Busca una ciudad en la tabla de localizaciones por su clave normalizada.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - city (str): nombre de la ciudad
+
+    Devuelve el objeto LocationDB o None si la ciudad no se ha cargado nunca.
+    """
+    with span("db.location"):
+        result = await session.execute(
+            select(LocationDB).where(LocationDB.city_key == normalize_city(city))
+        )
+        return result.scalar_one_or_none()
+
+
+async def get_locations(session: AsyncSession, cities: List[str]) -> Dict[str, LocationDB]:
+    """
+    Busca varias ciudades con una sola consulta por sus claves normalizadas.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - cities (list): nombres de las ciudades
+
+    Devuelve un dict clave normalizada -> LocationDB solo con las ciudades cargadas.
+    """
+    keys = {normalize_city(city) for city in cities}
+    result = await session.execute(select(LocationDB).where(LocationDB.city_key.in_(keys)))
+    return {location.city_key: location for location in result.scalars()}
+
+
+async def get_or_create_location(session: AsyncSession, city: str, lat: float, lon: float) -> LocationDB:
+    """
+    Obtiene la localización de una ciudad, creándola si todavía no existe.
+
+    La latitud y longitud geocodificadas se guardan una sola vez por ciudad.
+    La inserción ignora conflictos sobre city_key para que dos cargas
+    concurrentes de la misma ciudad no fallen.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos, el commit queda a cargo del llamador
+        - city (str): nombre de la ciudad
+        - lat (float): latitud geocodificada
+        - lon (float): longitud geocodificada
+
+    Devuelve el objeto LocationDB de la ciudad.
+    """
+    await session.execute(
+        upsert(LocationDB.__table__)
+        .values(city_key=normalize_city(city), name=city.strip(), latitude=lat, longitude=lon)
+        .on_conflict_do_nothing(index_elements=["city_key"])
+    )
+    return await get_location(session, city)
@@ -0,0 +1,280 @@
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from options.settings import METRICS_ENABLED, PROFILING
+
+# Límites de los histogramas de duración en segundos y de número de filas
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """
+    Formatea las etiquetas de una serie en el formato de texto de Prometheus.
+    """
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    """
+    Escapa un valor de etiqueta.
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    """
+    Formatea un valor como en la exposición de Prometheus.
+    """
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Contador con etiquetas.
+
+    Parámetros:
+        - name (str): nombre de la métrica
+        - help (str): descripción
+        - labels (tuple): nombres de las etiquetas
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *values, amount: float = 1):
+        """
+        Incrementa la serie con los valores de etiquetas dados, en el orden de labels.
+        """
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        """
+        Devuelve las líneas de la métrica en el formato de texto de Prometheus.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, values)} {_number(total)}")
+        return lines
+
+
+class Histogram:
+    """
+    Histograma acumulado con etiquetas.
+
+    Cada observación cuesta una búsqueda binaria en los límites y tres sumas.
+
+    Parámetros:
+        - name (str): nombre de la métrica
+        - help (str): descripción
+        - labels (tuple): nombres de las etiquetas
+        - buckets (tuple): límites superiores de los intervalos, ordenados
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: tuple = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *values):
+        """
+        Registra una observación en la serie con los valores de etiquetas dados.
+        """
+        series = self._series.get(values)
+        if series is None:
+            # Contadores por intervalo (el último es +Inf), suma y número de observaciones
+            series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        """
+        Devuelve las líneas de la métrica en el formato de texto de Prometheus.
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {count}")
+        return lines
+
+
+# Métricas de la aplicación
+HTTP_REQUESTS = Counter(
+    "openmeteo_http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"))
+HTTP_SECONDS = Histogram(
+    "openmeteo_http_request_seconds", "Duración de las peticiones HTTP hasta la respuesta", ("method", "route"))
+SPAN_SECONDS = Histogram(
+    "openmeteo_span_seconds", "Duración de cada fase instrumentada", ("span",))
+SPAN_ROWS = Histogram(
+    "openmeteo_span_rows", "Filas leídas o escritas en cada fase instrumentada", ("span",), ROWS_BUCKETS)
+UPSTREAM_RESPONSES = Counter(
+    "openmeteo_upstream_responses_total", "Respuestas de las APIs de Open-Meteo por código (error = fallo de transporte)",
+    ("host", "status"))
+UPSTREAM_SECONDS = Histogram(
+    "openmeteo_upstream_request_seconds", "Duración de cada intento de petición a Open-Meteo", ("host",))
+
+REGISTRY = [HTTP_REQUESTS, HTTP_SECONDS, SPAN_SECONDS, SPAN_ROWS, UPSTREAM_RESPONSES, UPSTREAM_SECONDS]
+
+# Fases medidas en la petición en curso, solo con el perfilado activado
+_profile: ContextVar[Optional[list]] = ContextVar("openmeteo_profile", default=None)
+
+
+class Span:
+    """
+    Fase instrumentada: mide su duración con perf_counter y la registra al salir.
+
+    Se usa como context manager, también alrededor de un await. Si dentro
+    se asigna span.rows, el número de filas se registra en openmeteo_span_rows.
+
+    Parámetros:
+        - name (str): nombre de la fase, por ejemplo stats.rows
+    """
+
+    __slots__ = ("name", "rows", "_started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._started
+        SPAN_SECONDS.observe(seconds, self.name)
+        if self.rows is not None:
+            SPAN_ROWS.observe(self.rows, self.name)
+        profile = _profile.get()
+        if profile is not None:
+            profile.append((self.name, seconds, self.rows))
+        return False
+
+
+class _NullSpan:
+    """
+    Fase sin medir, cuando las métricas están desactivadas.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """
+    Crea una fase instrumentada, o una que no mide nada si OPENMETEO_METRICS_ENABLED=0.
+
+    Ejemplo:
+        with span("stats.rows") as s:
+            rows = await daily_rows(...)
+            s.rows = len(rows)
+    """
+    return Span(name) if METRICS_ENABLED else _NULL_SPAN
+
+
+def server_timing(profile: list, total: float) -> str:
+    """
+    Construye la cabecera Server-Timing con las fases de una petición.
+
+    Las fases con el mismo nombre se suman; las filas van en la descripción.
+
+    Parámetros:
+        - profile (list): fases registradas durante la petición
+        - total (float): duración total de la petición en segundos
+
+    Devuelve el valor de la cabecera.
+    """
+    phases = {}
+    for name, seconds, rows in profile:
+        total_seconds, total_rows = phases.get(name, (0.0, None))
+        if rows is not None:
+            total_rows = (total_rows or 0) + rows
+        phases[name] = (total_seconds + seconds, total_rows)
+    entries = []
+    for name, (seconds, rows) in phases.items():
+        desc = f';desc="rows={rows}"' if rows is not None else ""
+        entries.append(f"{name}{desc};dur={seconds * 1000:.3f}")
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP.
+
+    Registra la duración hasta el último byte de la respuesta y el código
+    de estado por método y ruta (la plantilla, por ejemplo /weather/{city},
+    para no crear una serie por ciudad). Con OPENMETEO_PROFILING=1, las
+    peticiones con la cabecera X-Profile: 1 reciben la cabecera
+    Server-Timing con las fases medidas hasta el inicio de la respuesta.
+
+    Parámetros:
+        - app: aplicación ASGI
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        profile = [] if PROFILING and (b"x-profile", b"1") in scope["headers"] else None
+        token = _profile.set(profile)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    header = server_timing(profile, time.perf_counter() - started)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _profile.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(scope["method"], path, str(status))
+            HTTP_SECONDS.observe(time.perf_counter() - started, scope["method"], path)
+
+
+def render_metrics() -> str:
+    """
+    Devuelve todas las métricas en el formato de texto de Prometheus (versión 0.0.4).
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
@@ -1,52 +1,235 @@
-import httpx
+import asyncio
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from options.settings import ARCHIVE_CHUNK_DAYS, ARCHIVE_BATCH_LOCATIONS
+from services.geocache import GeocodeCache
+from services.singleflight import SingleFlight
+from services.upstream import get_upstream_client
 
-async def fetch_weather_data(city: str, start_date: str, end_date: str):
-    """
-    Fetches datos meteorológicos de una ciudad y rango de fechas.
 
-    Primero, se busca la ciudad en la Geocoding API de Open-Meteo para
-    obtener su latitud y longitud. Luego, se obtienen los datos
-    horarios de temperatura y precipitación para la ciudad y rango de
-    fechas en la API de Archivo de Open-Meteo.
+async def geocode_city(city: str) -> Optional[dict]:
+    """
+    Busca una ciudad en la Geocoding API de Open-Meteo.
 
     Parámetros:
         - city (str): nombre de la ciudad
+
+    Devuelve un objeto dict con latitude y longitude, o None si no hay resultados.
+    """
+    # Consultar con el cliente compartido
+    geo_url = "https://geocoding-api.open-meteo.com/v1/search"
+    geo_data = await get_upstream_client().get_json(geo_url, params={"name": city, "count": 1, "language": "es"})
+
+    # si no hay resultados None
+    if not geo_data.get("results"):
+        return None
+
+    return {
+        "latitude": geo_data["results"][0]["latitude"],
+        "longitude": geo_data["results"][0]["longitude"],
+    }
+
+
+# Caché de geocodificación compartida por toda la aplicación
+_geocode_cache = GeocodeCache(resolver=geocode_city)
+
+
+def get_geocode_cache() -> GeocodeCache:
+    """
+    Devuelve la caché de geocodificación en uso.
+    """
+    return _geocode_cache
+
+
+def set_geocode_cache(cache: GeocodeCache):
+    """
+    Sustituye la caché de geocodificación, por ejemplo por una con un resolver local en pruebas.
+    """
+    global _geocode_cache
+    _geocode_cache = cache
+
+
+# Descargas de archivo en curso, compartidas por las peticiones idénticas simultáneas
+archive_flight = SingleFlight()
+
+
+async def fetch_archive(lat, lon, start_date: str, end_date: str):
+    """
+    Obtiene los datos horarios de la API de Archivo de Open-Meteo para unas coordenadas.
+
+    Las llamadas concurrentes con las mismas coordenadas y fechas comparten
+    una única petición.
+
+    Parámetros:
+        - lat (float | str): latitud, o varias separadas por comas
+        - lon (float | str): longitud, o varias separadas por comas
         - start_date (str): fecha de inicio en formato YYYY-MM-DD
         - end_date (str): fecha de fin en formato YYYY-MM-DD
 
-    Devuelve un objeto dict con los datos horarios.
+    Devuelve la respuesta de la API: un dict, o una lista de dicts si se
+    piden varias coordenadas.
     """
-    async with httpx.AsyncClient() as client:
-        # Buscar ciudad en Geocoding API
-        geo_url = "https://geocoding-api.open-meteo.com/v1/search"
-        geo_resp = await client.get(geo_url, params={"name": city, "count": 1, "language": "es"})
+    # Obtener datos horarios
+    meteo_url = "https://archive-api.open-meteo.com/v1/archive"
 
-        # formatear a json
-        geo_data = geo_resp.json()
+    # preparar parámetros de la consulta
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start_date,
+        "end_date": end_date,
+        "hourly": ["temperature_2m", "precipitation"],
+        "timezone": "auto"
+    }
 
-        # si no hay resultados None
-        if not geo_data.get("results"):
-            return None
+    # realizar la consulta con el cliente compartido
+    return await archive_flight.do(
+        (str(lat), str(lon), start_date, end_date),
+        lambda: get_upstream_client().get_json(meteo_url, params=params),
+    )
 
-        # Obtener latitud y longitud
-        lat = geo_data["results"][0]["latitude"]
-        lon = geo_data["results"][0]["longitude"]
 
-        # Obtener datos horarios
-        meteo_url = "https://archive-api.open-meteo.com/v1/archive"
+def split_range(start: date, end: date, max_days: int = ARCHIVE_CHUNK_DAYS) -> List[Tuple[date, date]]:
+    """
+    Divide un rango de días en tramos de como máximo max_days días.
 
-        # preparar parámetros de la consulta
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "start_date": start_date,
-            "end_date": end_date,
-            "hourly": ["temperature_2m", "precipitation"],
-            "timezone": "auto"
-        }
+    Parámetros:
+        - start (date): primer día
+        - end (date): último día (incluido)
+        - max_days (int): días máximos por tramo
+
+    Devuelve una lista ordenada de tuplas (inicio, fin).
+    """
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=max_days - 1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+async def fetch_weather_ranges(city: str, ranges: List[Tuple[date, date]]) -> Optional[dict]:
+    """
+    Obtiene los datos horarios de una ciudad para varios rangos de días.
+
+    La ciudad se geocodifica una sola vez. Los rangos largos se dividen en
+    tramos que se descargan de forma concurrente (limitados por el semáforo
+    del cliente compartido) y se unen en orden cronológico.
+
+    Parámetros:
+        - city (str): nombre de la ciudad
+        - ranges (list): lista ordenada de tuplas (inicio, fin) con los días a descargar
 
-        # realizar la consulta
-        meteo_resp = await client.get(meteo_url, params=params)
+    Devuelve un objeto dict con el mismo formato que la API de archivo, o None
+    si la ciudad no existe o algún tramo no devuelve datos horarios.
+    """
+    # Buscar ciudad en la caché de geocodificación
+    coords = await get_geocode_cache().lookup(city)
+
+    # si no hay resultados None
+    if coords is None:
+        return None
+
+    # Descargar todos los tramos a la vez
+    chunks = [chunk for start, end in ranges for chunk in split_range(start, end)]
+    responses = await asyncio.gather(*[
+        fetch_archive(coords["latitude"], coords["longitude"], str(start), str(end))
+        for start, end in chunks
+    ])
+    return merge_hourly(responses)
+
+
+async def fetch_weather_multi(coords: List[dict], ranges: List[Tuple[date, date]]) -> List[Optional[dict]]:
+    """
+    Obtiene los datos horarios de varias ubicaciones con consultas multi-ubicación.
+
+    La API de archivo acepta listas de latitudes y longitudes separadas por
+    comas y devuelve una respuesta por ubicación en el mismo orden. Las
+    ubicaciones se agrupan de ARCHIVE_BATCH_LOCATIONS en
+    ARCHIVE_BATCH_LOCATIONS y los rangos se trocean igual que en
+    fetch_weather_ranges. Todas las consultas se lanzan a la vez.
+
+    Parámetros:
+        - coords (list): lista de dicts con latitude y longitude
+        - ranges (list): lista ordenada de tuplas (inicio, fin) con los días a descargar
+
+    Devuelve una lista con un dict por ubicación en el mismo orden que coords,
+    o None en las ubicaciones cuya respuesta no contiene datos horarios.
+    """
+    groups = [coords[i:i + ARCHIVE_BATCH_LOCATIONS] for i in range(0, len(coords), ARCHIVE_BATCH_LOCATIONS)]
+    chunks = [chunk for start, end in ranges for chunk in split_range(start, end)]
+
+    # Una consulta por grupo de ubicaciones y tramo de fechas
+    requests = [(g, chunk) for g in range(len(groups)) for chunk in chunks]
+    responses = await asyncio.gather(*[
+        fetch_archive(
+            ",".join(str(c["latitude"]) for c in groups[g]),
+            ",".join(str(c["longitude"]) for c in groups[g]),
+            str(chunk_start), str(chunk_end),
+        )
+        for g, (chunk_start, chunk_end) in requests
+    ])
+
+    # Repartir las respuestas por ubicación, en orden de tramo
+    per_location = [[] for _ in coords]
+    for (g, _), resp in zip(requests, responses):
+        # Con una sola ubicación la API devuelve un objeto en lugar de una lista
+        items = resp if isinstance(resp, list) else [resp]
+        for j in range(len(groups[g])):
+            per_location[g * ARCHIVE_BATCH_LOCATIONS + j].append(items[j] if j < len(items) else {})
+
+    return [merge_hourly(parts) for parts in per_location]
+
+
+def merge_hourly(responses: List[dict]) -> Optional[dict]:
+    """
+    Une en una sola respuesta los tramos consecutivos descargados para una ubicación.
+
+    Parámetros:
+        - responses (list): respuestas de la API de archivo en orden cronológico
+
+    Devuelve un objeto dict con el formato de la API de archivo, o None si
+    algún tramo no contiene datos horarios.
+    """
+    if not responses or any("hourly" not in resp for resp in responses):
+        return None
+
+    # Unir los tramos en orden
+    hourly = {"time": [], "temperature_2m": [], "precipitation": []}
+    for resp in responses:
+        for key in hourly:
+            hourly[key].extend(resp["hourly"][key])
+
+    return {
+        "latitude": responses[0].get("latitude"),
+        "longitude": responses[0].get("longitude"),
+        "hourly": hourly,
+    }
+
+
+async def fetch_weather_data(city: str, start_date: str, end_date: str):
+    """
+    Fetches datos meteorológicos de una ciudad y rango de fechas.
+
+    Primero, se obtiene la latitud y longitud de la ciudad a través de la
+    caché de geocodificación, que solo consulta la Geocoding API de
+    Open-Meteo cuando la ciudad no está guardada. Luego, se obtienen los
+    datos horarios de temperatura y precipitación para la ciudad y rango de
+    fechas en la API de Archivo de Open-Meteo, usando el cliente HTTP
+    compartido de la aplicación.
+
+    Parámetros:
+        - city (str): nombre de la ciudad
+        - start_date (str): fecha de inicio en formato YYYY-MM-DD
+        - end_date (str): fecha de fin en formato YYYY-MM-DD
+
+    Devuelve un objeto dict con los datos horarios.
+    """
+    # Buscar ciudad en la caché de geocodificación
+    coords = await get_geocode_cache().lookup(city)
 
-        return meteo_resp.json()
+    # si no hay resultados None
+    if coords is None:
+        return None
 
+    return await fetch_archive(coords["latitude"], coords["longitude"], start_date, end_date)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request, Response
+from options.settings import RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_AGE
+from services.metrics import span
+
+
+def make_etag(key: tuple) -> str:
+    """
+    Calcula el ETag de una clave de caché.
+
+    La clave incluye la versión de los datos, así que el ETag cambia en
+    cuanto una carga escribe datos nuevos de la ciudad.
+    """
+    return '"' + hashlib.sha1(repr(key).encode()).hexdigest()[:24] + '"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Comprueba si la cabecera If-None-Match contiene el ETag (comparación débil).
+    """
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+class ResponseCache:
+    """
+    Caché LRU en memoria de las respuestas JSON de las estadísticas.
+
+    Las claves son tuplas (endpoint, parámetros normalizados, versión de los
+    datos). La versión de cada ciudad se incrementa cada vez que la carga
+    escribe datos suyos, por lo que nunca se sirve una respuesta obsoleta y
+    no hace falta invalidar: las entradas antiguas dejan de pedirse y se
+    expulsan por orden de uso al superar el presupuesto de memoria. Las
+    respuestas se guardan ya serializadas.
+
+    Parámetros:
+        - max_bytes (int): presupuesto de memoria en bytes
+        - max_age (int): segundos de max-age en Cache-Control, 0 para que el cliente revalide siempre
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, max_age: int = RESPONSE_CACHE_MAX_AGE):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def _headers(self, etag: str) -> dict:
+        """
+        Cabeceras de validación y caché de una respuesta.
+        """
+        cache_control = f"public, max-age={self.max_age}" if self.max_age > 0 else "no-cache"
+        return {"ETag": etag, "Cache-Control": cache_control}
+
+    def lookup(self, request: Request, key: tuple) -> Optional[Response]:
+        """
+        Busca la respuesta de una clave.
+
+        Si el cliente envía en If-None-Match el ETag vigente se responde 304
+        sin cuerpo, esté o no la respuesta en memoria.
+
+        Parámetros:
+            - request (Request): petición, para leer If-None-Match
+            - key (tuple): clave con endpoint, parámetros y versión de los datos
+
+        Devuelve un objeto Response (304 o 200) o None si hay que calcular la respuesta.
+        """
+        etag = make_etag(key)
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=self._headers(etag))
+
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return Response(body, media_type="application/json", headers=self._headers(etag))
+
+    def store(self, key: tuple, content: dict) -> Response:
+        """
+        Serializa y guarda una respuesta calculada.
+
+        Parámetros:
+            - key (tuple): clave con endpoint, parámetros y versión de los datos
+            - content (dict): respuesta del endpoint
+
+        Devuelve un objeto Response con el JSON y las cabeceras ETag y Cache-Control.
+        """
+        with span("response.serialize"):
+            body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        if len(body) <= self.max_bytes:
+            if key in self._entries:
+                self.resident_bytes -= len(self._entries.pop(key))
+            self._entries[key] = body
+            self.resident_bytes += len(body)
+            while self.resident_bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.resident_bytes -= len(old)
+                self.evictions += 1
+        return Response(body, media_type="application/json", headers=self._headers(make_etag(key)))
+
+    def clear(self):
+        """
+        Vacía la caché y reinicia los contadores.
+        """
+        self._entries.clear()
+        self.resident_bytes = self.hits = self.misses = self.not_modified = self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de aciertos, fallos y respuestas 304 y la memoria ocupada.
+        """
+        lookups = self.hits + self.misses + self.not_modified
+        return {
+            "entries": len(self._entries),
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.not_modified) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Caché compartida por toda la aplicación
+_response_cache = ResponseCache()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Devuelve la caché de respuestas en uso.
+    """
+    return _response_cache
+
+
+def set_response_cache(cache: ResponseCache):
+    """
+    Sustituye la caché de respuestas, por ejemplo por una con otro presupuesto de memoria.
+    """
+    global _response_cache
+    _response_cache = cache
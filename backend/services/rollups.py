@@ -0,0 +1,266 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Union
+from sqlalchemy import select, func, case, delete, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.database import upsert
+from db.types import ceil_hour, day_of
+from models.location import LocationDB
+from models.weatherData import WeatherDataDB
+from models.weatherDaily import WeatherDailyDB
+from models.citySummary import CitySummaryDB
+from options.settings import STATS_THRESHOLD_HIGH, STATS_THRESHOLD_LOW
+from services.buckets import refresh_buckets, rebuild_buckets
+
+# Columnas del resumen diario en el orden de daily_aggregate_select
+DAILY_COLUMNS = [
+    "location_id", "day", "hours", "temp_count", "temp_sum", "temp_min", "temp_min_at",
+    "temp_max", "temp_max_at", "hours_above", "hours_below", "precip_count", "precip_sum", "precip_hours",
+    "precip_max",
+]
+
+
+def daily_aggregate_select(
+    location_id: Union[int, List[int], None] = None,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None,
+    threshold_high: float = STATS_THRESHOLD_HIGH,
+    threshold_low: float = STATS_THRESHOLD_LOW,
+):
+    """
+    Construye la consulta que agrega los datos horarios por localización y día.
+
+    Devuelve una fila por (location_id, día) con las columnas de
+    WeatherDailyDB. El día se calcula con aritmética entera sobre la hora
+    guardada. La hora del máximo y del mínimo se obtiene con ROW_NUMBER()
+    por día, quedándose con la primera hora en caso de empate.
+
+    Parámetros:
+        - location_id (int | list): id de la localización o lista de ids, None para todas
+        - start_dt (datetime): inicio del rango, None sin límite
+        - end_dt (datetime): fin del rango (incluido), None sin límite
+        - threshold_high (float): umbral superior para hours_above
+        - threshold_low (float): umbral inferior para hours_below
+
+    Devuelve un objeto Select.
+    """
+    temp = WeatherDataDB.temperature_2m
+    precip = WeatherDataDB.precipitation
+    day = day_of(WeatherDataDB.ts)
+    partition = (WeatherDataDB.location_id, day)
+    no_temp = case((temp.is_(None), 1), else_=0)
+
+    # Filas horarias numeradas por temperatura dentro de cada día
+    hourly = select(
+        WeatherDataDB.location_id,
+        day.label("day"),
+        WeatherDataDB.ts,
+        temp.label("temp"),
+        precip.label("precip"),
+        func.row_number().over(partition_by=partition, order_by=(no_temp, temp.desc(), WeatherDataDB.ts)).label("rank_max"),
+        func.row_number().over(partition_by=partition, order_by=(no_temp, temp.asc(), WeatherDataDB.ts)).label("rank_min"),
+    )
+    if isinstance(location_id, list):
+        hourly = hourly.where(WeatherDataDB.location_id.in_(location_id))
+    elif location_id is not None:
+        hourly = hourly.where(WeatherDataDB.location_id == location_id)
+    if start_dt is not None:
+        hourly = hourly.where(WeatherDataDB.ts >= ceil_hour(start_dt))
+    if end_dt is not None:
+        hourly = hourly.where(WeatherDataDB.ts <= end_dt)
+    h = hourly.subquery()
+
+    # Agregados por día
+    return select(
+        h.c.location_id,
+        h.c.day,
+        func.count().label("hours"),
+        func.count(h.c.temp).label("temp_count"),
+        func.sum(h.c.temp).label("temp_sum"),
+        func.min(h.c.temp).label("temp_min"),
+        func.max(case((h.c.rank_min == 1, h.c.ts))).label("temp_min_at"),
+        func.max(h.c.temp).label("temp_max"),
+        func.max(case((h.c.rank_max == 1, h.c.ts))).label("temp_max_at"),
+        func.sum(case((h.c.temp > threshold_high, 1), else_=0)).label("hours_above"),
+        func.sum(case((h.c.temp < threshold_low, 1), else_=0)).label("hours_below"),
+        func.count(h.c.precip).label("precip_count"),
+        func.coalesce(func.sum(h.c.precip), 0.0).label("precip_sum"),
+        func.sum(case((h.c.precip > 0, 1), else_=0)).label("precip_hours"),
+        func.max(h.c.precip).label("precip_max"),
+    ).group_by(h.c.location_id, h.c.day).order_by(h.c.location_id, h.c.day)
+
+
+def daily_rollup_upsert(location_id: Optional[int] = None, start: Optional[date] = None, end: Optional[date] = None):
+    """
+    Construye el INSERT ... ON CONFLICT que recalcula el resumen diario.
+
+    Se usa tanto desde la carga (sesión asíncrona) como desde las
+    migraciones (conexión síncrona).
+
+    Parámetros:
+        - location_id (int): id de la localización, None para todas
+        - start (date): primer día a recalcular, None sin límite
+        - end (date): último día a recalcular (incluido), None sin límite
+
+    Devuelve un objeto Insert.
+    """
+    start_dt = datetime.combine(start, datetime.min.time()) if start else None
+    end_dt = datetime.combine(end, datetime.max.time()) if end else None
+
+    stmt = upsert(WeatherDailyDB.__table__).from_select(
+        DAILY_COLUMNS, daily_aggregate_select(location_id, start_dt, end_dt)
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["location_id", "day"],
+        set_={col: stmt.excluded[col] for col in DAILY_COLUMNS[2:]},
+    )
+
+
+async def refresh_daily_rollup(session: AsyncSession, location_id: int, start: date, end: date):
+    """
+    Recalcula el resumen diario de una localización para los días cargados.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos, el commit queda a cargo del llamador
+        - location_id (int): id de la localización
+        - start (date): primer día cargado
+        - end (date): último día cargado (incluido)
+
+    No devuelve nada.
+    """
+    await session.execute(daily_rollup_upsert(location_id, start, end))
+
+
+# Columnas del resumen por ciudad en el orden de city_summary_select
+SUMMARY_COLUMNS = [
+    "location_id", "start_date", "end_date", "hours", "temp_count", "temp_sum", "precip_total",
+    "days_with_precip", "precip_max_date", "precip_max_value", "temp_max_at", "temp_max_value",
+    "temp_min_at", "temp_min_value",
+]
+
+
+def city_summary_select(location_id: Optional[int] = None):
+    """
+    Construye la consulta que resume por localización el resumen diario completo.
+
+    Los totales se suman sobre weather_daily y los extremos (día de máxima
+    precipitación, horas de máxima y mínima temperatura) se obtienen con
+    subconsultas correlacionadas, quedándose con el primero en caso de empate.
+
+    Parámetros:
+        - location_id (int): id de la localización, None para todas
+
+    Devuelve un objeto Select con una fila por localización.
+    """
+    d = WeatherDailyDB
+
+    def first(column, *order):
+        other = aliased(WeatherDailyDB)
+        return (
+            select(getattr(other, column))
+            .where(other.location_id == d.location_id)
+            .where(getattr(other, column).is_not(None))
+            .order_by(*[o(other) for o in order])
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    stmt = select(
+        d.location_id,
+        func.min(d.day),
+        func.max(d.day),
+        func.sum(d.hours),
+        func.sum(d.temp_count),
+        func.sum(d.temp_sum),
+        func.coalesce(func.sum(d.precip_sum), 0.0),
+        func.sum(case((d.precip_sum > 0, 1), else_=0)),
+        first("day", lambda o: o.precip_sum.desc(), lambda o: o.day),
+        func.max(d.precip_sum),
+        first("temp_max_at", lambda o: o.temp_max.desc(), lambda o: o.temp_max_at),
+        func.max(d.temp_max),
+        first("temp_min_at", lambda o: o.temp_min.asc(), lambda o: o.temp_min_at),
+        func.min(d.temp_min),
+    ).group_by(d.location_id)
+    if location_id is not None:
+        stmt = stmt.where(d.location_id == location_id)
+    return stmt
+
+
+def city_summary_upsert(location_id: Optional[int] = None):
+    """
+    Construye el INSERT ... ON CONFLICT que recalcula el resumen por ciudad.
+
+    Parámetros:
+        - location_id (int): id de la localización, None para todas
+
+    Devuelve un objeto Insert.
+    """
+    stmt = upsert(CitySummaryDB.__table__).from_select(SUMMARY_COLUMNS, city_summary_select(location_id))
+    return stmt.on_conflict_do_update(
+        index_elements=["location_id"],
+        set_={col: stmt.excluded[col] for col in SUMMARY_COLUMNS[1:]},
+    )
+
+
+async def refresh_aggregates(session: AsyncSession, location_id: int, start: date, end: date):
+    """
+    Actualiza los agregados de una localización después de una carga.
+
+    Recalcula el resumen diario de los días cargados y, a partir de él, las
+    semanas, meses y años que los contienen y el resumen de la ciudad, que
+    leen una fila por día y no los datos horarios.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos, el commit queda a cargo del llamador
+        - location_id (int): id de la localización
+        - start (date): primer día cargado
+        - end (date): último día cargado (incluido)
+
+    No devuelve nada.
+    """
+    await refresh_daily_rollup(session, location_id, start, end)
+    await refresh_buckets(session, location_id, start, end)
+    await session.execute(city_summary_upsert(location_id))
+
+
+async def rebuild_aggregates(session: AsyncSession) -> dict:
+    """
+    Reconstruye desde cero el resumen diario, los periodos y el resumen por ciudad.
+
+    Sirve para comprobar la consistencia de los agregados con los datos
+    horarios. Borra los resúmenes y los vuelve a calcular para todas las
+    localizaciones, e incrementa sus versiones de datos para que no se
+    sirvan respuestas guardadas con los resúmenes anteriores.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos, el commit queda a cargo del llamador
+
+    Devuelve un objeto dict con el número de días y ciudades resumidos.
+    """
+    await session.execute(delete(CitySummaryDB))
+    await session.execute(delete(WeatherDailyDB))
+    await session.execute(daily_rollup_upsert())
+    await session.execute(city_summary_upsert())
+    await rebuild_buckets(session)
+    await session.execute(update(LocationDB).values(data_version=LocationDB.data_version + 1))
+
+    days = (await session.execute(select(func.count()).select_from(WeatherDailyDB))).scalar()
+    cities = (await session.execute(select(func.count()).select_from(CitySummaryDB))).scalar()
+    return {"days": days, "cities": cities}
+
+
+def full_days(start_dt: datetime, end_dt: datetime):
+    """
+    Calcula los días completos contenidos en un rango de fechas.
+
+    Parámetros:
+        - start_dt (datetime): inicio del rango
+        - end_dt (datetime): fin del rango (incluido)
+
+    Devuelve una tupla (primer día, último día) o None si el rango no contiene ningún día completo.
+    """
+    first = start_dt.date() if start_dt.time() == datetime.min.time() else start_dt.date() + timedelta(days=1)
+    last = end_dt.date() if end_dt.time() == datetime.max.time() else end_dt.date() - timedelta(days=1)
+    if first > last:
+        return None
+    return first, last
@@ -0,0 +1,341 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+from sqlalchemy import Integer, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.weatherData import WeatherDataDB
+from options.settings import SERIES_CACHE_MAX_BYTES, SERIES_CACHE_ADMIT_AFTER
+from services.executor import run_kernel
+from services.metrics import span
+
+# Segundos por día, para agrupar los timestamps por fecha
+SECONDS_PER_DAY = 86400
+
+# Decimales con los que se recuperan los valores guardados en float32 (Open-Meteo usa uno o dos)
+VALUE_DECIMALS = 3
+
+EPOCH = datetime(1970, 1, 1)
+
+# Ciudades todavía no admitidas de las que se recuerdan las peticiones, las menos recientes se olvidan
+REQUEST_HISTORY = 10000
+
+
+def _to_epoch(dt: datetime) -> int:
+    """
+    Convierte una fecha sin zona horaria en segundos desde 1970-01-01.
+    """
+    return int((dt - EPOCH).total_seconds())
+
+
+def _from_epoch(seconds) -> datetime:
+    """
+    Convierte segundos desde 1970-01-01 en una fecha sin zona horaria.
+    """
+    return EPOCH + timedelta(seconds=int(seconds))
+
+
+def _day_str(day) -> str:
+    """
+    Convierte un número de día desde 1970-01-01 en una fecha YYYY-MM-DD.
+    """
+    return str(np.datetime64(int(day), "D"))
+
+
+class CitySeries:
+    """
+    Serie horaria de una ciudad en arrays contiguos de NumPy.
+
+    Parámetros:
+        - ts (np.ndarray): timestamps en segundos desde 1970-01-01 (int64), ordenados
+        - temperature (np.ndarray): temperatura por hora (float32, NaN si falta)
+        - precipitation (np.ndarray): precipitación por hora (float32, NaN si falta)
+    """
+
+    __slots__ = ("ts", "temperature", "precipitation")
+
+    def __init__(self, ts: np.ndarray, temperature: np.ndarray, precipitation: np.ndarray):
+        self.ts = ts
+        self.temperature = temperature
+        self.precipitation = precipitation
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes ocupados por los arrays.
+        """
+        return self.ts.nbytes + self.temperature.nbytes + self.precipitation.nbytes
+
+    def slice(self, start_dt: datetime, end_dt: datetime):
+        """
+        Localiza con búsqueda binaria las horas de un rango.
+
+        Parámetros:
+            - start_dt (datetime): inicio del rango
+            - end_dt (datetime): fin del rango (incluido)
+
+        Devuelve una tupla (ts, temperatura, precipitación): ts es una vista del
+        array y la temperatura y la precipitación se copian en float64.
+        """
+        i0 = np.searchsorted(self.ts, _to_epoch(start_dt), side="left")
+        i1 = np.searchsorted(self.ts, _to_epoch(end_dt), side="right")
+        return (
+            self.ts[i0:i1],
+            self.temperature[i0:i1].astype(np.float64).round(VALUE_DECIMALS),
+            self.precipitation[i0:i1].astype(np.float64).round(VALUE_DECIMALS),
+        )
+
+
+def build_series(hours, temps, precs) -> CitySeries:
+    """
+    Construye una serie a partir de las columnas leídas de la BD.
+
+    Parámetros:
+        - hours (tuple): horas desde 1970-01-01 ordenadas
+        - temps (tuple): temperaturas, None si faltan
+        - precs (tuple): precipitaciones, None si faltan
+
+    Devuelve un objeto CitySeries.
+    """
+    return CitySeries(
+        np.array(hours, dtype=np.int64) * 3600,
+        np.array(temps, dtype=np.float64).astype(np.float32),
+        np.array(precs, dtype=np.float64).astype(np.float32),
+    )
+
+
+def _by_day(ts: np.ndarray, values: np.ndarray):
+    """
+    Agrupa por día una serie ordenada.
+
+    Devuelve una tupla (días, índice de inicio de cada día, suma por día, horas con valor por día).
+    """
+    days = ts // SECONDS_PER_DAY
+    unique_days, starts = np.unique(days, return_index=True)
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+    return unique_days, starts, sums, counts
+
+
+def series_temperature_stats(series: CitySeries, start_dt: datetime, end_dt: datetime,
+                             threshold_high: float, threshold_low: float) -> Optional[dict]:
+    """
+    Calcula las estadísticas de temperatura sobre la serie en memoria.
+
+    Mismo resultado que services.stats.query_temperature_stats, con
+    operaciones vectorizadas sobre el tramo del rango.
+
+    Devuelve un objeto dict con el formato de /stats/temperature o None si no hay datos en el rango.
+    """
+    ts, temp, _ = series.slice(start_dt, end_dt)
+    if not len(ts) or np.isnan(temp).all():
+        return None
+
+    # Promedio general y por día
+    days, _, sums, counts = _by_day(ts, temp)
+    has_data = counts > 0
+    average_by_day = {
+        _day_str(day): round(float(total / count), 2)
+        for day, total, count in zip(days[has_data], sums[has_data], counts[has_data])
+    }
+
+    # Máximo y mínimo, la primera hora en caso de empate
+    i_max = int(np.nanargmax(temp))
+    i_min = int(np.nanargmin(temp))
+
+    return {
+        "temperature": {
+            "average": round(float(np.nanmean(temp)), 2),
+            "average_by_day": average_by_day,
+            "max": {
+                "value": float(temp[i_max]),
+                "date_time": _from_epoch(ts[i_max]).isoformat()
+            },
+            "min": {
+                "value": float(temp[i_min]),
+                "date_time": _from_epoch(ts[i_min]).isoformat()
+            },
+            "hours_above_threshold": int((temp > threshold_high).sum()),
+            "hours_below_threshold": int((temp < threshold_low).sum())
+        }
+    }
+
+
+def series_precipitation_stats(series: CitySeries, start_dt: datetime, end_dt: datetime) -> Optional[dict]:
+    """
+    Calcula las estadísticas de precipitación sobre la serie en memoria.
+
+    Mismo resultado que services.stats.query_precipitation_stats.
+
+    Devuelve un objeto dict con el formato de /stats/precipitation o None si no hay datos en el rango.
+    """
+    ts, _, precip = series.slice(start_dt, end_dt)
+    if not len(ts) or np.isnan(precip).all():
+        return None
+
+    # Total por día y día de máxima precipitación (el primero en caso de empate)
+    days, _, sums, _ = _by_day(ts, precip)
+    i_max = int(np.argmax(sums))
+
+    return {
+        "precipitation": {
+            "total": round(float(np.nansum(precip)), 2),
+            "total_by_day": {_day_str(day): round(float(total), 2) for day, total in zip(days, sums)},
+            "days_with_precipitation": int((sums > 0).sum()),
+            "max": {
+                "value": round(float(sums[i_max]), 2),
+                "date": _day_str(days[i_max])
+            },
+            "average": round(float(np.nanmean(precip)), 2)
+        }
+    }
+
+
+class SeriesCache:
+    """
+    Caché LRU en memoria de las series horarias de las ciudades más consultadas.
+
+    Una ciudad solo se carga en memoria cuando se ha pedido admit_after
+    veces; hasta entonces las estadísticas se calculan en SQL. Las series
+    se expulsan por orden de uso cuando se supera el presupuesto de memoria
+    y se invalidan cuando la carga escribe datos de la ciudad. Las peticiones
+    se cuentan solo para las REQUEST_HISTORY ciudades pendientes más
+    recientes y la cuenta se descarta al admitir la ciudad. Cada serie
+    guarda la versión de datos de la ciudad con la que se cargó, de modo que
+    las escrituras de otro proceso también la invalidan.
+
+    Parámetros:
+        - max_bytes (int): presupuesto de memoria en bytes
+        - admit_after (int): peticiones necesarias para cargar una ciudad en memoria
+    """
+
+    def __init__(self, max_bytes: int = SERIES_CACHE_MAX_BYTES, admit_after: int = SERIES_CACHE_ADMIT_AFTER):
+        self.max_bytes = max_bytes
+        self.admit_after = admit_after
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._requests = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def _load(self, session: AsyncSession, location_id: int) -> CitySeries:
+        """
+        Lee de la BD la serie completa de una localización ordenada por hora.
+
+        La conversión a arrays se hace en el ejecutor de cálculos.
+        """
+        with span("series.load") as s:
+            result = await session.execute(
+                select(type_coerce(WeatherDataDB.ts, Integer), WeatherDataDB.temperature_2m, WeatherDataDB.precipitation)
+                .where(WeatherDataDB.location_id == location_id)
+                .order_by(WeatherDataDB.ts)
+            )
+            rows = result.all()
+            s.rows = len(rows)
+        hours, temps, precs = zip(*rows) if rows else ((), (), ())
+        return await run_kernel(build_series, hours, temps, precs)
+
+    def _evict(self):
+        """
+        Expulsa las series menos usadas hasta respetar el presupuesto de memoria.
+        """
+        while self.resident_bytes > self.max_bytes and self._entries:
+            location_id, series = self._entries.popitem(last=False)
+            self._versions.pop(location_id, None)
+            self.resident_bytes -= series.nbytes
+            self.evictions += 1
+
+    async def get(self, session: AsyncSession, location_id: int, version: Optional[int] = None) -> Optional[CitySeries]:
+        """
+        Devuelve la serie de una localización si está en memoria o si ya es una ciudad frecuente.
+
+        Parámetros:
+            - session (AsyncSession): sesión de base de datos para cargar la serie
+            - location_id (int): id de la localización
+            - version (int): versión de datos vigente de la localización; una serie de otra versión se vuelve a cargar
+
+        Devuelve un objeto CitySeries o None si la ciudad todavía no se mantiene en memoria.
+        """
+        series = self._entries.get(location_id)
+        if series is not None and version is not None and self._versions.get(location_id) != version:
+            self.invalidate(location_id)
+            series = None
+        if series is not None:
+            self._entries.move_to_end(location_id)
+            self.hits += 1
+            return series
+
+        self.misses += 1
+        requests = self._requests.pop(location_id, 0) + 1
+        if requests < self.admit_after:
+            self._requests[location_id] = requests
+            if len(self._requests) > REQUEST_HISTORY:
+                self._requests.popitem(last=False)
+            return None
+
+        # Ciudad frecuente: cargar la serie si cabe en el presupuesto
+        series = await self._load(session, location_id)
+        if series.nbytes > self.max_bytes or not len(series.ts):
+            return None
+        if location_id in self._entries:
+            self.resident_bytes -= self._entries.pop(location_id).nbytes
+        self._entries[location_id] = series
+        self._versions[location_id] = version
+        self.resident_bytes += series.nbytes
+        self._evict()
+        return series
+
+    def invalidate(self, location_id: int):
+        """
+        Descarta la serie de una localización después de escribir datos nuevos.
+        """
+        series = self._entries.pop(location_id, None)
+        self._versions.pop(location_id, None)
+        if series is not None:
+            self.resident_bytes -= series.nbytes
+
+    def clear(self):
+        """
+        Vacía la caché y reinicia los contadores.
+        """
+        self._entries.clear()
+        self._versions.clear()
+        self._requests.clear()
+        self.resident_bytes = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de aciertos y fallos y la memoria ocupada.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "cities": len(self._entries),
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Caché compartida por toda la aplicación
+_series_cache = SeriesCache()
+
+
+def get_series_cache() -> SeriesCache:
+    """
+    Devuelve la caché de series en uso.
+    """
+    return _series_cache
+
+
+def set_series_cache(cache: SeriesCache):
+    """
+    Sustituye la caché de series, por ejemplo por una con otro presupuesto de memoria.
+    """
+    global _series_cache
+    _series_cache = cache
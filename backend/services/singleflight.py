@@ -0,0 +1,96 @@
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Agrupa las llamadas concurrentes idénticas en una sola ejecución.
+
+    La primera llamada con una clave lanza el trabajo en una tarea propia y
+    las que llegan mientras sigue en curso esperan esa misma tarea en lugar
+    de repetirlo. Todas reciben el mismo resultado o la misma excepción. La
+    tarea está protegida con shield, así que si un llamador se cancela el
+    trabajo continúa para los demás.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        """
+        Retira la tarea terminada y marca su excepción como recuperada.
+        """
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Ejecuta fn una sola vez para todas las llamadas concurrentes con la misma clave.
+
+        Parámetros:
+            - key (Hashable): clave que identifica el trabajo
+            - fn (Callable): función asíncrona sin argumentos que hace el trabajo
+
+        Devuelve el resultado de fn.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """
+        Devuelve los trabajos ejecutados, las llamadas agrupadas y los trabajos en curso.
+        """
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class KeyedLock:
+    """
+    Cerrojos asíncronos por clave, creados al usarse y descartados al quedar libres.
+
+    Sirve para serializar trabajos que se solapan sin ser idénticos, como
+    dos cargas de la misma ciudad con rangos distintos.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._users = Counter()
+        self.acquisitions = 0
+        self.waits = 0
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable):
+        """
+        Mantiene el cerrojo de una clave durante el bloque with.
+        """
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] += 1
+        self.acquisitions += 1
+        if lock.locked():
+            self.waits += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+    def stats(self) -> dict:
+        """
+        Devuelve las adquisiciones, las que tuvieron que esperar y las claves en uso.
+        """
+        return {"acquisitions": self.acquisitions, "waits": self.waits, "held": len(self._locks)}
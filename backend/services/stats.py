@@ -0,0 +1,231 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.types import ceil_hour
+from models.weatherData import WeatherDataDB
+from models.weatherDaily import WeatherDailyDB
+from options.settings import STATS_THRESHOLD_HIGH, STATS_THRESHOLD_LOW
+from services.rollups import daily_aggregate_select, full_days
+from services.series_cache import get_series_cache, series_temperature_stats, series_precipitation_stats
+from services.singleflight import SingleFlight
+from services.executor import run_kernel
+from services.metrics import span
+
+# Cálculos en curso, compartidos por las peticiones idénticas simultáneas (misma clave que la caché de respuestas)
+stats_flight = SingleFlight()
+
+
+def _in_range(stmt, location_id: int, start_dt: datetime, end_dt: datetime):
+    """
+    Filtra una consulta por localización y rango de fechas sobre la clave primaria (location_id, ts).
+    """
+    return (
+        stmt.where(WeatherDataDB.location_id == location_id)
+        .where(WeatherDataDB.ts >= ceil_hour(start_dt))
+        .where(WeatherDataDB.ts <= end_dt)
+    )
+
+
+async def daily_rows(
+    session: AsyncSession,
+    location_id: int,
+    start_dt: datetime,
+    end_dt: datetime,
+    threshold_high: float = STATS_THRESHOLD_HIGH,
+    threshold_low: float = STATS_THRESHOLD_LOW,
+) -> List[dict]:
+    """
+    Obtiene los agregados por día de una localización en un rango de fechas.
+
+    Los días completos se leen del resumen diario weather_daily. Los días
+    parciales de los extremos del rango se agregan al vuelo desde los datos
+    horarios con la misma consulta que mantiene el resumen.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - location_id (int): id de la localización
+        - start_dt (datetime): inicio del rango
+        - end_dt (datetime): fin del rango (incluido)
+        - threshold_high (float): umbral superior para los días parciales
+        - threshold_low (float): umbral inferior para los días parciales
+
+    Devuelve una lista de dicts con las columnas de WeatherDailyDB ordenada por día.
+    """
+    async def aggregate(start, end):
+        result = await session.execute(daily_aggregate_select(location_id, start, end, threshold_high, threshold_low))
+        return [dict(row) for row in result.mappings()]
+
+    days = full_days(start_dt, end_dt)
+    if days is None:
+        return await aggregate(start_dt, end_dt)
+
+    first_dt = datetime.combine(days[0], datetime.min.time())
+    after_last_dt = datetime.combine(days[1] + timedelta(days=1), datetime.min.time())
+    rows = []
+
+    # Día parcial al principio del rango
+    if start_dt < first_dt:
+        rows += await aggregate(start_dt, first_dt - timedelta(microseconds=1))
+
+    # Días completos desde el resumen diario
+    result = await session.execute(
+        select(WeatherDailyDB)
+        .where(WeatherDailyDB.location_id == location_id)
+        .where(WeatherDailyDB.day >= days[0])
+        .where(WeatherDailyDB.day <= days[1])
+        .order_by(WeatherDailyDB.day)
+    )
+    rows += [
+        {col.name: getattr(row, col.name) for col in WeatherDailyDB.__table__.columns}
+        for row in result.scalars()
+    ]
+
+    # Día parcial al final del rango
+    if end_dt >= after_last_dt:
+        rows += await aggregate(after_last_dt, end_dt)
+
+    return rows
+
+
+async def query_temperature_stats(
+    session: AsyncSession,
+    location_id: int,
+    start_dt: datetime,
+    end_dt: datetime,
+    threshold_high: float,
+    threshold_low: float,
+    version: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Calcula las estadísticas de temperatura de una localización.
+
+    Si la ciudad está en la caché de series se calcula sobre los arrays en
+    el ejecutor de cálculos, fuera del bucle de eventos. Si no, se combinan
+    las filas diarias de daily_rows, de forma que solo vuelve a Python una
+    fila por día del rango. Con umbrales distintos de los
+    precalculados, las horas por encima / debajo se cuentan en SQL sobre los
+    datos horarios.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - location_id (int): id de la localización
+        - start_dt (datetime): inicio del rango
+        - end_dt (datetime): fin del rango (incluido)
+        - threshold_high (float): umbral superior de temperatura
+        - threshold_low (float): umbral inferior de temperatura
+        - version (int): versión de datos de la localización, para la caché de series
+
+    Devuelve un objeto dict con el formato de /stats/temperature o None si no hay datos en el rango.
+    """
+    # Ciudad frecuente: calcular sobre la serie en memoria
+    series = await get_series_cache().get(session, location_id, version)
+    if series is not None:
+        return await run_kernel(series_temperature_stats, series, start_dt, end_dt, threshold_high, threshold_low)
+
+    with span("stats.rows") as s:
+        rows = await daily_rows(session, location_id, start_dt, end_dt, threshold_high, threshold_low)
+        s.rows = len(rows)
+    if not sum(row["hours"] for row in rows):
+        return None
+
+    # Horas por encima / debajo del umbral: del resumen con los umbrales por defecto, de los datos horarios si no
+    if (threshold_high, threshold_low) == (STATS_THRESHOLD_HIGH, STATS_THRESHOLD_LOW):
+        hours_above = sum(row["hours_above"] for row in rows)
+        hours_below = sum(row["hours_below"] for row in rows)
+    else:
+        temp = WeatherDataDB.temperature_2m
+        with span("stats.thresholds"):
+            hours_above, hours_below = (await session.execute(_in_range(
+                select(
+                    func.sum(case((temp > threshold_high, 1), else_=0)),
+                    func.sum(case((temp < threshold_low, 1), else_=0)),
+                ),
+                location_id, start_dt, end_dt,
+            ))).one()
+
+    # Promedio general y por día
+    rows = [row for row in rows if row["temp_count"]]
+    if not rows:
+        return None
+    average_temp = sum(row["temp_sum"] for row in rows) / sum(row["temp_count"] for row in rows)
+    average_by_day = {str(row["day"]): round(row["temp_sum"] / row["temp_count"], 2) for row in rows}
+
+    # Máximo y mínimo, la primera hora en caso de empate
+    max_row = min(rows, key=lambda row: (-row["temp_max"], row["temp_max_at"]))
+    min_row = min(rows, key=lambda row: (row["temp_min"], row["temp_min_at"]))
+
+    # Devolver estadísticas con el formato requerido
+    return {
+        "temperature": {
+            "average": round(average_temp, 2),
+            "average_by_day": average_by_day,
+            "max": {
+                "value": max_row["temp_max"],
+                "date_time": max_row["temp_max_at"].isoformat()
+            },
+            "min": {
+                "value": min_row["temp_min"],
+                "date_time": min_row["temp_min_at"].isoformat()
+            },
+            "hours_above_threshold": int(hours_above),
+            "hours_below_threshold": int(hours_below)
+        }
+    }
+
+
+async def query_precipitation_stats(
+    session: AsyncSession,
+    location_id: int,
+    start_dt: datetime,
+    end_dt: datetime,
+    version: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Calcula las estadísticas de precipitación de una localización.
+
+    Si la ciudad está en la caché de series se calcula sobre los arrays en
+    el ejecutor de cálculos. Si no, todas las estadísticas se derivan de las filas diarias de daily_rows.
+
+    Parámetros:
+        - session (AsyncSession): sesión de base de datos
+        - location_id (int): id de la localización
+        - start_dt (datetime): inicio del rango
+        - end_dt (datetime): fin del rango (incluido)
+        - version (int): versión de datos de la localización, para la caché de series
+
+    Devuelve un objeto dict con el formato de /stats/precipitation o None si no hay datos en el rango.
+    """
+    # Ciudad frecuente: calcular sobre la serie en memoria
+    series = await get_series_cache().get(session, location_id, version)
+    if series is not None:
+        return await run_kernel(series_precipitation_stats, series, start_dt, end_dt)
+
+    with span("stats.rows") as s:
+        rows = await daily_rows(session, location_id, start_dt, end_dt)
+        s.rows = len(rows)
+    if not sum(row["hours"] for row in rows):
+        return None
+
+    # Total y promedio; sin ninguna hora con precipitación guardada no hay estadísticas
+    precip_count = sum(row["precip_count"] for row in rows)
+    if not precip_count:
+        return None
+    total_precip = sum(row["precip_sum"] for row in rows)
+    average_precip = total_precip / precip_count
+
+    # Día de máxima precipitación, el primero en caso de empate
+    max_row = max(rows, key=lambda row: row["precip_sum"])
+
+    return {
+        "precipitation": {
+            "total": round(total_precip, 2),
+            "total_by_day": {str(row["day"]): round(row["precip_sum"], 2) for row in rows},
+            "days_with_precipitation": sum(1 for row in rows if row["precip_sum"] > 0),
+            "max": {
+                "value": round(max_row["precip_sum"], 2),
+                "date": str(max_row["day"])
+            },
+            "average": round(average_precip, 2)
+        }
+    }
@@ -0,0 +1,121 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable
+from db.database import AsyncReadSessionLocal
+from options.settings import STREAM_BATCH_SIZE
+
+# Columnas de salida, las mismas que MeteoDataOut
+FIELDS = ["city", "datetime", "temperature_2m", "precipitation", "latitude", "longitude"]
+
+# Tipo de contenido de cada formato
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def encode_cursor(dt: datetime) -> str:
+    """
+    Codifica la hora de la última fila devuelta en un cursor opaco.
+
+    La hora identifica la fila dentro de la ciudad, es la clave primaria (location_id, ts).
+    """
+    return base64.urlsafe_b64encode(dt.isoformat().encode()).decode()
+
+
+def decode_cursor(cursor: str) -> datetime:
+    """
+    Decodifica un cursor de paginación.
+
+    Devuelve la hora de la última fila. Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def _as_dict(row) -> dict:
+    """
+    Convierte una fila en un dict serializable con las columnas de salida.
+    """
+    out = {field: getattr(row, field) for field in FIELDS}
+    out["datetime"] = out["datetime"].isoformat()
+    return out
+
+
+def _dumps(row) -> str:
+    """
+    Serializa una fila en JSON compacto y en UTF-8, como la caché de respuestas.
+    """
+    return json.dumps(_as_dict(row), ensure_ascii=False, separators=(",", ":"))
+
+
+def format_batch(rows: Iterable, fmt: str, first: bool) -> str:
+    """
+    Serializa un lote de filas en el formato pedido.
+
+    Parámetros:
+        - rows (Iterable): filas con las columnas de FIELDS
+        - fmt (str): json, ndjson o csv
+        - first (bool): indica si es el primer lote, para las comas del JSON
+
+    Devuelve el texto del lote.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerows([_as_dict(row)[field] for field in FIELDS] for row in rows)
+        return buffer.getvalue()
+    if fmt == "ndjson":
+        return "".join(_dumps(row) + "\n" for row in rows)
+    text = ",".join(_dumps(row) for row in rows)
+    return text if first or not text else "," + text
+
+
+async def stream_rows(stmt, fmt: str, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[str]:
+    """
+    Transmite el resultado de una consulta por lotes de tamaño fijo.
+
+    Abre su propia sesión y recorre la consulta con un cursor del servidor,
+    de forma que en memoria solo hay un lote cada vez.
+
+    Parámetros:
+        - stmt (Select): consulta con las columnas de FIELDS
+        - fmt (str): json, ndjson o csv
+        - batch_size (int): filas por lote
+
+    Devuelve un generador asíncrono de fragmentos de texto.
+    """
+    # Apertura del documento
+    if fmt == "json":
+        yield "["
+    elif fmt == "csv":
+        yield ",".join(FIELDS) + "\n"
+
+    first = True
+    async with AsyncReadSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions(batch_size):
+            yield format_batch(partition, fmt, first)
+            first = False
+
+    # Cierre del documento
+    if fmt == "json":
+        yield "]"
+
+
+async def page_rows(rows: list, fmt: str) -> AsyncIterator[str]:
+    """
+    Serializa una página ya leída con el mismo formato que stream_rows.
+    """
+    if fmt == "json":
+        yield "[" + format_batch(rows, fmt, True) + "]"
+    elif fmt == "csv":
+        yield ",".join(FIELDS) + "\n" + format_batch(rows, fmt, True)
+    else:
+        yield format_batch(rows, fmt, True)
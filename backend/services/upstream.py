@@ -0,0 +1,202 @@
+import asyncio
+import importlib.util
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Optional
+import httpx
+from options.settings import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY, HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT, HTTP2, HTTP_PER_HOST_CONCURRENCY, HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, METRICS_ENABLED,
+)
+from services.metrics import span, UPSTREAM_RESPONSES, UPSTREAM_SECONDS
+
+# Códigos de respuesta que se reintentan
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    Lee la cabecera Retry-After de una respuesta.
+
+    Parámetros:
+        - response (httpx.Response): respuesta de la API
+
+    Devuelve los segundos de espera indicados (en segundos o como fecha HTTP) o None si no hay cabecera válida.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class UpstreamClient:
+    """
+    Cliente HTTP compartido para las APIs de Open-Meteo.
+
+    Mantiene un único httpx.AsyncClient durante toda la vida de la aplicación,
+    con límites del pool de conexiones, keep-alive y HTTP/2 si el paquete h2
+    está instalado. Cada host tiene un semáforo que limita las peticiones
+    simultáneas, y las respuestas 429/5xx y los errores de transporte se
+    reintentan con espera exponencial respetando Retry-After.
+
+    Parámetros:
+        - max_connections (int): conexiones máximas del pool
+        - max_keepalive (int): conexiones keep-alive que se conservan abiertas
+        - keepalive_expiry (float): segundos que se conserva una conexión ociosa
+        - timeout (float): timeout de lectura y escritura en segundos
+        - connect_timeout (float): timeout de conexión en segundos
+        - http2 (bool): usar HTTP/2 si está disponible
+        - per_host_concurrency (int): peticiones simultáneas máximas por host
+        - max_retries (int): reintentos máximos por petición
+        - backoff_base (float): espera inicial en segundos entre reintentos
+        - backoff_max (float): espera máxima en segundos entre reintentos
+        - transport (httpx.AsyncBaseTransport): transporte alternativo, por ejemplo un servidor local de pruebas
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = HTTP_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        http2: bool = HTTP2,
+        per_host_concurrency: int = HTTP_PER_HOST_CONCURRENCY,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff_base: float = HTTP_BACKOFF_BASE,
+        backoff_max: float = HTTP_BACKOFF_MAX,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.per_host_concurrency = per_host_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self._semaphores = {}
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            http2=http2 and importlib.util.find_spec("h2") is not None,
+            transport=transport,
+        )
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        """
+        Devuelve el semáforo de un host, creándolo la primera vez.
+        """
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._semaphores[host]
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """
+        Calcula la espera antes del siguiente intento.
+        """
+        if response is not None:
+            wait = retry_after_seconds(response)
+            if wait is not None:
+                return min(wait, self.backoff_max)
+        wait = self.backoff_base * (2 ** attempt)
+        return min(wait, self.backoff_max) * random.uniform(0.5, 1.0)
+
+    async def get_json(self, url: str, params: Optional[dict] = None) -> Any:
+        """
+        Realiza un GET con reintentos y devuelve el cuerpo en JSON.
+
+        Las respuestas 429 y 5xx y los errores de transporte se reintentan
+        hasta max_retries veces. El resto de respuestas se devuelven tal cual,
+        igual que hacía la consulta original. Con las métricas activadas cada
+        intento se registra en /metrics con su duración y su código por host,
+        y la petición completa (reintentos incluidos) en la fase
+        upstream.<host>, por ejemplo upstream.geocoding-api o upstream.archive-api.
+
+        Parámetros:
+            - url (str): URL de la API
+            - params (dict): parámetros de la consulta
+
+        Devuelve el JSON de la respuesta. Si se agotan los reintentos se lanza
+        el último error (httpx.HTTPStatusError o httpx.TransportError).
+        """
+        host = httpx.URL(url).host
+        semaphore = self._semaphore(host)
+        attempt = 0
+        with span(f"upstream.{host.split('.')[0]}"):
+            while True:
+                response = None
+                try:
+                    async with semaphore:
+                        started = time.perf_counter()
+                        try:
+                            response = await self._client.get(url, params=params)
+                        finally:
+                            if METRICS_ENABLED:
+                                UPSTREAM_SECONDS.observe(time.perf_counter() - started, host)
+                                UPSTREAM_RESPONSES.inc(host, str(response.status_code) if response is not None else "error")
+                    if response.status_code not in RETRY_STATUS:
+                        return response.json()
+                    if attempt >= self.max_retries:
+                        response.raise_for_status()
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+
+                # Esperar fuera del semáforo para no bloquear otras peticiones al host
+                await asyncio.sleep(self._backoff(attempt, response))
+                attempt += 1
+                self.retries += 1
+
+    async def close(self):
+        """
+        Cierra las conexiones del pool.
+        """
+        await self._client.aclose()
+
+
+# Cliente compartido, se abre y cierra con la aplicación
+_client: Optional[UpstreamClient] = None
+
+
+async def start_upstream_client(**kwargs) -> UpstreamClient:
+    """
+    Crea el cliente compartido. Los parámetros sustituyen a los de options.settings.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+    _client = UpstreamClient(**kwargs)
+    return _client
+
+
+async def close_upstream_client():
+    """
+    Cierra el cliente compartido si está abierto.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_upstream_client() -> UpstreamClient:
+    """
+    Devuelve el cliente compartido, creándolo si se usa fuera de la aplicación (scripts, pruebas).
+    """
+    global _client
+    if _client is None:
+        _client = UpstreamClient()
+    return _client
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Los módulos del backend se importan igual que en la aplicación, desde backend/
+BACKEND_DIR = Path(__file__).resolve().parents[2] / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
@@ -0,0 +1,338 @@
+"""
+Benchmarks de la API con un Open-Meteo falso y datos sintéticos.
+
+Cada tamaño de datos (ciudades x años) se mide en un proceso aparte con su
+propia BD SQLite temporal, de modo que las cachés y el pool empiezan vacíos.
+Para cada tamaño se miden:
+
+    - generate: filas por segundo al llenar la BD con datagen
+    - ingest: filas por segundo de POST /load_weather contra el Open-Meteo falso
+    - read: p50 / p99 de GET /weather/{city} y de cada /stats/* con varias concurrencias
+    - read_cached: p50 / p99 de /stats/general, que no tiene parámetros y con la
+      caché de respuestas se sirve de memoria (con --no-response-cache se mide en read)
+
+Los resultados se escriben en JSON; con --baseline se comparan con los de
+una ejecución anterior y se marcan las regresiones.
+
+Uso, desde la raíz del repositorio:
+
+    python -m test.test_backend.bench --sizes 5x1,20x3 --concurrency 1,8,32 --output bench.json
+    python -m test.test_backend.bench --sizes 5x1,20x3 --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+from test.test_backend import BACKEND_DIR
+
+# Endpoints de lectura medidos
+READ_ENDPOINTS = [
+    "/weather/{city}",
+    "/stats/temperature",
+    "/stats/precipitation",
+    "/stats/general",
+    "/stats/compare",
+]
+
+# Endpoints sin parámetros: todas las peticiones son iguales y con la caché de respuestas miden el camino en memoria
+CACHED_ENDPOINTS = {"/stats/general"}
+
+# Métricas comparadas con la ejecución de referencia: True si más es mejor
+METRICS = {"rows_per_s": True, "p50_ms": False, "p99_ms": False, "throughput_rps": True}
+
+# Campos que identifican una medida entre ejecuciones
+KEY_FIELDS = ("scenario", "endpoint", "cities", "years", "concurrency")
+
+
+def parse_size(text: str) -> tuple:
+    """
+    Convierte un tamaño "CIUDADESxAÑOS" en una tupla (ciudades, años).
+    """
+    cities, years = text.lower().split("x")
+    return int(cities), int(years)
+
+
+def latency_summary(latencies: list, seconds: float) -> dict:
+    """
+    Resume las latencias de un escenario en milisegundos.
+    """
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds else None,
+    }
+
+
+async def run_concurrently(requests: list, concurrency: int, send) -> tuple:
+    """
+    Lanza las peticiones con como máximo concurrency en curso.
+
+    Parámetros:
+        - requests (list): argumentos de cada petición
+        - concurrency (int): peticiones simultáneas
+        - send: corrutina que hace una petición y devuelve la respuesta
+
+    Devuelve una tupla (latencias en segundos, número de errores, segundos totales).
+    """
+    queue = list(reversed(requests))
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            args = queue.pop()
+            started = time.perf_counter()
+            response = await send(*args)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - started
+
+
+def read_requests(endpoint: str, cities: list, first_day, last_day, count: int, window_days: int, rng) -> list:
+    """
+    Prepara count peticiones a un endpoint con ciudades y ventanas de fechas aleatorias.
+
+    Las ventanas cambian en cada petición para que la caché de respuestas no
+    convierta la medida en una lectura de memoria, salvo en CACHED_ENDPOINTS,
+    que no admiten parámetros.
+
+    Devuelve una lista de tuplas (ruta, parámetros).
+    """
+    span = max((last_day - first_day).days - window_days, 0)
+    requests = []
+    for _ in range(count):
+        start = first_day + timedelta(days=rng.randint(0, span))
+        end = start + timedelta(days=window_days - 1)
+        dates = {"start_date": str(start), "end_date": str(end)}
+        city = rng.choice(cities)
+        if endpoint == "/weather/{city}":
+            requests.append((f"/weather/{city}", {"start": str(start), "end": str(end)}))
+        elif endpoint == "/stats/general":
+            requests.append((endpoint, {}))
+        elif endpoint == "/stats/compare":
+            requests.append((endpoint, {"cities": rng.sample(cities, min(len(cities), 20)), **dates}))
+        else:
+            requests.append((endpoint, {"city": city, **dates}))
+    return requests
+
+
+async def run_size(args, cities: int, years: int) -> list:
+    """
+    Ejecuta todos los escenarios de un tamaño de datos dentro de este proceso.
+
+    La BD debe estar configurada con OPENMETEO_DATABASE_URL antes de llamar.
+
+    Devuelve la lista de resultados.
+    """
+    import httpx
+    import api
+    from services.upstream import start_upstream_client
+    from test.test_backend.datagen import generate, city_names, year_range
+    from test.test_backend.fake_openmeteo import create_app
+
+    fake = create_app(latency=args.latency, rate_limit=args.rate_limit, burst=args.burst)
+    base = {"cities": cities, "years": years}
+    results = []
+
+    async with api.app.router.lifespan_context(api.app):
+        # Cliente compartido contra el Open-Meteo falso
+        await start_upstream_client(transport=httpx.ASGITransport(app=fake))
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api.app), base_url="http://bench", timeout=None
+        )
+
+        # Llenar la BD con los datos sintéticos
+        generated = await generate(cities, years, args.last_year)
+        results.append({"scenario": "generate", "endpoint": None, "concurrency": 1, **base, **generated})
+
+        # Cargas completas de ciudades nuevas a través del Open-Meteo falso
+        for concurrency in args.concurrency:
+            names = [f"Ingest{concurrency}x{i}" for i in range(args.ingest_cities)]
+            ingest_start = datetime(args.last_year, 1, 1).date()
+            ingest_end = ingest_start + timedelta(days=args.ingest_days - 1)
+            inserted = 0
+
+            async def load(city):
+                nonlocal inserted
+                response = await client.post("/load_weather", params={
+                    "city": city, "start_date": str(ingest_start), "end_date": str(ingest_end),
+                })
+                if response.status_code == 200:
+                    inserted += response.json()["insertados"]
+                return response
+
+            before = dict(fake.state.stats)
+            latencies, errors, seconds = await run_concurrently([(city,) for city in names], concurrency, load)
+            results.append({
+                "scenario": "ingest", "endpoint": "/load_weather", "concurrency": concurrency, **base,
+                "days": args.ingest_days, "rows": inserted, "errors": errors, "seconds": round(seconds, 3),
+                "rows_per_s": round(inserted / seconds, 1) if seconds else None,
+                "upstream": {key: fake.state.stats[key] - before[key] for key in before},
+                **latency_summary(latencies, seconds),
+            })
+
+        # Lecturas con ventanas aleatorias sobre los datos generados
+        first_day, last_day = year_range(years, args.last_year)
+        rng = random.Random(args.seed)
+        for endpoint in READ_ENDPOINTS:
+            cached = endpoint in CACHED_ENDPOINTS and not args.no_response_cache
+            for concurrency in args.concurrency:
+                requests = read_requests(
+                    endpoint, city_names(cities), first_day, last_day, args.requests, args.window_days, rng
+                )
+                latencies, errors, seconds = await run_concurrently(
+                    requests, concurrency, lambda path, params: client.get(path, params=params)
+                )
+                results.append({
+                    "scenario": "read_cached" if cached else "read", "endpoint": endpoint, "concurrency": concurrency, **base,
+                    "window_days": args.window_days, "errors": errors, **latency_summary(latencies, seconds),
+                })
+
+        await client.aclose()
+    return results
+
+
+def spawn_size(args, cities: int, years: int) -> list:
+    """
+    Mide un tamaño de datos en un proceso nuevo con una BD temporal.
+
+    Devuelve la lista de resultados del proceso.
+    """
+    with tempfile.TemporaryDirectory(prefix="openmeteo-bench-") as tmp:
+        env = dict(os.environ)
+        env["OPENMETEO_DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        env.pop("OPENMETEO_DATABASE_READ_URL", None)
+        if args.no_response_cache:
+            env["OPENMETEO_RESPONSE_CACHE_MAX_BYTES"] = "0"
+        out = Path(tmp) / "results.json"
+        subprocess.run(
+            [sys.executable, "-m", "test.test_backend.bench", *sys.argv[1:],
+             "--sizes", f"{cities}x{years}", "--worker-output", str(out)],
+            env=env, cwd=BACKEND_DIR.parent, check=True,
+        )
+        return json.loads(out.read_text())
+
+
+def git_commit() -> str:
+    """
+    Devuelve el commit actual del repositorio o None si no se puede consultar.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR.parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_runs(current: list, baseline: list, threshold: float) -> list:
+    """
+    Compara las métricas de dos ejecuciones medida a medida.
+
+    Parámetros:
+        - current (list): resultados actuales
+        - baseline (list): resultados de referencia
+        - threshold (float): empeoramiento relativo a partir del cual se marca una regresión (0.2 = 20 %)
+
+    Devuelve una lista de dicts con la medida, la métrica, ambos valores, el cambio relativo y si es regresión.
+    """
+    previous = {tuple(r.get(f) for f in KEY_FIELDS): r for r in baseline}
+    rows = []
+    for result in current:
+        key = tuple(result.get(f) for f in KEY_FIELDS)
+        old = previous.get(key)
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if not result.get(metric) or not old.get(metric):
+                continue
+            change = result[metric] / old[metric] - 1
+            worse = -change if higher_is_better else change
+            rows.append({
+                **dict(zip(KEY_FIELDS, key)), "metric": metric, "baseline": old[metric],
+                "current": result[metric], "change": round(change, 4), "regression": worse > threshold,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de carga y lectura de la API con un Open-Meteo falso")
+    parser.add_argument("--sizes", default="5x1,20x3", help="tamaños CIUDADESxAÑOS separados por comas")
+    parser.add_argument("--concurrency", default="1,8,32", help="peticiones simultáneas, separadas por comas")
+    parser.add_argument("--requests", type=int, default=200, help="peticiones por endpoint y concurrencia")
+    parser.add_argument("--window-days", type=int, default=30, help="días de cada consulta de lectura")
+    parser.add_argument("--ingest-cities", type=int, default=8, help="ciudades cargadas por concurrencia")
+    parser.add_argument("--ingest-days", type=int, default=365, help="días de cada carga")
+    parser.add_argument("--last-year", type=int, default=2023, help="último año de los datos generados")
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos de latencia del Open-Meteo falso")
+    parser.add_argument("--rate-limit", type=float, default=None, help="peticiones por segundo del Open-Meteo falso")
+    parser.add_argument("--burst", type=int, default=10, help="ráfaga admitida con --rate-limit")
+    parser.add_argument("--no-response-cache", action="store_true", help="desactivar la caché de respuestas")
+    parser.add_argument("--seed", type=int, default=0, help="semilla de las consultas aleatorias")
+    parser.add_argument("--output", help="fichero JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument("--baseline", help="resultados JSON de una ejecución anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="empeoramiento que cuenta como regresión")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+
+    # Proceso hijo: un único tamaño con la BD ya configurada
+    if args.worker_output:
+        results = asyncio.run(run_size(args, *sizes[0]))
+        Path(args.worker_output).write_text(json.dumps(results))
+        return
+
+    results = []
+    for cities, years in sizes:
+        print(f"# {cities} ciudades x {years} años", file=sys.stderr)
+        results += spawn_size(args, cities, years)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "worker_output")},
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        report["comparison"] = compare_runs(results, json.loads(Path(args.baseline).read_text())["results"], args.threshold)
+        regressions = [row for row in report["comparison"] if row["regression"]]
+        for row in regressions:
+            print(f"REGRESIÓN {row['scenario']} {row['endpoint']} {row['cities']}x{row['years']} "
+                  f"c={row['concurrency']} {row['metric']}: {row['baseline']} -> {row['current']}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
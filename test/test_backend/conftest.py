@@ -0,0 +1,71 @@
+import os
+import tempfile
+from pathlib import Path
+
+# La BD de las pruebas se configura antes de importar ningún módulo del backend
+TEST_DIR = Path(tempfile.mkdtemp(prefix="openmeteo-test-"))
+os.environ["OPENMETEO_DATABASE_URL"] = f"sqlite+aiosqlite:///{TEST_DIR / 'openmeteo.db'}"
+os.environ.pop("OPENMETEO_DATABASE_READ_URL", None)
+os.environ.pop("OPENMETEO_WRITE_LOCK_PATH", None)
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    """
+    Las pruebas asíncronas se ejecutan con asyncio, como la aplicación.
+    """
+    return "asyncio"
+
+
+def remove_database():
+    """
+    Borra el fichero de la BD de las pruebas y los de WAL.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        path = TEST_DIR / f"openmeteo.db{suffix}"
+        if path.exists():
+            path.unlink()
+
+
+@pytest.fixture
+async def client():
+    """
+    Cliente HTTP de la aplicación sobre una BD vacía y con el Open-Meteo falso como upstream.
+
+    Arranca el lifespan de api.py, de modo que las tablas, el ejecutor y la
+    cola de cargas son los de la aplicación. Las cachés en memoria se vacían
+    porque los ids de las localizaciones se repiten entre pruebas.
+    """
+    import api
+    from db.database import dispose_engines
+    from services.openmeteo import get_geocode_cache
+    from services.response_cache import get_response_cache
+    from services.series_cache import get_series_cache
+    from services.upstream import start_upstream_client
+    from test.test_backend.fake_openmeteo import create_app
+
+    await dispose_engines()
+    remove_database()
+    for cache in (get_geocode_cache(), get_response_cache(), get_series_cache()):
+        cache.clear()
+
+    fake = create_app()
+    async with api.app.router.lifespan_context(api.app):
+        await start_upstream_client(transport=httpx.ASGITransport(app=fake))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test") as http:
+            http.upstream = fake
+            yield http
+
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """
+    Activa las operaciones de mantenimiento con un token y devuelve la cabecera que lo envía.
+    """
+    from routers import admin
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secreto")
+    return {"X-Admin-Token": "secreto"}
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import date
+from test.test_backend.fake_openmeteo import geocode, synthetic_hourly
+
+
+def city_names(cities: int, prefix: str = "City") -> list:
+    """
+    Devuelve los nombres de las ciudades sintéticas: City0, City1, ...
+    """
+    return [f"{prefix}{i}" for i in range(cities)]
+
+
+def year_range(years: int, last_year: int) -> tuple:
+    """
+    Devuelve el primer y el último día de los years años que terminan en last_year.
+    """
+    return date(last_year - years + 1, 1, 1), date(last_year, 12, 31)
+
+
+async def generate(cities: int, years: int, last_year: int = 2023, prefix: str = "City") -> dict:
+    """
+    Llena la BD configurada con N ciudades x M años de datos horarios sintéticos.
+
+    Los datos son los mismos que devuelve el Open-Meteo falso para esas
+    ciudades y se guardan con services.ingest.bulk_insert_weather, así que
+    también se mantienen los resúmenes diarios, los periodos y el resumen por
+    ciudad, igual que en una carga real. Se hace un commit por ciudad y año.
+    Volver a generar los mismos datos no inserta nada.
+
+    Parámetros:
+        - cities (int): número de ciudades
+        - years (int): años por ciudad
+        - last_year (int): último año generado
+        - prefix (str): prefijo de los nombres de las ciudades
+
+    Devuelve un objeto dict con las filas recibidas e insertadas, los segundos y las filas por segundo.
+    """
+    from db.database import AsyncSessionLocal
+    from services.ingest import bulk_insert_weather
+
+    total = inserted = 0
+    started = time.perf_counter()
+    for city in city_names(cities, prefix):
+        coords = geocode(city)
+        for year in range(last_year - years + 1, last_year + 1):
+            data = synthetic_hourly(coords["latitude"], coords["longitude"], date(year, 1, 1), date(year, 12, 31))
+            async with AsyncSessionLocal() as session:
+                result = await bulk_insert_weather(session, city, data)
+                await session.commit()
+            total += result["total"]
+            inserted += result["inserted"]
+    seconds = time.perf_counter() - started
+    return {
+        "rows": total,
+        "inserted": inserted,
+        "seconds": round(seconds, 3),
+        "rows_per_s": round(inserted / seconds, 1) if seconds else None,
+    }
+
+
+async def _main(args):
+    from db.database import engine, Base, dispose_engines
+    from db.migrations import run_migrations
+    import services.ingest  # noqa: F401  registra los modelos que escribe la carga
+
+    # Crear las tablas igual que al arrancar la aplicación
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+    result = await generate(args.cities, args.years, args.last_year, args.prefix)
+    await dispose_engines()
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Llena la BD de OPENMETEO_DATABASE_URL con datos horarios sintéticos"
+    )
+    parser.add_argument("--cities", type=int, default=10, help="número de ciudades")
+    parser.add_argument("--years", type=int, default=1, help="años por ciudad")
+    parser.add_argument("--last-year", type=int, default=2023, help="último año generado")
+    parser.add_argument("--prefix", default="City", help="prefijo de los nombres de las ciudades")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,172 @@
+import asyncio
+import time
+import zlib
+from datetime import date, timedelta
+from typing import List, Optional
+import numpy as np
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+# Prefijo de los nombres que la geocodificación falsa no encuentra
+UNKNOWN_PREFIX = "nowhere"
+
+
+def geocode(name: str) -> Optional[dict]:
+    """
+    Geocodificación determinista: las mismas coordenadas para el mismo nombre (sin distinguir mayúsculas).
+
+    Parámetros:
+        - name (str): nombre de la ciudad
+
+    Devuelve un objeto dict con latitude y longitude, o None si el nombre empieza por UNKNOWN_PREFIX.
+    """
+    key = name.strip().lower()
+    if key.startswith(UNKNOWN_PREFIX):
+        return None
+    h = zlib.crc32(key.encode("utf-8"))
+    return {
+        "latitude": round(-60 + (h % 12000) / 100, 4),
+        "longitude": round(-180 + (h // 12000 % 36000) / 100, 4),
+    }
+
+
+def _noise(hours: np.ndarray, seed: float) -> np.ndarray:
+    """
+    Ruido pseudoaleatorio en [0, 1) que solo depende de la hora y la semilla.
+
+    No depende de cómo se trocee el rango, así que dos descargas de la
+    misma hora devuelven siempre el mismo valor.
+    """
+    x = np.sin(hours * 12.9898 + seed) * 43758.5453
+    return x - np.floor(x)
+
+
+def synthetic_hourly(lat: float, lon: float, start: date, end: date) -> dict:
+    """
+    Genera una respuesta de la API de archivo con datos horarios sintéticos.
+
+    La temperatura sigue un ciclo anual y uno diario alrededor de una media
+    que baja con la latitud, más ruido; la precipitación es cero la mayoría
+    de las horas. Los valores se redondean a un decimal como Open-Meteo.
+
+    Parámetros:
+        - lat (float): latitud
+        - lon (float): longitud
+        - start (date): primer día
+        - end (date): último día (incluido)
+
+    Devuelve un objeto dict con latitude, longitude y hourly (time, temperature_2m, precipitation).
+    """
+    times = np.arange(np.datetime64(start, "h"), np.datetime64(end + timedelta(days=1), "h"))
+    hours = times.astype(np.int64).astype(np.float64)
+    seed = lat * 7.13 + lon * 3.71
+    season = np.cos(2 * np.pi * (hours / 24 - 196) / 365.25)
+    daily = np.sin(2 * np.pi * (hours % 24 - 9) / 24)
+    temperature = 25 - abs(lat) * 0.4 + 10 * season * (1 if lat >= 0 else -1) + 5 * daily + 4 * (_noise(hours, seed) - 0.5)
+    wet = _noise(hours, seed + 1)
+    precipitation = np.where(wet > 0.85, (wet - 0.85) * 20, 0.0)
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": {
+            "time": np.datetime_as_string(times, unit="m").tolist(),
+            "temperature_2m": np.round(temperature, 1).tolist(),
+            "precipitation": np.round(precipitation, 1).tolist(),
+        },
+    }
+
+
+class TokenBucket:
+    """
+    Límite de peticiones por segundo con ráfagas, como el de la API pública.
+
+    Parámetros:
+        - rate (float): peticiones por segundo, None sin límite
+        - burst (int): peticiones que se pueden hacer de golpe
+    """
+
+    def __init__(self, rate: Optional[float], burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> Optional[float]:
+        """
+        Consume una petición.
+
+        Devuelve None si se admite o los segundos que faltan para la siguiente petición admitida.
+        """
+        if self.rate is None:
+            return None
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        return (1 - self.tokens) / self.rate
+
+
+def create_app(latency: float = 0.0, rate_limit: Optional[float] = None, burst: int = 10) -> FastAPI:
+    """
+    Crea una aplicación ASGI que sustituye a la Geocoding API y a la API de archivo de Open-Meteo.
+
+    Atiende las rutas /v1/search y /v1/archive sin mirar el host, así que se
+    usa como transporte del cliente compartido:
+    start_upstream_client(transport=httpx.ASGITransport(app=create_app())).
+    Los contadores quedan en app.state.stats.
+
+    Parámetros:
+        - latency (float): segundos de espera añadidos a cada respuesta
+        - rate_limit (float): peticiones por segundo admitidas, None sin límite; el resto recibe 429 con Retry-After
+        - burst (int): peticiones admitidas de golpe con rate_limit
+
+    Devuelve la aplicación FastAPI.
+    """
+    app = FastAPI()
+    app.state.stats = {"search": 0, "archive": 0, "throttled": 0}
+    bucket = TokenBucket(rate_limit, burst)
+
+    async def admit(kind: str) -> Optional[JSONResponse]:
+        wait = bucket.take()
+        if wait is not None:
+            app.state.stats["throttled"] += 1
+            return JSONResponse(
+                {"error": True, "reason": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": f"{wait:.3f}"},
+            )
+        app.state.stats[kind] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return None
+
+    @app.get("/v1/search")
+    async def search(name: str, count: int = 1, language: str = "es"):
+        rejected = await admit("search")
+        if rejected is not None:
+            return rejected
+        coords = geocode(name)
+        if coords is None:
+            return {"generationtime_ms": 0.1}
+        return {"results": [{"name": name, **coords}][:count]}
+
+    @app.get("/v1/archive")
+    async def archive(
+        latitude: str,
+        longitude: str,
+        start_date: date,
+        end_date: date,
+        hourly: Optional[List[str]] = Query(None),
+        timezone: str = "auto",
+    ):
+        rejected = await admit("archive")
+        if rejected is not None:
+            return rejected
+        coords = list(zip(latitude.split(","), longitude.split(",")))
+        data = [synthetic_hourly(float(lat), float(lon), start_date, end_date) for lat, lon in coords]
+        # Con una sola ubicación la API devuelve un objeto en lugar de una lista
+        return data[0] if len(data) == 1 else data
+
+    return app
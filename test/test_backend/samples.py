@@ -0,0 +1,34 @@
+from datetime import date, datetime, timedelta
+from db.database import AsyncSessionLocal
+from services.ingest import bulk_insert_weather
+
+
+def hourly(start: date, days: int, temperature=None, precipitation=None) -> dict:
+    """
+    Respuesta de la API de archivo con days días desde start.
+
+    temperature y precipitation son funciones de la hora (0, 1, ...) que
+    devuelven el valor o None; por defecto, valores que varían con la hora.
+    """
+    temperature = temperature or (lambda i: float(i % 24))
+    precipitation = precipitation or (lambda i: 0.5 if i % 24 == 12 else 0.0)
+    times = [datetime.combine(start, datetime.min.time()) + timedelta(hours=i) for i in range(days * 24)]
+    return {
+        "latitude": 40.4,
+        "longitude": -3.7,
+        "hourly": {
+            "time": [t.strftime("%Y-%m-%dT%H:%M") for t in times],
+            "temperature_2m": [temperature(i) for i in range(len(times))],
+            "precipitation": [precipitation(i) for i in range(len(times))],
+        },
+    }
+
+
+async def insert(city: str, data: dict) -> dict:
+    """
+    Guarda una respuesta de la API de archivo como la carga y hace commit.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await bulk_insert_weather(session, city, data)
+        await session.commit()
+    return result
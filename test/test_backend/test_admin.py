@@ -0,0 +1,28 @@
+from datetime import date
+import pytest
+from routers import admin
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+MAINTENANCE = ["/admin/rebuild_summaries", "/admin/vacuum"]
+
+
+@pytest.mark.parametrize("path", MAINTENANCE)
+async def test_maintenance_is_disabled_without_admin_token(client, monkeypatch, path):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    response = await client.post(path, headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("path", MAINTENANCE)
+async def test_maintenance_requires_the_admin_token(client, admin_headers, path):
+    await insert("Madrid", hourly(date(2024, 1, 1), 1))
+    assert (await client.post(path)).status_code == 403
+    assert (await client.post(path, headers={"X-Admin-Token": "otro"})).status_code == 403
+    assert (await client.post(path, headers=admin_headers)).status_code == 200
+
+
+async def test_read_only_admin_routes_stay_open(client):
+    assert (await client.get("/admin/caches")).status_code == 200
+    assert (await client.get("/metrics")).status_code == 200
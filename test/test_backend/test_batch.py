@@ -0,0 +1,35 @@
+from datetime import date
+import pytest
+from routers import weather
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch_load_downloads_only_the_missing_ranges(client):
+    # Madrid tiene los días 2 a 4: le faltan el 1 y el 5, no el tramo entero
+    await insert("Madrid", hourly(date(2024, 1, 2), 3))
+
+    response = await client.post("/load_weather/batch", json={
+        "cities": ["Madrid", "Oslo", "MADRID"], "start_date": "2024-01-01", "end_date": "2024-01-05",
+    })
+    assert response.status_code == 200
+    cities = response.json()["ciudades"]
+    assert set(cities) == {"Madrid", "Oslo"}
+    assert cities["Madrid"] == {"estado": "cargada", "registros": 48, "insertados": 48, "omitidos": 0}
+    assert cities["Oslo"] == {"estado": "cargada", "registros": 120, "insertados": 120, "omitidos": 0}
+
+    response = await client.get("/weather/Madrid", params={"format": "ndjson"})
+    assert len(response.content.splitlines()) == 5 * 24
+
+
+async def test_batch_load_limits_the_number_of_cities(client, monkeypatch):
+    monkeypatch.setattr(weather, "BATCH_MAX_CITIES", 2)
+    payload = {"start_date": "2024-01-01", "end_date": "2024-01-01"}
+
+    response = await client.post("/load_weather/batch", json={**payload, "cities": ["Madrid", "Oslo", "Roma"]})
+    assert response.status_code == 400
+
+    # Las repetidas cuentan una vez
+    response = await client.post("/load_weather/batch", json={**payload, "cities": ["Madrid", "madrid", "Oslo"]})
+    assert response.status_code == 200
@@ -0,0 +1,78 @@
+from datetime import date
+import pytest
+from sqlalchemy import select
+from db.database import AsyncSessionLocal
+from models.weatherBucket import WeatherBucketDB
+from services.buckets import BUCKET_COLUMNS, bucket_start, daily_select, location_buckets
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+
+async def stored_buckets(location_id: int) -> dict:
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            select(WeatherBucketDB).where(WeatherBucketDB.location_id == location_id)
+        )).scalars().all()
+    return {(row.resolution, row.start): {col: getattr(row, col) for col in BUCKET_COLUMNS} for row in rows}
+
+
+async def rebuilt_buckets(location_id: int) -> dict:
+    async with AsyncSessionLocal() as session:
+        daily = (await session.execute(daily_select(location_id))).mappings().all()
+    return {
+        (row["resolution"], row["start"]): {col: row[col] for col in BUCKET_COLUMNS}
+        for row in location_buckets(location_id, daily)
+    }
+
+
+def test_bucket_start():
+    day = date(2024, 2, 29)  # jueves
+    assert bucket_start("week", day) == date(2024, 2, 26)
+    assert bucket_start("month", day) == date(2024, 2, 1)
+    assert bucket_start("year", day) == date(2024, 1, 1)
+    assert bucket_start("day", day) == day
+
+
+async def test_incremental_loads_match_full_rebuild(client):
+    # Cargas solapadas que cruzan semanas, meses y el cambio de año, en desorden
+    loads = [(date(2024, 1, 25), 12), (date(2024, 2, 3), 18), (date(2023, 12, 30), 4)]
+    for start, days in loads:
+        result = await insert("Madrid", hourly(start, days))
+        assert await stored_buckets(result["location_id"]) == await rebuilt_buckets(result["location_id"])
+
+    buckets = await stored_buckets(result["location_id"])
+    assert {start for res, start in buckets if res == "year"} == {date(2023, 1, 1), date(2024, 1, 1)}
+    # Enero tiene cargados del 1 al 2 y del 25 al 31
+    january = buckets[("month", date(2024, 1, 1))]
+    assert january["hours"] == 9 * 24
+    assert january["temp_sum"] == 9 * float(sum(range(24)))
+    assert (january["temp_min"], january["temp_max"], january["precip_max"]) == (0.0, 23.0, 0.5)
+
+
+async def test_series_month_matches_daily(client):
+    await insert("Madrid", hourly(date(2024, 1, 1), 60))
+    params = {"start": "2024-01-01", "end": "2024-02-29"}
+
+    months = (await client.get("/series/Madrid", params={"resolution": "month", **params})).json()["buckets"]
+    days = (await client.get("/series/Madrid", params={"resolution": "day", **params})).json()["buckets"]
+    assert [m["start"] for m in months] == ["2024-01-01", "2024-02-01"]
+    assert sum(m["hours"] for m in months) == sum(d["hours"] for d in days) == 60 * 24
+    assert months[1]["precipitation"]["sum"] == round(sum(
+        d["precipitation"]["sum"] for d in days if d["start"].startswith("2024-02")
+    ), 2)
+
+
+async def test_series_hour_requires_bounded_range(client):
+    await insert("Madrid", hourly(date(2024, 1, 1), 2))
+
+    response = await client.get("/series/Madrid", params={"resolution": "hour"})
+    assert response.status_code == 400
+    response = await client.get("/series/Madrid", params={"resolution": "hour", "start": "2022-01-01",
+                                                          "end": "2024-01-02"})
+    assert response.status_code == 400
+
+    response = await client.get("/series/Madrid", params={"resolution": "hour", "start": "2024-01-01",
+                                                          "end": "2024-01-02"})
+    assert response.status_code == 200
+    assert len(response.json()["buckets"]) == 48
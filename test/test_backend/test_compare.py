@@ -0,0 +1,63 @@
+from datetime import date
+import pytest
+from services import series_cache
+from services.series_cache import SeriesCache
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+
+def partial(data: dict, first: int, last: int) -> dict:
+    """
+    Se queda con las horas first..last (incluidas) de una respuesta de la API de archivo.
+    """
+    data["hourly"] = {key: values[first:last + 1] for key, values in data["hourly"].items()}
+    return data
+
+
+async def single_city(client, city: str, params: dict) -> dict:
+    """
+    Estadísticas de una ciudad con los endpoints individuales, None si no tiene datos.
+    """
+    out = {}
+    for kind in ("temperature", "precipitation"):
+        response = await client.get(f"/stats/{kind}", params={"city": city, **params})
+        out[kind] = response.json()[kind] if response.status_code == 200 else None
+    return out
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    ("2024-01-01", "2024-01-03"),
+    ("2024-01-01T05:30", "2024-01-03T12:00"),
+])
+@pytest.mark.parametrize("admit_after", [1000, 1])
+async def test_compare_matches_single_city_endpoints(client, monkeypatch, admit_after, start_date, end_date):
+    # admit_after=1000: endpoints individuales en SQL, admit_after=1: sobre la serie en memoria
+    monkeypatch.setattr(series_cache, "_series_cache", SeriesCache(admit_after=admit_after))
+    await insert("Madrid", hourly(date(2023, 12, 31), 5, precipitation=lambda i: 0.1 * (i % 7)))
+    # Días incompletos: del 2 a las 06:00 al 3 a las 18:00
+    await insert("Oslo", partial(hourly(date(2024, 1, 1), 3, temperature=lambda i: -float(i % 13)), 30, 66))
+    # Con datos, pero fuera del rango
+    await insert("Roma", hourly(date(2024, 2, 1), 1))
+
+    params = {"start_date": start_date, "end_date": end_date}
+    cities = ["Madrid", "Oslo", "Roma", "Atlantis"]
+    response = await client.get("/stats/compare", params={"cities": cities, **params})
+    assert response.status_code == 200
+    compare = response.json()
+    assert list(compare) == cities
+
+    for city in ("Madrid", "Oslo"):
+        expected = await single_city(client, city, params)
+        assert expected["temperature"] is not None and expected["precipitation"] is not None
+        assert compare[city] == expected
+    assert compare["Roma"] is None
+    assert compare["Atlantis"] is None
+
+
+async def test_compare_without_data_returns_404(client):
+    await insert("Roma", hourly(date(2024, 2, 1), 1))
+    response = await client.get("/stats/compare", params={
+        "cities": ["Roma", "Atlantis"], "start_date": "2024-01-01", "end_date": "2024-01-03",
+    })
+    assert response.status_code == 404
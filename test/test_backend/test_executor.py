@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import pytest
+from services.executor import KernelExecutor
+
+pytestmark = pytest.mark.anyio
+
+
+def wait_event(event: threading.Event) -> bool:
+    return event.wait(5)
+
+
+async def test_timed_out_kernel_keeps_its_slot_until_it_finishes():
+    executor = KernelExecutor(mode="thread", workers=1, timeout=0.05)
+    event = threading.Event()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(wait_event, event)
+        # El hilo sigue ocupado: el hueco no se ha liberado y otro cálculo espera
+        assert (executor.running, executor.timeouts) == (1, 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(sum, [1, 2])
+        assert executor.running == 1
+
+        event.set()
+        for _ in range(100):
+            if executor.running == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.running == 0
+        assert await executor.run(sum, [1, 2]) == 3
+    finally:
+        event.set()
+        executor.shutdown()
+
+
+async def test_inline_mode_runs_on_the_loop_without_timeout():
+    executor = KernelExecutor(mode="inline", workers=1, timeout=0)
+    assert await executor.run(sum, [1, 2]) == 3
+    assert executor.stats()["completed"] == 1
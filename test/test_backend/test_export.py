@@ -0,0 +1,102 @@
+import io
+from datetime import date, datetime
+import numpy as np
+import pytest
+from db.database import AsyncSessionLocal
+from routers import weather
+from services import export
+from services.locations import get_location
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+# Segundos desde 1970-01-01 del 2024-01-01 a las 00:00
+JAN_1 = int((datetime(2024, 1, 1) - datetime(1970, 1, 1)).total_seconds())
+
+
+async def load_two_cities():
+    await insert("Madrid", hourly(date(2024, 1, 1), 2))
+    await insert("Oslo", hourly(date(2024, 1, 1), 1, temperature=lambda i: -float(i), precipitation=lambda i: None))
+
+
+async def test_npz_export_round_trip(client, monkeypatch):
+    monkeypatch.setattr(export, "pa", None)
+    await load_two_cities()
+
+    response = await client.get("/export/weather", params={"cities": ["Oslo", "Madrid", "madrid"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["x-row-count"] == "72"
+
+    data = np.load(io.BytesIO(response.content))
+    assert data["cities"].tolist() == ["Oslo", "Madrid"]
+    assert data["city_index"].tolist() == [0] * 24 + [1] * 48
+    assert data["ts"][[0, 23, 24, 71]].tolist() == [JAN_1, JAN_1 + 23 * 3600, JAN_1, JAN_1 + 47 * 3600]
+    assert data["temperature_2m"].dtype == np.float32
+    assert data["temperature_2m"][:24].tolist() == [-float(i) for i in range(24)]
+    assert np.isnan(data["precipitation"][:24]).all()
+    assert data["precipitation"][24 + 12] == np.float32(0.5)
+
+    # Con rango y sin pyarrow, parquet no está disponible
+    response = await client.get("/export/weather", params={"cities": ["Madrid"], "start": "2024-01-02"})
+    assert response.headers["x-row-count"] == "24"
+    assert np.load(io.BytesIO(response.content))["ts"][0] == JAN_1 + 24 * 3600
+    response = await client.get("/export/weather", params={"cities": ["Madrid"], "format": "parquet"})
+    assert response.status_code == 400
+
+
+async def test_npz_export_row_limit(client, monkeypatch):
+    monkeypatch.setattr(weather, "EXPORT_NPZ_MAX_ROWS", 50)
+    await load_two_cities()
+    params = {"cities": ["Madrid", "Oslo"], "format": "npz"}
+    assert (await client.get("/export/weather", params=params)).status_code == 400
+    assert (await client.get("/export/weather", params={**params, "end": "2024-01-01"})).status_code == 200
+
+
+async def test_export_unknown_city_returns_404(client):
+    await load_two_cities()
+    response = await client.get("/export/weather", params={"cities": ["Madrid", "Atlantis"]})
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("fmt", [None, "parquet", "arrow"])
+async def test_pyarrow_export_round_trip(client, fmt):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    await load_two_cities()
+
+    params = {"cities": ["Madrid", "Oslo"]} if fmt is None else {"cities": ["Madrid", "Oslo"], "format": fmt}
+    response = await client.get("/export/weather", params=params)
+    assert response.status_code == 200
+    assert response.headers["x-row-count"] == "72"
+    if fmt == "arrow":
+        assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        table = pa.ipc.open_stream(response.content).read_all()
+    else:
+        # Con pyarrow instalado el formato por defecto es parquet
+        assert response.headers["content-type"] == "application/vnd.apache.parquet"
+        table = pq.read_table(io.BytesIO(response.content))
+
+    assert table.num_rows == 72
+    assert table.column("city").to_pylist() == ["Madrid"] * 48 + ["Oslo"] * 24
+    assert table.column("ts").to_pylist()[:2] == [JAN_1, JAN_1 + 3600]
+    assert table.schema.field("temperature_2m").type == pa.float32()
+    # Las horas sin valor se exportan como NaN, igual que en npz
+    assert np.isnan(table.column("precipitation").to_numpy()[48:]).all()
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+async def test_pyarrow_export_is_written_in_chunks(client, fmt):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    await load_two_cities()
+    async with AsyncSessionLocal() as session:
+        locations = [await get_location(session, "Madrid"), await get_location(session, "Oslo")]
+
+    parts = [part async for part in export.stream_export(locations, None, None, fmt, batch_size=10)]
+    # Un trozo por bloque leído (5 de Madrid y 3 de Oslo) y el cierre del fichero
+    assert len(parts) == 8 + 1
+    assert all(parts[:-1])
+    content = b"".join(parts)
+    table = pq.read_table(io.BytesIO(content)) if fmt == "parquet" else pa.ipc.open_stream(content).read_all()
+    assert table.num_rows == 72
@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+from datetime import date
+import pytest
+from sqlalchemy import select
+from db.database import AsyncSessionLocal
+from db.types import utcnow
+from models.job import IngestJobDB
+from services import jobs
+from services.jobs import DONE, QUEUED, RUNNING, JobQueue, recover_jobs
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_job(status: str = QUEUED, city: str = "Madrid") -> str:
+    job_id = uuid.uuid4().hex
+    async with AsyncSessionLocal() as session:
+        session.add(IngestJobDB(
+            id=job_id, city=city, city_key=city.lower(), start_date=date(2023, 1, 1), end_date=date(2023, 1, 2),
+            status=status, rows_total=0, rows_inserted=0, rows_skipped=0, created_at=utcnow(),
+        ))
+        await session.commit()
+    return job_id
+
+
+async def job_status(job_id: str) -> str:
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(IngestJobDB.status).where(IngestJobDB.id == job_id))).scalar_one()
+
+
+async def test_background_load_runs_job(client):
+    response = await client.post("/load_weather", params={"city": "Madrid", "start_date": "2023-01-01",
+                                                          "end_date": "2023-01-03", "background": True})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    for _ in range(100):
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] not in (QUEUED, RUNNING):
+            break
+        await asyncio.sleep(0.05)
+    assert job["status"] == DONE
+    assert job["insertados"] == 3 * 24
+
+
+async def test_same_job_is_enqueued_once_across_workers(client):
+    # Dos colas como las de dos procesos worker, sin cerrojo compartido en memoria
+    queues = [JobQueue(workers=1), JobQueue(workers=1)]
+    results = await asyncio.gather(*[
+        queue.submit(city, date(2023, 1, 1), date(2023, 1, 2))
+        for queue in queues for city in ("Madrid", "madrid ", "MADRID")
+    ])
+    assert sum(created for _, created in results) == 1
+    assert len({job["id"] for job, _ in results}) == 1
+    assert sum(queue._queue.qsize() for queue in queues) == 1
+
+    # Otro rango, o el mismo cuando el anterior ya ha terminado, es un trabajo nuevo
+    job, created = await queues[0].submit("Madrid", date(2023, 1, 1), date(2023, 1, 3))
+    assert created
+    first = results[0][0]["id"]
+    async with AsyncSessionLocal() as session:
+        (await session.get(IngestJobDB, first)).status = DONE
+        await session.commit()
+    job, created = await queues[1].submit("Madrid", date(2023, 1, 1), date(2023, 1, 2))
+    assert created and job["id"] != first
+
+
+async def test_job_is_claimed_once(client):
+    job_id = await add_job()
+    queue = JobQueue(workers=1)
+    assert await queue._claim(job_id)
+    assert not await queue._claim(job_id)
+    assert await job_status(job_id) == RUNNING
+
+
+async def test_pending_job_runs_in_one_of_several_workers(client, monkeypatch):
+    runs = []
+
+    async def load(city, start, end):
+        runs.append(city)
+        await asyncio.sleep(0.05)
+        return {"total": 24, "inserted": 24, "skipped": 0, "ranges": []}
+
+    monkeypatch.setattr(jobs, "load_city_weather", load)
+    job_id = await add_job()
+
+    # Dos colas como las de dos procesos worker: ambas encolan el trabajo pendiente
+    queues = [JobQueue(workers=2), JobQueue(workers=2)]
+    for queue in queues:
+        await queue.start(recover=False)
+    try:
+        await asyncio.wait_for(asyncio.gather(*[queue._queue.join() for queue in queues]), timeout=5)
+    finally:
+        for queue in queues:
+            await queue.stop()
+
+    assert runs == ["Madrid"]
+    assert await job_status(job_id) == DONE
+
+
+async def test_recover_jobs_requeues_running_jobs(client):
+    running = await add_job(RUNNING, "Madrid")
+    queued = await add_job(QUEUED, "Oslo")
+    done = await add_job(DONE, "Roma")
+
+    assert await recover_jobs() == 1
+    assert [await job_status(job_id) for job_id in (running, queued, done)] == [QUEUED, QUEUED, DONE]
@@ -0,0 +1,91 @@
+import re
+from datetime import date
+import pytest
+from services import metrics, upstream
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+# Líneas del formato de texto de Prometheus 0.0.4
+COMMENT = re.compile(r"^# (HELP [a-zA-Z_:][a-zA-Z0-9_:]* .*|TYPE [a-zA-Z_:][a-zA-Z0-9_:]* (counter|gauge|histogram))$")
+SAMPLE = re.compile(
+    r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? '
+    r'(-?[0-9.e+-]+|NaN|\+Inf|-Inf)$'
+)
+
+STATS_PARAMS = {"city": "Madrid", "start_date": "2024-01-01", "end_date": "2024-01-02"}
+
+
+def samples(text: str) -> dict:
+    """
+    Valida el texto de /metrics y devuelve las muestras por nombre y etiquetas.
+    """
+    out = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            assert COMMENT.match(line), line
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        series, value = line.rsplit(" ", 1)
+        out[series] = float(value)
+    return out
+
+
+def total(metric) -> float:
+    """
+    Suma las observaciones de un contador o histograma de todas sus series.
+    """
+    if isinstance(metric, metrics.Histogram):
+        return sum(series[2] for series in metric._series.values())
+    return sum(metric._values.values())
+
+
+async def test_metrics_renders_prometheus_text(client):
+    await insert("Madrid", hourly(date(2024, 1, 1), 2))
+    assert (await client.get("/stats/temperature", params=STATS_PARAMS)).status_code == 200
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    values = samples(response.text)
+
+    route = 'method="GET",route="/stats/temperature"'
+    assert values[f'openmeteo_http_requests_total{{{route},status="200"}}'] >= 1
+    # Intervalos acumulados: el último (+Inf) es el número de observaciones
+    buckets = [value for series, value in values.items()
+               if series.startswith(f"openmeteo_http_request_seconds_bucket{{{route},")]
+    assert buckets == sorted(buckets)
+    assert buckets[-1] == values[f"openmeteo_http_request_seconds_count{{{route}}}"]
+
+
+async def test_server_timing_on_stats_with_profiling(client, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILING", True)
+    await insert("Madrid", hourly(date(2024, 1, 1), 2))
+
+    response = await client.get("/stats/temperature", params=STATS_PARAMS, headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    phases = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    assert phases[-1] == "total"
+    assert any(phase.startswith("stats.") for phase in phases)
+
+    # Sin la cabecera X-Profile no se perfila
+    response = await client.get("/stats/precipitation", params=STATS_PARAMS)
+    assert "server-timing" not in response.headers
+
+
+async def test_nothing_is_measured_with_metrics_disabled(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    monkeypatch.setattr(upstream, "METRICS_ENABLED", False)
+    assert isinstance(metrics.span("stats.rows"), metrics._NullSpan)
+
+    tracked = [metrics.HTTP_REQUESTS, metrics.HTTP_SECONDS, metrics.SPAN_SECONDS, metrics.SPAN_ROWS,
+               metrics.UPSTREAM_RESPONSES, metrics.UPSTREAM_SECONDS]
+    before = [total(metric) for metric in tracked]
+
+    response = await client.post("/load_weather", params={**STATS_PARAMS, "city": "Madrid"})
+    assert response.status_code == 200
+    assert client.upstream.state.stats["archive"] == 1
+    assert (await client.get("/stats/temperature", params=STATS_PARAMS)).status_code == 200
+
+    assert [total(metric) for metric in tracked] == before
@@ -0,0 +1,153 @@
+from datetime import date, datetime
+from sqlalchemy import create_engine, text
+from db.database import Base
+from db.migrations import run_migrations
+from db.types import EPOCH_DAY, to_hours
+from models.job import IngestJobDB
+import models.geocode  # noqa: F401  registra todas las tablas de la aplicación
+import models.weatherBucket  # noqa: F401
+
+# Esquema de weather_data de la primera versión de la aplicación
+BASELINE_SCHEMA = """
+CREATE TABLE weather_data (
+    id INTEGER NOT NULL,
+    city VARCHAR NOT NULL,
+    datetime DATETIME NOT NULL,
+    temperature_2m FLOAT,
+    precipitation FLOAT,
+    latitude FLOAT,
+    longitude FLOAT,
+    PRIMARY KEY (id)
+)
+"""
+
+# Filas (ciudad, hora, temperatura, precipitación) en orden de inserción
+BASELINE_ROWS = [
+    ("Madrid", "2024-01-01 00:00:00.000000", 10.0, 0.0),
+    ("Madrid", "2024-01-01 01:00:00.000000", 12.0, 1.5),
+    # Misma hora con otras mayúsculas: se conserva la primera fila insertada
+    ("madrid ", "2024-01-01 01:00:00.000000", 99.0, 9.0),
+    ("MADRID", "2024-01-02 05:00:00.000000", 5.0, None),
+    # Horas anteriores a 1970
+    ("Oslo", "1969-12-31 22:00:00.000000", -2.0, 0.5),
+    ("Oslo", "1969-12-31 23:00:00.000000", -3.0, None),
+]
+
+
+def _days(d: date) -> int:
+    return (d - EPOCH_DAY).days
+
+
+def _hours(text_dt: str) -> int:
+    return to_hours(datetime.fromisoformat(text_dt))
+
+
+def _baseline_engine(tmp_path):
+    """
+    Crea una BD con el esquema y los datos de la primera versión y le aplica el arranque actual.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(BASELINE_SCHEMA))
+        conn.execute(text("CREATE INDEX ix_weather_data_id ON weather_data (id)"))
+        for i, (city, dt, temp, precip) in enumerate(BASELINE_ROWS):
+            conn.execute(
+                text("INSERT INTO weather_data (city, datetime, temperature_2m, precipitation, latitude, longitude) "
+                     "VALUES (:city, :dt, :temp, :precip, :lat, :lon)"),
+                {"city": city, "dt": dt, "temp": temp, "precip": precip, "lat": 40.4 + i, "lon": -3.7},
+            )
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        run_migrations(conn)
+    return engine
+
+
+def test_baseline_database_migrates_to_compact_layout(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    with engine.connect() as conn:
+        locations = dict(conn.execute(text("SELECT city_key, id FROM locations")).all())
+        assert set(locations) == {"madrid", "oslo"}
+
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(weather_data)"))]
+        assert columns == ["location_id", "ts", "temperature_2m", "precipitation"]
+        assert conn.execute(text("SELECT name FROM sqlite_master WHERE name = 'weather_data_rowid'")).first() is None
+
+        rows = conn.execute(text(
+            "SELECT location_id, ts, temperature_2m, precipitation FROM weather_data ORDER BY location_id, ts"
+        )).all()
+    madrid, oslo = locations["madrid"], locations["oslo"]
+    assert sorted(rows) == sorted([
+        (madrid, _hours("2024-01-01 00:00:00"), 10.0, 0.0),
+        (madrid, _hours("2024-01-01 01:00:00"), 12.0, 1.5),
+        (madrid, _hours("2024-01-02 05:00:00"), 5.0, None),
+        (oslo, -2, -2.0, 0.5),
+        (oslo, -1, -3.0, None),
+    ])
+
+
+def test_baseline_database_rebuilds_rollups(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    with engine.connect() as conn:
+        locations = dict(conn.execute(text("SELECT city_key, id FROM locations")).all())
+        daily = {
+            (row.location_id, row.day): row
+            for row in conn.execute(text("SELECT * FROM weather_daily")).all()
+        }
+        summary = {row.location_id: row for row in conn.execute(text("SELECT * FROM city_summary")).all()}
+        buckets = conn.execute(text(
+            "SELECT resolution, start, hours, temp_sum FROM weather_buckets WHERE location_id = :id ORDER BY resolution"
+        ), {"id": locations["oslo"]}).all()
+    madrid, oslo = locations["madrid"], locations["oslo"]
+
+    assert set(daily) == {
+        (madrid, _days(date(2024, 1, 1))), (madrid, _days(date(2024, 1, 2))), (oslo, -1),
+    }
+    first = daily[(madrid, _days(date(2024, 1, 1)))]
+    assert (first.hours, first.temp_count, first.temp_sum) == (2, 2, 22.0)
+    assert (first.temp_max, first.temp_max_at) == (12.0, _hours("2024-01-01 01:00:00"))
+    assert (first.precip_count, first.precip_sum, first.precip_max) == (2, 1.5, 1.5)
+
+    before_1970 = daily[(oslo, -1)]
+    assert (before_1970.hours, before_1970.temp_min, before_1970.temp_min_at) == (2, -3.0, -1)
+    assert (before_1970.precip_count, before_1970.precip_sum) == (1, 0.5)
+
+    assert (summary[madrid].hours, summary[madrid].temp_count, summary[madrid].temp_sum) == (3, 3, 27.0)
+    assert (summary[madrid].start_date, summary[madrid].end_date) == (
+        _days(date(2024, 1, 1)), _days(date(2024, 1, 2))
+    )
+    assert summary[oslo].precip_total == 0.5
+
+    assert [(res, hours, temp_sum) for res, _, hours, temp_sum in buckets] == [
+        ("month", 2, -5.0), ("week", 2, -5.0), ("year", 2, -5.0),
+    ]
+
+
+def test_migrations_are_idempotent(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    with engine.connect() as conn:
+        before = [conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                  for table in ("weather_data", "weather_daily", "city_summary", "weather_buckets")]
+    with engine.begin() as conn:
+        run_migrations(conn)
+    with engine.connect() as conn:
+        after = [conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                 for table in ("weather_data", "weather_daily", "city_summary", "weather_buckets")]
+    assert after == before
+
+
+def test_duplicate_active_jobs_are_failed_before_the_unique_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        conn.execute(text("DROP INDEX ux_ingest_jobs_active"))
+        for job_id, status, created in [("a", "queued", 2), ("b", "running", 1), ("c", "queued", 3), ("d", "done", 0)]:
+            conn.execute(IngestJobDB.__table__.insert().values(
+                id=job_id, city="Madrid", city_key="madrid", start_date=date(2024, 1, 1), end_date=date(2024, 1, 2),
+                status=status, rows_total=0, rows_inserted=0, rows_skipped=0, created_at=datetime(2024, 1, 1, created),
+            ))
+        run_migrations(conn)
+    with engine.connect() as conn:
+        statuses = dict(conn.execute(text("SELECT id, status FROM ingest_jobs")).all())
+        indexes = {row[1] for row in conn.execute(text("PRAGMA index_list(ingest_jobs)"))}
+    assert statuses == {"a": "failed", "b": "running", "c": "failed", "d": "done"}
+    assert "ux_ingest_jobs_active" in indexes
@@ -0,0 +1,58 @@
+from datetime import date
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+from db import database
+from models.job import IngestJobDB
+from services.buckets import buckets_upsert
+from services.ingest import weather_upsert
+from services.rollups import city_summary_upsert, daily_rollup_upsert
+
+# Las consultas se compilan con el dialecto de PostgreSQL, sin servidor ni driver
+DIALECT = postgresql.dialect()
+
+
+@pytest.fixture
+def postgres_engine(monkeypatch):
+    """
+    Hace que upsert() construya los INSERT de PostgreSQL, como con un motor postgresql+asyncpg.
+    """
+    monkeypatch.setattr(database, "engine", SimpleNamespace(dialect=DIALECT))
+
+
+def compiled(stmt) -> str:
+    return " ".join(str(stmt.compile(dialect=DIALECT)).split())
+
+
+def test_weather_upsert_for_postgresql(postgres_engine):
+    stmt = weather_upsert()
+    assert isinstance(stmt, postgresql.Insert)
+    sql = compiled(stmt)
+    assert sql.startswith("INSERT INTO weather_data (location_id, ts, temperature_2m, precipitation) VALUES")
+    assert sql.endswith(
+        "ON CONFLICT (location_id, ts) DO UPDATE SET temperature_2m = excluded.temperature_2m, "
+        "precipitation = excluded.precipitation WHERE weather_data.temperature_2m IS NULL "
+        "RETURNING weather_data.ts"
+    )
+
+
+@pytest.mark.parametrize("build, conflict", [
+    (lambda: daily_rollup_upsert(1, date(2024, 1, 1), date(2024, 1, 2)), "ON CONFLICT (location_id, day) DO UPDATE"),
+    (lambda: city_summary_upsert(1), "ON CONFLICT (location_id) DO UPDATE"),
+    (buckets_upsert, "ON CONFLICT (location_id, resolution, start) DO UPDATE"),
+])
+def test_rollup_upserts_for_postgresql(postgres_engine, build, conflict):
+    stmt = build()
+    assert isinstance(stmt, postgresql.Insert)
+    assert conflict in compiled(stmt)
+
+
+@pytest.mark.parametrize("dialect", [postgresql.dialect(), sqlite.dialect()])
+def test_active_jobs_unique_index_is_partial(dialect):
+    index = next(ix for ix in IngestJobDB.__table__.indexes if ix.name == "ux_ingest_jobs_active")
+    sql = " ".join(str(CreateIndex(index).compile(dialect=dialect)).split())
+    assert sql == (
+        "CREATE UNIQUE INDEX ux_ingest_jobs_active ON ingest_jobs (city_key, start_date, end_date) "
+        "WHERE status IN ('queued', 'running')"
+    )
@@ -0,0 +1,58 @@
+import pytest
+from services.response_cache import ResponseCache, _etag_matches, get_response_cache, make_etag
+
+pytestmark = pytest.mark.anyio
+
+PARAMS = {"city": "Madrid", "start_date": "2023-01-01", "end_date": "2023-01-10"}
+
+
+async def load(client, start_date: str, end_date: str):
+    response = await client.post("/load_weather", params={"city": "Madrid", "start_date": start_date,
+                                                          "end_date": end_date})
+    assert response.status_code == 200, response.text
+
+
+def test_etag_matching():
+    etag = make_etag(("temperature", 1, 0))
+    assert etag != make_etag(("temperature", 1, 1))
+    assert _etag_matches(etag, etag)
+    assert _etag_matches(f'"other", W/{etag}', etag)
+    assert _etag_matches("*", etag)
+    assert not _etag_matches(None, etag)
+    assert not _etag_matches('"other"', etag)
+
+
+def test_store_evicts_least_recently_used():
+    # Cada cuerpo ocupa 22 bytes: caben dos
+    cache = ResponseCache(max_bytes=50)
+    cache.store(("a",), {"value": "x" * 10})
+    cache.store(("b",), {"value": "y" * 10})
+    cache.store(("c",), {"value": "z" * 10})
+    assert cache.stats()["entries"] == 2
+    assert cache.evictions == 1
+    assert ("a",) not in cache._entries
+
+
+@pytest.mark.parametrize("endpoint", ["/stats/temperature", "/stats/precipitation"])
+async def test_stats_revalidate_with_etag(client, endpoint):
+    await load(client, "2023-01-01", "2023-01-10")
+
+    first = await client.get(endpoint, params=PARAMS)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    # Misma respuesta desde la caché y 304 sin cuerpo con el ETag vigente
+    cached = await client.get(endpoint, params=PARAMS)
+    assert (cached.content, cached.headers["etag"]) == (first.content, etag)
+    not_modified = await client.get(endpoint, params=PARAMS, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    assert get_response_cache().stats()["not_modified"] == 1
+
+    # Una carga nueva de la ciudad cambia la versión de los datos y el ETag
+    await load(client, "2023-01-11", "2023-01-12")
+    revalidated = await client.get(endpoint, params=PARAMS, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 200
+    assert revalidated.headers["etag"] != etag
@@ -0,0 +1,119 @@
+from datetime import date, datetime
+import pytest
+from sqlalchemy import select
+from sqlalchemy.engine import CursorResult
+from db.database import AsyncSessionLocal
+from models.location import LocationDB
+from models.weatherDaily import WeatherDailyDB
+from services import series_cache
+from services.rollups import DAILY_COLUMNS, daily_aggregate_select
+from services.series_cache import SeriesCache
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+
+async def stored_daily(location_id: int) -> dict:
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            select(*[getattr(WeatherDailyDB, col) for col in DAILY_COLUMNS])
+            .where(WeatherDailyDB.location_id == location_id)
+            .order_by(WeatherDailyDB.day)
+        )).mappings().all()
+    return {row["day"]: dict(row) for row in rows}
+
+
+async def recomputed_daily(location_id: int) -> dict:
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(daily_aggregate_select(location_id))).mappings().all()
+    return {row["day"]: {col: row[col] for col in DAILY_COLUMNS} for row in rows}
+
+
+async def test_rollup_upsert_matches_hourly_data(client):
+    result = await insert("Madrid", hourly(date(2024, 1, 1), 3))
+    daily = await stored_daily(result["location_id"])
+
+    assert list(daily) == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+    assert daily == await recomputed_daily(result["location_id"])
+    first = daily[date(2024, 1, 1)]
+    assert (first["hours"], first["temp_count"], first["temp_sum"]) == (24, 24, float(sum(range(24))))
+    assert (first["temp_max"], first["temp_max_at"]) == (23.0, datetime(2024, 1, 1, 23))
+    assert (first["precip_sum"], first["precip_hours"], first["precip_max"]) == (0.5, 1, 0.5)
+
+
+async def test_rollup_upsert_updates_days_when_empty_hours_are_filled(client):
+    # Primera carga con la última hora del día 2 todavía vacía, como devuelve la API los datos recientes
+    gap = 24 + 23
+    first = await insert("Madrid", hourly(
+        date(2024, 1, 1), 2, temperature=lambda i: None if i == gap else 10.0,
+    ))
+    daily = await stored_daily(first["location_id"])
+    assert (daily[date(2024, 1, 2)]["temp_count"], daily[date(2024, 1, 2)]["temp_sum"]) == (23, 230.0)
+
+    # La segunda carga completa la hora vacía y añade un día: solo se escriben esas horas
+    second = await insert("madrid", hourly(date(2024, 1, 1), 3, temperature=lambda i: 30.0 if i == gap else 10.0))
+    assert second["location_id"] == first["location_id"]
+    assert second["inserted"] == 1 + 24
+
+    daily = await stored_daily(first["location_id"])
+    assert daily == await recomputed_daily(first["location_id"])
+    assert (daily[date(2024, 1, 2)]["temp_count"], daily[date(2024, 1, 2)]["temp_sum"]) == (24, 260.0)
+    assert (daily[date(2024, 1, 2)]["temp_max"], daily[date(2024, 1, 2)]["hours_above"]) == (30.0, 0)
+    assert date(2024, 1, 3) in daily
+
+    async with AsyncSessionLocal() as session:
+        location = await session.get(LocationDB, first["location_id"])
+    assert location.data_version == 2
+
+
+async def test_rollup_upsert_does_not_depend_on_rowcount(client, monkeypatch):
+    # asyncpg devuelve -1 como rowcount de un executemany
+    monkeypatch.setattr(CursorResult, "rowcount", property(lambda self: -1))
+    first = await insert("Madrid", hourly(date(2024, 1, 1), 2))
+    second = await insert("Madrid", hourly(date(2024, 1, 1), 3))
+    assert (first["inserted"], second["inserted"], second["skipped"]) == (48, 24, 48)
+
+    daily = await stored_daily(first["location_id"])
+    assert list(daily) == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+    async with AsyncSessionLocal() as session:
+        location = await session.get(LocationDB, first["location_id"])
+    assert location.data_version == 2
+
+
+async def test_rollup_upsert_keeps_one_row_per_repeated_hour(client):
+    # Con el cambio de hora la API puede repetir una hora local: se guarda la primera con temperatura
+    data = hourly(date(2024, 10, 27), 1, temperature=lambda i: None if i == 2 else float(i))
+    data["hourly"]["time"].insert(3, data["hourly"]["time"][2])
+    data["hourly"]["temperature_2m"].insert(3, 99.0)
+    data["hourly"]["precipitation"].insert(3, 0.0)
+
+    result = await insert("Madrid", data)
+    assert (result["total"], result["inserted"], result["skipped"]) == (25, 24, 1)
+    day = (await stored_daily(result["location_id"]))[date(2024, 10, 27)]
+    assert (day["hours"], day["temp_max"]) == (24, 99.0)
+
+
+async def test_rebuild_summaries_keeps_rollups(client, admin_headers):
+    result = await insert("Madrid", hourly(date(2024, 2, 27), 4))
+    before = await stored_daily(result["location_id"])
+
+    response = await client.post("/admin/rebuild_summaries", headers=admin_headers)
+    assert response.status_code == 200
+    assert await stored_daily(result["location_id"]) == before
+
+
+@pytest.mark.parametrize("admit_after", [1000, 1])
+async def test_precipitation_stats_with_all_hours_null(client, monkeypatch, admin_headers, admit_after):
+    # admit_after=1000 calcula sobre el resumen diario en SQL, admit_after=1 sobre la serie en memoria
+    monkeypatch.setattr(series_cache, "_series_cache", SeriesCache(admit_after=admit_after))
+    await insert("Oslo", hourly(date(2024, 1, 1), 2, precipitation=lambda i: None))
+    assert (await client.post("/admin/rebuild_summaries", headers=admin_headers)).status_code == 200
+
+    params = {"city": "Oslo", "start_date": "2024-01-01", "end_date": "2024-01-02"}
+    response = await client.get("/stats/precipitation", params=params)
+    assert response.status_code == 404
+
+    # La temperatura sí tiene datos en el mismo rango: 0..23 el día 1 y la hora 00:00 del día 2
+    response = await client.get("/stats/temperature", params=params)
+    assert response.status_code == 200
+    assert response.json()["temperature"]["average"] == round(sum(range(24)) / 25, 2)
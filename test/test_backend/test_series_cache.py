@@ -0,0 +1,46 @@
+import pytest
+from services import series_cache
+from services.series_cache import SeriesCache, build_series
+
+pytestmark = pytest.mark.anyio
+
+
+def fake_cache(monkeypatch, **kwargs) -> SeriesCache:
+    """
+    Caché cuyas series se construyen en memoria sin BD: 24 horas por ciudad.
+    """
+    cache = SeriesCache(**kwargs)
+
+    async def load(session, location_id):
+        return build_series(range(24), [float(location_id)] * 24, [0.0] * 24)
+
+    monkeypatch.setattr(cache, "_load", load)
+    return cache
+
+
+async def test_request_counts_are_dropped_on_admission(monkeypatch):
+    cache = fake_cache(monkeypatch, admit_after=2)
+    assert await cache.get(None, 1, version=1) is None
+    assert dict(cache._requests) == {1: 1}
+
+    assert await cache.get(None, 1, version=1) is not None
+    assert dict(cache._requests) == {}
+    assert await cache.get(None, 1, version=1) is not None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+async def test_request_counts_keep_only_the_most_recent_cities(monkeypatch):
+    monkeypatch.setattr(series_cache, "REQUEST_HISTORY", 3)
+    cache = fake_cache(monkeypatch, admit_after=3)
+    for location_id in (1, 2, 3, 1, 4):
+        assert await cache.get(None, location_id) is None
+    assert dict(cache._requests) == {3: 1, 1: 2, 4: 1}
+
+
+async def test_eviction_forgets_the_series_version(monkeypatch):
+    one = build_series(range(24), [0.0] * 24, [0.0] * 24).nbytes
+    cache = fake_cache(monkeypatch, admit_after=1, max_bytes=one)
+    await cache.get(None, 1, version=5)
+    await cache.get(None, 2, version=7)
+    assert (list(cache._entries), cache._versions) == ([2], {2: 7})
+    assert cache.evictions == 1
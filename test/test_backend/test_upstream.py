@@ -0,0 +1,103 @@
+import asyncio
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from services.upstream import UpstreamClient, retry_after_seconds
+from test.test_backend.fake_openmeteo import create_app
+
+pytestmark = pytest.mark.anyio
+
+SEARCH = "https://geocoding-api.open-meteo.com/v1/search"
+
+
+def upstream(app, **kwargs) -> UpstreamClient:
+    return UpstreamClient(transport=httpx.ASGITransport(app=app), **kwargs)
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "1.5"})) == 1.5
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "-3"})) == 0.0
+    assert retry_after_seconds(httpx.Response(429)) is None
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "pronto"})) is None
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 < retry_after_seconds(httpx.Response(429, headers={"Retry-After": when})) <= 30
+
+
+async def test_rate_limited_requests_are_retried_until_they_succeed():
+    fake = create_app(rate_limit=20, burst=1)
+    client = upstream(fake, per_host_concurrency=1, max_retries=5, backoff_max=1.0)
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*[client.get_json(SEARCH, {"name": "Madrid"}) for _ in range(4)])
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.close()
+
+    assert all(result["results"][0]["name"] == "Madrid" for result in results)
+    assert fake.state.stats["search"] == 4
+    # Cada 429 se reintenta una vez, esperando lo que indica Retry-After (una petición cada 50 ms)
+    assert fake.state.stats["throttled"] >= 3
+    assert client.retries == fake.state.stats["throttled"]
+    assert elapsed >= 3 / 20 * 0.9
+
+
+async def test_retries_are_capped_by_backoff_max_and_max_retries():
+    # Retry-After de unos 1000 s: la espera se limita a backoff_max
+    fake = create_app(rate_limit=0.001, burst=1)
+    client = upstream(fake, max_retries=2, backoff_max=0.01)
+    try:
+        await client.get_json(SEARCH, {"name": "Madrid"})
+        started = time.perf_counter()
+        with pytest.raises(httpx.HTTPStatusError) as error:
+            await client.get_json(SEARCH, {"name": "Madrid"})
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.close()
+
+    assert error.value.response.status_code == 429
+    assert (client.retries, fake.state.stats["throttled"]) == (2, 3)
+    assert elapsed < 1
+
+
+async def test_server_errors_are_retried():
+    app = FastAPI()
+    calls = []
+
+    @app.get("/v1/search")
+    async def search():
+        calls.append(1)
+        if len(calls) <= 2:
+            return JSONResponse({"error": True}, status_code=503)
+        return {"results": []}
+
+    client = upstream(app, backoff_base=0.001)
+    try:
+        assert await client.get_json(SEARCH) == {"results": []}
+    finally:
+        await client.close()
+    assert (len(calls), client.retries) == (3, 2)
+
+
+async def test_per_host_concurrency_is_limited():
+    fake = create_app(latency=0.05)
+    current = peak = 0
+
+    async def counting(scope, receive, send):
+        nonlocal current, peak
+        current += 1
+        peak = max(peak, current)
+        try:
+            await fake(scope, receive, send)
+        finally:
+            current -= 1
+
+    client = upstream(counting, per_host_concurrency=2)
+    try:
+        await asyncio.gather(*[client.get_json(SEARCH, {"name": f"C{i}"}) for i in range(6)])
+    finally:
+        await client.close()
+    assert (peak, fake.state.stats["search"]) == (2, 6)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from datetime import date
+import httpx
+import pytest
+from routers import stats as stats_router
+from services import ingest
+from services.singleflight import SingleFlight
+from services.upstream import start_upstream_client
+from test.test_backend.fake_openmeteo import create_app
+from test.test_backend.samples import hourly, insert
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("limit", [None, 24])
+async def test_weather_json_is_compact_utf8_and_keeps_null_hours(client, limit):
+    await insert("Málaga", hourly(date(2024, 1, 1), 1, temperature=lambda i: None if i == 3 else 20.0))
+
+    params = {"format": "json"} if limit is None else {"format": "json", "limit": limit}
+    response = await client.get("/weather/Málaga", params=params)
+    assert response.status_code == 200
+    rows = response.json()
+    assert len(rows) == 24
+    assert rows[3]["temperature_2m"] is None
+    assert rows[0]["city"] == "Málaga"
+    assert '"city":"Málaga"' in response.content.decode("utf-8")
+
+
+async def test_weather_ndjson_is_compact_utf8(client):
+    await insert("Málaga", hourly(date(2024, 1, 1), 1, precipitation=lambda i: None))
+
+    response = await client.get("/weather/Málaga", params={"format": "ndjson"})
+    assert response.status_code == 200
+    lines = response.content.decode("utf-8").splitlines()
+    assert len(lines) == 24
+    assert lines[0].startswith('{"city":"Málaga","datetime":"2024-01-01T00:00:00"')
+    assert json.loads(lines[0])["precipitation"] is None
+
+
+async def test_concurrent_identical_loads_share_one_upstream_fetch(client):
+    # Open-Meteo lento para que las cargas se solapen
+    fake = create_app(latency=0.1)
+    await start_upstream_client(transport=httpx.ASGITransport(app=fake))
+    params = {"start_date": "2024-01-01", "end_date": "2024-01-03"}
+
+    responses = await asyncio.gather(*[
+        client.post("/load_weather", params={"city": city, **params}) for city in ("Madrid", "madrid", "MADRID ") * 2
+    ])
+    assert [r.status_code for r in responses] == [200] * 6
+    assert {r.json()["insertados"] for r in responses} == {72}
+    assert (fake.state.stats["search"], fake.state.stats["archive"]) == (1, 1)
+    assert ingest.load_flight.stats()["in_flight"] == 0
+
+
+async def test_concurrent_identical_stats_share_one_computation(client, monkeypatch):
+    await insert("Madrid", hourly(date(2024, 1, 1), 3))
+    calls = []
+    query = stats_router.query_temperature_stats
+
+    async def slow_query(*args):
+        calls.append(args)
+        await asyncio.sleep(0.1)
+        return await query(*args)
+
+    monkeypatch.setattr(stats_router, "query_temperature_stats", slow_query)
+    params = {"city": "Madrid", "start_date": "2024-01-01", "end_date": "2024-01-03"}
+    responses = await asyncio.gather(*[client.get("/stats/temperature", params=params) for _ in range(5)])
+    assert [r.status_code for r in responses] == [200] * 5
+    assert len({r.content for r in responses}) == 1
+    assert len(calls) == 1
+
+
+async def test_failed_load_reaches_every_waiter_and_clears_the_key(client, monkeypatch):
+    calls = []
+
+    async def failing_load(city, start, end):
+        calls.append(city)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("Open-Meteo no responde")
+
+    monkeypatch.setattr(ingest, "_load_city", failing_load)
+    params = {"city": "Madrid", "start_date": "2024-01-01", "end_date": "2024-01-03"}
+    responses = await asyncio.gather(*[client.post("/load_weather", params=params) for _ in range(4)])
+    assert [r.status_code for r in responses] == [500] * 4
+    assert all("Open-Meteo no responde" in r.json()["detail"] for r in responses)
+    assert len(calls) == 1
+
+    # La clave se ha liberado: la siguiente carga vuelve a ejecutarse
+    assert ingest.load_flight.stats()["in_flight"] == 0
+    assert (await client.post("/load_weather", params=params)).status_code == 500
+    assert len(calls) == 2
+
+
+async def test_single_flight_shares_the_exception_and_survives_a_cancelled_caller():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def work():
+        started.set()
+        await release.wait()
+        raise ValueError("fallo")
+
+    callers = [asyncio.ensure_future(flight.do("k", work)) for _ in range(3)]
+    await started.wait()
+    callers[0].cancel()
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert isinstance(results[1], ValueError) and results[1] is results[2]
+    assert flight.stats() == {"executions": 1, "coalesced": 2, "in_flight": 0}
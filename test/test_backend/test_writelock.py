@@ -0,0 +1,105 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import pytest
+from db.writelock import WriteLock, default_lock_path
+
+fcntl = pytest.importorskip("fcntl")
+
+
+async def _hold_many(lock: WriteLock, times: int, seconds: float) -> list:
+    """
+    Toma el cerrojo times veces desde dos tareas a la vez y devuelve los intervalos (inicio, fin).
+    """
+    spans = []
+
+    async def hold():
+        async with lock.hold():
+            started = time.monotonic()
+            await asyncio.sleep(seconds)
+            spans.append((started, time.monotonic()))
+
+    for _ in range(times):
+        await asyncio.gather(hold(), hold())
+    return spans
+
+
+def _child(lock: WriteLock, queue):
+    queue.put(asyncio.run(_hold_many(lock, 3, 0.01)))
+
+
+def _overlaps(spans: list) -> int:
+    spans = sorted(spans)
+    return sum(1 for a, b in zip(spans, spans[1:]) if b[0] < a[1])
+
+
+def test_default_lock_path():
+    assert default_lock_path("sqlite+aiosqlite:///./data/openmeteo.db") == "./data/openmeteo.db.write.lock"
+    assert default_lock_path("sqlite+aiosqlite:///:memory:") is None
+    assert default_lock_path("postgresql+asyncpg://user@host/openmeteo") is None
+
+
+def test_write_lock_excludes_forked_processes(tmp_path):
+    lock = WriteLock(str(tmp_path / "db.write.lock"))
+    # El padre abre el fichero antes del fork: los hijos deben abrir el suyo
+    asyncio.run(_hold_many(lock, 1, 0))
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    children = [context.Process(target=_child, args=(lock, queue)) for _ in range(3)]
+    for child in children:
+        child.start()
+    spans = [span for _ in children for span in queue.get(timeout=30)]
+    for child in children:
+        child.join(timeout=30)
+        assert child.exitcode == 0
+
+    assert len(spans) == 3 * 3 * 2
+    assert _overlaps(spans) == 0
+
+
+@pytest.mark.anyio
+async def test_write_lock_serializes_tasks(tmp_path):
+    lock = WriteLock(str(tmp_path / "db.write.lock"))
+    spans = await _hold_many(lock, 3, 0.01)
+    assert _overlaps(spans) == 0
+    assert lock.stats()["acquisitions"] == 6
+    assert lock.stats()["waits"] >= 3
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_does_not_keep_the_lock(tmp_path):
+    path = str(tmp_path / "db.write.lock")
+    lock = WriteLock(path)
+
+    # Otro escritor (otra descripción de fichero, como otro proceso) tiene el cerrojo
+    other = os.open(path, os.O_RDWR | os.O_CREAT)
+    fcntl.flock(other, fcntl.LOCK_EX)
+
+    async def write():
+        async with lock.hold():
+            pass
+
+    waiter = asyncio.create_task(write())
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    fcntl.flock(other, fcntl.LOCK_UN)
+    await asyncio.wait_for(write(), timeout=1)
+
+    # Y el cerrojo vuelve a quedar libre para los demás
+    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    os.close(other)
+
+
+@pytest.mark.anyio
+async def test_write_lock_without_file_does_not_wait():
+    lock = WriteLock(None)
+    async with lock.hold():
+        async with lock.hold():
+            pass
+    assert lock.stats()["inter_process"] is False